@@ -1,16 +1,29 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Literal
 import uvicorn
+import asyncio
 import json
 import os
 import logging
 from datetime import datetime
+import time
 import traceback
 
 from release_agent.agent import root_agent
 from release_agent.test_agent import test_agent
 from release_agent.kg_query_agent import KGQueryAgent  # We'll create this
+from release_agent.execution_scheduler import ExecutionRejectedError
+from release_agent.compression import CompressionMiddleware
+from release_agent.deadline import ClientDisconnectedError, DeadlineExceededError, run_with_deadline
+from release_agent.health_monitor import HealthMonitor
+from release_agent.job_manager import JobRejectedError, QueryJob
+from release_agent.result_formatter import COLUMNAR, RECORDS
+from release_agent.result_store import (
+    DEFAULT_PAGE_ROWS, MAX_PAGE_ROWS, ExportUnavailableError, InvalidCursorError, ResultNotFoundError
+)
+from release_agent import metrics, serialization
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -26,6 +39,63 @@ app = FastAPI(
 # Initialize the KG Query Agent
 kg_agent = KGQueryAgent()
 
+# Probe LLM connectivity in the background; /health and /health/ready serve
+# the cached outcome instead of calling the LLM on every probe
+health_monitor = HealthMonitor(
+    test_agent.health_check,
+    interval_seconds=float(os.environ.get("HEALTH_PROBE_INTERVAL_SECONDS", "60"))
+)
+
+# Expose the components' counters (caches, scheduler, planner, ...) on /metrics
+metrics.REGISTRY.register_collector(metrics.stats_collector("kg", kg_agent.get_stats))
+metrics.REGISTRY.register_collector(
+    metrics.stats_collector("kg", lambda: {"health_monitor": health_monitor.get_stats()})
+)
+
+# Compress responses (Brotli when installed, else gzip); large query results
+# are repetitive JSON that shrinks by an order of magnitude
+app.add_middleware(CompressionMiddleware)
+
+# Count requests and time them per endpoint for /metrics (including compression)
+app.add_middleware(metrics.RequestMetricsMiddleware)
+
+@app.on_event("startup")
+async def warm_kg_column_stores():
+    """Build shared column stores for the default KG path in the background."""
+    async def _warm():
+        try:
+            count = await asyncio.to_thread(kg_agent.kg_store.warm, "Data/KGs")
+            logger.info(f"KG column stores ready for {count} files")
+        except Exception as e:
+            logger.warning(f"Could not warm KG column stores: {str(e)}")
+
+    asyncio.create_task(_warm())
+
+@app.on_event("startup")
+async def start_health_monitor():
+    """Start the background LLM connectivity probe."""
+    health_monitor.start()
+
+@app.on_event("shutdown")
+async def stop_health_monitor():
+    """Stop the background LLM connectivity probe."""
+    await health_monitor.stop()
+
+@app.on_event("startup")
+async def start_event_loop_lag_monitor():
+    """Sample event loop lag for /metrics."""
+    app.state.lag_monitor = asyncio.create_task(metrics.monitor_event_loop_lag())
+
+@app.on_event("shutdown")
+async def stop_query_jobs():
+    """Cancel background query jobs so their sandboxes don't outlive the server."""
+    await kg_agent.job_manager.shutdown()
+
+@app.on_event("shutdown")
+async def stop_event_loop_lag_monitor():
+    """Stop sampling event loop lag."""
+    app.state.lag_monitor.cancel()
+
 class ChatRequest(BaseModel):
     """Request model for chat endpoint."""
     message: str
@@ -36,6 +106,9 @@ class DynamicKGRequest(BaseModel):
     query: str
     kg_path: Optional[str] = "Data/KGs"  # Base path to KG files
     context: Optional[Dict[str, Any]] = None  # Additional context
+    timeout_seconds: Optional[float] = None  # Deadline; capped at MAX_QUERY_DEADLINE_SECONDS
+    format: Literal["records", "columnar"] = RECORDS  # Row shape; columnar sends one array per field
+    page_size: Optional[int] = None  # Rows returned; the rest are kept for /kg-query/results/{result_id}
 
 class DynamicKGResponse(BaseModel):
     """Response model for dynamic KG query."""
@@ -46,6 +119,60 @@ class DynamicKGResponse(BaseModel):
     insights: Optional[List[str]] = None
     error: Optional[str] = None
     query_type: Optional[str] = None
+    analysis_path: Optional[str] = None  # rule_based, llm, rule_based_fallback or reused
+    execution_metadata: Optional[Dict[str, Any]] = None  # Queue depth, wait time, ...
+    resource_usage: Optional[Dict[str, Any]] = None  # Sandbox CPU, peak RSS, bytes/files read
+    query_plan: Optional[Dict[str, Any]] = None  # Chosen engine, estimated and actual cost
+    timings: Optional[Dict[str, Any]] = None  # Seconds per stage, per LLM call and within the sandbox
+
+class BatchKGRequest(BaseModel):
+    """Request model for batch KG queries."""
+    queries: List[str]
+    kg_path: Optional[str] = "Data/KGs"  # Base path to KG files
+    timeout_seconds: Optional[float] = None  # Deadline; capped at MAX_QUERY_DEADLINE_SECONDS
+    format: Literal["records", "columnar"] = RECORDS  # Row shape; columnar sends one array per field
+
+class BatchKGResponse(BaseModel):
+    """Response model for batch KG queries; results are in request order."""
+    success: bool
+    results: List[DynamicKGResponse]
+    execution_time: float
+
+# Upper bound on queries per batch request (a dashboard fires 10-20)
+MAX_BATCH_QUERIES = 50
+
+# Deadline of synchronous query requests unless the client asks for less;
+# longer queries belong in /kg-query/jobs
+MAX_QUERY_DEADLINE_SECONDS = float(os.environ.get("KG_QUERY_DEADLINE_SECONDS", "120"))
+
+def _request_deadline(timeout_seconds: Optional[float]) -> float:
+    """Deadline in seconds for a request: the client's, within the configured maximum."""
+    if timeout_seconds is None or timeout_seconds <= 0:
+        return MAX_QUERY_DEADLINE_SECONDS
+    return min(timeout_seconds, MAX_QUERY_DEADLINE_SECONDS)
+
+class JobResponse(BaseModel):
+    """Status of a background KG query job."""
+    job_id: str
+    query: str
+    status: str  # queued, running, succeeded, failed or cancelled
+    stage: Optional[str] = None  # Last pipeline stage reached
+    progress: float = 0.0  # 0.0 - 1.0
+    target_files: List[str] = []
+    rows_ready: int = 0
+    error: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    elapsed_seconds: float = 0.0
+
+class ResultPageResponse(BaseModel):
+    """Page of a query result kept server-side."""
+    result_id: str
+    rows: Any  # Row dicts, or one array per field with format=columnar
+    offset: int  # Index of the first row of this page
+    row_count: int
+    next_cursor: Optional[str] = None  # None on the last page
 
 class ChatResponse(BaseModel):
     """Response model for chat endpoint."""
@@ -60,6 +187,8 @@ class HealthResponse(BaseModel):
     agent_name: str
     llm_response: Optional[str] = None
     error: Optional[str] = None
+    checked_at: Optional[float] = None  # When the cached LLM probe ran
+    age_seconds: Optional[float] = None  # Age of the cached LLM probe
 
 @app.get("/")
 async def root():
@@ -70,14 +199,24 @@ async def root():
         "endpoints": {
             "/chat": "POST - Chat with the agent",
             "/kg-query": "POST - Dynamic knowledge graph querying",
-            "/health": "GET - Health check",
+            "/kg-query/batch": "POST - Several KG queries sharing LLM calls and sandbox sessions",
+            "/kg-query/stream": "POST - KG query streaming progress and results as server-sent events",
+            "/kg-query/jobs": "POST - Submit a long-running KG query as a background job",
+            "/kg-query/jobs/{job_id}": "GET - Job status and progress; DELETE - Cancel the job",
+            "/kg-query/jobs/{job_id}/result": "GET - Result of a finished job",
+            "/kg-query/results/{result_id}": "GET - Page of a large result (cursor pagination); DELETE - Discard it",
+            "/kg-query/results/{result_id}/export": "GET - Stream a large result as CSV or Parquet",
+            "/health": "GET - Health check (cached LLM probe)",
+            "/health/live": "GET - Liveness, local checks only",
+            "/health/ready": "GET - Readiness from the cached LLM probe",
+            "/metrics": "GET - Prometheus metrics",
             "/kg-files": "GET - List available KG files",
             "/docs": "GET - API documentation"
         }
     }
 
 @app.post("/kg-query", response_model=DynamicKGResponse)
-async def dynamic_kg_query(request: DynamicKGRequest):
+async def dynamic_kg_query(request: DynamicKGRequest, http_request: Request):
     """
     Dynamic Knowledge Graph Query Endpoint
     
@@ -85,6 +224,16 @@ async def dynamic_kg_query(request: DynamicKGRequest):
     generates code to fetch data from KG files, executes it safely, 
     and returns formatted data for frontend consumption.
     
+    The query runs under a deadline (request.timeout_seconds, at most
+    MAX_QUERY_DEADLINE_SECONDS). When it passes, or the client disconnects,
+    pending LLM calls are abandoned and the sandbox is killed; a passed
+    deadline is reported as 504.
+    
+    With request.page_size, only that many rows are returned; the rest are
+    kept server-side and data.pagination carries the result_id and the
+    cursor for GET /kg-query/results/{result_id}. Results streamed by the
+    sandbox that are too large to return whole are paginated either way.
+    
     Args:
         request: DynamicKGRequest containing query and optional parameters
         
@@ -97,26 +246,39 @@ async def dynamic_kg_query(request: DynamicKGRequest):
         logger.info(f"Processing KG query: {request.query[:100]}...")
         
         # Process the query using KG agent (date range extracted automatically)
-        result = await kg_agent.process_query(
-            query=request.query,
-            kg_path=request.kg_path,
-            date_range=None,  # Always None - dates extracted from query
-            context=request.context
+        result = await run_with_deadline(
+            lambda: kg_agent.process_query(
+                query=request.query,
+                kg_path=request.kg_path,
+                date_range=None,  # Always None - dates extracted from query
+                context=request.context
+            ),
+            _request_deadline(request.timeout_seconds),
+            is_disconnected=http_request.is_disconnected
         )
         
         execution_time = (datetime.now() - start_time).total_seconds()
         
         logger.info(f"KG query processed successfully in {execution_time:.2f}s")
         
-        return DynamicKGResponse(
-            success=True,
-            data=result.get('data'),
-            generated_code=result.get('generated_code'),
-            execution_time=execution_time,
-            insights=result.get('insights', []),
-            query_type=result.get('query_type')
+        # Storing rows beyond the first page writes to disk; keep it off the event loop
+        return await asyncio.to_thread(
+            _dynamic_kg_response, result, execution_time, request.format, request.page_size
         )
         
+    except ExecutionRejectedError as e:
+        logger.warning(f"KG query rejected by execution scheduler: {str(e)}")
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except DeadlineExceededError as e:
+        logger.warning(f"KG query stopped: {str(e)}")
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except ClientDisconnectedError as e:
+        logger.info(f"KG query abandoned after {(datetime.now() - start_time).total_seconds():.2f}s: client disconnected")
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
         execution_time = (datetime.now() - start_time).total_seconds()
         error_msg = f"Error processing KG query: {str(e)}"
@@ -128,6 +290,322 @@ async def dynamic_kg_query(request: DynamicKGRequest):
             execution_time=execution_time
         )
     
+@app.post("/kg-query/batch", response_model=BatchKGResponse)
+async def batch_kg_query(request: BatchKGRequest, http_request: Request):
+    """
+    Batch Knowledge Graph Query Endpoint
+    
+    Processes several queries at once, e.g. the panels of a dashboard.
+    LLM calls run concurrently and queries over overlapping months execute
+    in one shared sandbox session, so the KG files are loaded once per
+    group instead of once per query.
+    
+    Args:
+        request: BatchKGRequest with the queries and the KG path
+        
+    Returns:
+        BatchKGResponse with one DynamicKGResponse per query, in order
+    """
+    if not request.queries:
+        raise HTTPException(status_code=400, detail="No queries given")
+    if len(request.queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_BATCH_QUERIES} queries per batch"
+        )
+    
+    start_time = datetime.now()
+    try:
+        logger.info(f"Processing batch of {len(request.queries)} KG queries")
+        results = await run_with_deadline(
+            lambda: kg_agent.process_batch(request.queries, kg_path=request.kg_path),
+            _request_deadline(request.timeout_seconds),
+            is_disconnected=http_request.is_disconnected
+        )
+    except ExecutionRejectedError as e:
+        logger.warning(f"KG query batch rejected by execution scheduler: {str(e)}")
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except (DeadlineExceededError, ClientDisconnectedError) as e:
+        logger.warning(f"KG query batch stopped: {str(e)}")
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error processing KG query batch: {str(e)}\n{traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail=f"Error processing KG query batch: {str(e)}")
+    
+    execution_time = (datetime.now() - start_time).total_seconds()
+    logger.info(f"KG query batch processed in {execution_time:.2f}s")
+    
+    responses = [
+        DynamicKGResponse(success=False, error=f"Error processing KG query: {result['error']}")
+        if 'error' in result and 'data' not in result
+        else _dynamic_kg_response(result, result_format=request.format)
+        for result in results
+    ]
+    return BatchKGResponse(
+        success=all(response.success for response in responses),
+        results=responses,
+        execution_time=execution_time
+    )
+
+@app.post("/kg-query/stream")
+async def stream_kg_query(request: DynamicKGRequest):
+    """
+    Streaming Knowledge Graph Query Endpoint
+    
+    Runs the same pipeline as /kg-query but reports it as server-sent events,
+    so clients can show progress and the first rows before the query is done:
+    "analysis", "files", "code", "execution_started", "result" (chunks of
+    rows, then the result metadata), "insights", and finally "complete"
+    (the /kg-query response without the data rows) or "error".
+    
+    Args:
+        request: DynamicKGRequest containing query and optional parameters
+        
+    Returns:
+        text/event-stream response
+    """
+    events: asyncio.Queue = asyncio.Queue()
+    start_time = datetime.now()
+    
+    async def run_query():
+        try:
+            # Disconnects cancel this task directly (see event_stream)
+            result = await run_with_deadline(
+                lambda: kg_agent.process_query(
+                    query=request.query,
+                    kg_path=request.kg_path,
+                    date_range=None,  # Always None - dates extracted from query
+                    context=request.context,
+                    on_event=lambda event, payload: events.put_nowait((event, payload))
+                ),
+                _request_deadline(request.timeout_seconds)
+            )
+            execution_time = (datetime.now() - start_time).total_seconds()
+            if 'error' in result and 'data' not in result:
+                events.put_nowait(("error", {"error": f"Error processing KG query: {result['error']}"}))
+            else:
+                # Rows were already sent as "result" events
+                response = _dynamic_kg_response(result, execution_time).model_dump(exclude={"data"})
+                events.put_nowait(("complete", response))
+            logger.info(f"Streamed KG query processed in {execution_time:.2f}s")
+        except ExecutionRejectedError as e:
+            logger.warning(f"Streamed KG query rejected by execution scheduler: {str(e)}")
+            events.put_nowait(("error", {
+                "error": str(e),
+                "status_code": e.status_code,
+                "retry_after": e.retry_after
+            }))
+        except DeadlineExceededError as e:
+            logger.warning(f"Streamed KG query stopped: {str(e)}")
+            events.put_nowait(("error", {"error": str(e), "status_code": e.status_code}))
+        except Exception as e:
+            logger.error(f"Error processing streamed KG query: {str(e)}\n{traceback.format_exc()}")
+            events.put_nowait(("error", {"error": f"Error processing KG query: {str(e)}"}))
+        finally:
+            events.put_nowait(None)
+    
+    async def event_stream():
+        task = asyncio.create_task(run_query())
+        try:
+            while True:
+                item = await events.get()
+                if item is None:
+                    break
+                event, payload = item
+                if request.format == COLUMNAR and event == "result" and "rows" in payload:
+                    payload = {**payload, "rows": kg_agent.result_formatter.rows_to_columns(payload["rows"]) or payload["rows"]}
+                yield f"event: {event}\ndata: {serialization.dumps(payload).decode()}\n\n"
+        finally:
+            # The client went away before the query finished
+            if not task.done():
+                logger.info("Client disconnected from streamed KG query; cancelling it")
+                task.cancel()
+    
+    logger.info(f"Streaming KG query: {request.query[:100]}...")
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/kg-query/jobs", response_model=JobResponse, status_code=202)
+async def submit_kg_query_job(request: DynamicKGRequest):
+    """
+    Submit a KG query as a background job.
+    
+    For queries that may outlast an HTTP request, e.g. year-over-year
+    comparisons reading up to 24 monthly files. Poll
+    GET /kg-query/jobs/{job_id} for status and progress, then fetch
+    GET /kg-query/jobs/{job_id}/result. Finished jobs are kept for an hour.
+    
+    Args:
+        request: DynamicKGRequest containing query and optional parameters
+        
+    Returns:
+        JobResponse for the queued job
+    """
+    try:
+        job = kg_agent.job_manager.submit(
+            query=request.query,
+            kg_path=request.kg_path,
+            date_range=None,  # Always None - dates extracted from query
+            context=request.context
+        )
+    except JobRejectedError as e:
+        logger.warning(f"KG query job rejected: {str(e)}")
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    return JobResponse(**job.to_dict())
+
+@app.get("/kg-query/jobs", response_model=List[JobResponse])
+async def list_kg_query_jobs():
+    """List queued, running and recently finished KG query jobs."""
+    return [JobResponse(**job.to_dict()) for job in kg_agent.job_manager.list_jobs()]
+
+@app.get("/kg-query/jobs/{job_id}", response_model=JobResponse)
+async def get_kg_query_job(job_id: str):
+    """Status and progress of a KG query job."""
+    return JobResponse(**_get_job(job_id).to_dict())
+
+@app.get("/kg-query/jobs/{job_id}/result", response_model=DynamicKGResponse)
+async def get_kg_query_job_result(
+    job_id: str,
+    format: Literal["records", "columnar"] = RECORDS,
+    page_size: Optional[int] = None
+):
+    """
+    Result of a finished KG query job.
+    
+    Returns 409 while the job is still queued or running. format=columnar
+    returns the rows as one array per field; with page_size the rows beyond
+    the first page are kept for GET /kg-query/results/{result_id}.
+    """
+    job = _get_job(job_id)
+    if not job.finished:
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is {job.status}")
+    execution_time = job.finished_at - (job.started_at or job.finished_at)
+    if job.result is None:
+        return DynamicKGResponse(
+            success=False,
+            error=f"Job {job.status}: {job.error}" if job.error else f"Job {job.status}",
+            execution_time=execution_time
+        )
+    return await asyncio.to_thread(
+        _dynamic_kg_response, job.result, execution_time, format, page_size
+    )
+
+@app.delete("/kg-query/jobs/{job_id}", response_model=JobResponse)
+async def cancel_kg_query_job(job_id: str):
+    """Cancel a queued or running KG query job, stopping its sandbox."""
+    job = kg_agent.job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired job: {job_id}")
+    return JobResponse(**job.to_dict())
+
+@app.get("/kg-query/results/{result_id}", response_model=ResultPageResponse)
+async def get_kg_query_result_page(
+    result_id: str,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_ROWS,
+    format: Literal["records", "columnar"] = RECORDS
+):
+    """
+    Page of a query result kept server-side.
+    
+    Start without a cursor (or with data.pagination.next_cursor of the
+    query response) and pass each page's next_cursor to get the next one;
+    the last page has none. Pages hold at most MAX_PAGE_ROWS rows. Results
+    are kept for an hour.
+    """
+    try:
+        page = await asyncio.to_thread(
+            kg_agent.executor.result_store.page, result_id, cursor, limit
+        )
+    except (ResultNotFoundError, InvalidCursorError) as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    
+    rows = page["rows"]
+    if format == COLUMNAR:
+        rows = kg_agent.result_formatter.rows_to_columns(rows) or rows
+    return ResultPageResponse(result_id=result_id, **{**page, "rows": rows})
+
+@app.get("/kg-query/results/{result_id}/export")
+async def export_kg_query_result(result_id: str, format: Literal["csv", "parquet"] = "csv"):
+    """
+    Stream a query result kept server-side as CSV or Parquet.
+    
+    Rows are read and written in chunks (one Parquet row group each), so
+    results of any size are exported without being loaded whole. Parquet
+    needs pyarrow installed (501 otherwise).
+    """
+    result_store = kg_agent.executor.result_store
+    try:
+        if format == "parquet":
+            chunks = result_store.export_parquet(result_id)
+            media_type = "application/vnd.apache.parquet"
+        else:
+            chunks = result_store.export_csv(result_id)
+            media_type = "text/csv"
+    except (ResultNotFoundError, ExportUnavailableError) as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="kg-result-{result_id}.{format}"'}
+    )
+
+@app.delete("/kg-query/results/{result_id}")
+async def delete_kg_query_result(result_id: str):
+    """Discard a query result kept server-side before it expires."""
+    try:
+        deleted = kg_agent.executor.result_store.delete(result_id)
+    except ResultNotFoundError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    if not deleted:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired result: {result_id}")
+    return {"result_id": result_id, "deleted": True}
+
+def _get_job(job_id: str) -> QueryJob:
+    """Look up a job or raise 404."""
+    job = kg_agent.job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired job: {job_id}")
+    return job
+
+def _dynamic_kg_response(
+    result: Dict[str, Any],
+    execution_time: Optional[float] = None,
+    result_format: str = RECORDS,
+    page_size: Optional[int] = None
+) -> DynamicKGResponse:
+    """Build the API response for a processed query, with rows in the requested shape and page size."""
+    data = result.get('data')
+    if page_size and data:
+        data = kg_agent.executor.result_store.paginate(data, max(1, min(page_size, MAX_PAGE_ROWS)))
+    if result_format == COLUMNAR and data:
+        data = kg_agent.result_formatter.to_columnar(data)
+    return DynamicKGResponse(
+        success=True,
+        data=data,
+        generated_code=result.get('generated_code'),
+        execution_time=execution_time,
+        insights=result.get('insights', []),
+        query_type=result.get('query_type'),
+        analysis_path=result.get('analysis_path'),
+        execution_metadata=result.get('execution_metadata'),
+        resource_usage=result.get('resource_usage'),
+        query_plan=result.get('query_plan'),
+        timings=result.get('timings')
+    )
+    
 @app.get("/kg-files")
 async def list_kg_files(kg_path: str = "Data/KGs"):
     """List available KG files in the specified directory."""
@@ -189,19 +667,27 @@ async def chat(request: ChatRequest):
 
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
-    """Health check endpoint to verify agent and LLM connectivity."""
+    """
+    Health check endpoint to verify agent and LLM connectivity.
+    
+    Serves the background probe's cached outcome and its age; only the
+    very first call, before any probe finished, waits for a probe.
+    """
     try:
-        logger.info("Performing health check")
-        
-        # Use the test agent's health check method
-        health_info = test_agent.health_check()
+        health_info = health_monitor.last_result()
+        if health_info is None:
+            logger.info("Performing health check")
+            await health_monitor.check()
+            health_info = health_monitor.last_result()
         
         return HealthResponse(
             status=health_info["status"],
             message=health_info["message"],
-            agent_name=health_info["agent_name"],
+            agent_name=health_info.get("agent_name", test_agent.name),
             llm_response=health_info.get("llm_response"),
-            error=health_info.get("error")
+            error=health_info.get("error"),
+            checked_at=health_info.get("checked_at"),
+            age_seconds=health_info.get("age_seconds")
         )
         
     except Exception as e:
@@ -213,6 +699,43 @@ async def health_check():
             error=str(e)
         )
 
+@app.get("/health/live")
+async def liveness():
+    """
+    Liveness probe: the process is up and its event loop is serving requests.
+    
+    Checks local state only - never the LLM, the sandbox or the KG files -
+    so it is cheap enough to call every few seconds.
+    """
+    return {
+        "status": "alive",
+        "uptime_seconds": round(time.time() - health_monitor.started_at, 3),
+        "event_loop_lag_seconds": metrics.EVENT_LOOP_LAG.value(),
+        "requests_in_flight": metrics.HTTP_IN_FLIGHT.value(),
+        "health_probe_running": health_monitor.running
+    }
+
+@app.get("/health/ready")
+async def readiness():
+    """
+    Readiness probe from the cached background LLM probe.
+    
+    Returns 200 when the last probe succeeded and is recent, 503 otherwise
+    (no probe yet, last probe failed or stale). Never calls the LLM itself.
+    """
+    ready = health_monitor.readiness()
+    return JSONResponse(status_code=200 if ready["ready"] else 503, content=ready)
+
+@app.get("/stats")
+async def stats():
+    """Get LLM token usage and cache, scheduler and column store counters."""
+    return kg_agent.get_stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Request, pipeline stage, LLM, sandbox, cache and event loop metrics in the Prometheus text format."""
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
 @app.get("/agent-info")
 async def agent_info():
     """Get information about the configured agents."""
@@ -0,0 +1,193 @@
+# release_agent/batch_executor.py
+
+import json
+import logging
+from typing import Any, Dict, List
+
+from .secure_executor import SecureCodeExecutor
+
+logger = logging.getLogger(__name__)
+
+BATCH_RESULT_KEY = "batch_results"
+
+# Programs per sandbox session. The whole session runs under one execution
+# timeout, so larger groups are split rather than sharing that budget
+# between every program of a batch.
+MAX_GROUP_SIZE = 8
+
+# Runs each query's code in its own namespace inside one sandbox session.
+# The KG access library caches opened views per process, so every monthly
+# file is attached once for the whole group.
+_BATCH_RUNNER = '''
+import contextlib
+import io
+import traceback as _traceback
+
+_batch_results = []
+for _batch_index, _batch_code in enumerate(_BATCH_CODES):
+    _batch_stdout = io.StringIO()
+    _batch_namespace = {"__name__": "__main__", "kga": kga}
+    try:
+        with contextlib.redirect_stdout(_batch_stdout):
+            exec(compile(_batch_code, f"<query {_batch_index}>", "exec"), _batch_namespace)
+        _batch_results.append({"stdout": _batch_stdout.getvalue()})
+    except (Exception, SystemExit) as _batch_error:
+        _batch_results.append({
+            "stdout": _batch_stdout.getvalue(),
+            "error": str(_batch_error),
+            "traceback": _traceback.format_exc(),
+        })
+print(json.dumps({"%s": _batch_results}, default=str))
+''' % BATCH_RESULT_KEY
+
+
+class QueryBatchExecutor:
+    """
+    Executes groups of generated query programs in shared sandbox sessions.
+
+    Sandbox start-up and KG loading dominate the cost of small queries, so
+    queries reading overlapping months run together, up to MAX_GROUP_SIZE
+    per session: one sandbox process executes each program in turn,
+    capturing its stdout separately, and the per-query results are split out
+    again afterwards. A failing program doesn't affect the others in its
+    group.
+    """
+
+    def __init__(self, executor: SecureCodeExecutor):
+        self.executor = executor
+        self._stats = {"groups": 0, "queries": 0, "group_failures": 0}
+
+    @staticmethod
+    def group_by_files(
+        file_lists: List[List[str]], max_group_size: int = MAX_GROUP_SIZE
+    ) -> List[List[int]]:
+        """
+        Group queries whose target files overlap, directly or transitively.
+
+        Args:
+            file_lists: Target files of each query
+            max_group_size: Largest group; bigger ones are split in order
+
+        Returns:
+            Groups of query positions, each sorted, ordered by first position
+        """
+        parent = list(range(len(file_lists)))
+
+        def find(position: int) -> int:
+            while parent[position] != position:
+                parent[position] = parent[parent[position]]
+                position = parent[position]
+            return position
+
+        owner: Dict[str, int] = {}
+        for position, files in enumerate(file_lists):
+            for file_path in files:
+                if file_path in owner:
+                    root_a, root_b = find(owner[file_path]), find(position)
+                    if root_a != root_b:
+                        parent[max(root_a, root_b)] = min(root_a, root_b)
+                else:
+                    owner[file_path] = position
+
+        groups: Dict[int, List[int]] = {}
+        for position in range(len(file_lists)):
+            groups.setdefault(find(position), []).append(position)
+        return [
+            groups[root][start:start + max_group_size]
+            for root in sorted(groups)
+            for start in range(0, len(groups[root]), max_group_size)
+        ]
+
+    @staticmethod
+    def build_script(codes: List[str]) -> str:
+        """Build one sandbox program that runs each query program in turn."""
+        return f"_BATCH_CODES = {codes!r}\n{_BATCH_RUNNER}"
+
+    async def execute_group(self, codes: List[str], kg_path: str) -> List[Dict[str, Any]]:
+        """
+        Run several query programs in one sandbox session.
+
+        Args:
+            codes: Validated query programs
+            kg_path: Path to KG files directory
+
+        Returns:
+            One execution result per program, shaped like
+            SecureCodeExecutor.execute results. If the session itself fails
+            (timeout, crash), every program gets its error.
+
+        Raises:
+            ExecutionRejectedError: If the scheduler cannot admit the session
+        """
+        self._stats["groups"] += 1
+        self._stats["queries"] += len(codes)
+        logger.info(f"Executing {len(codes)} queries in one sandbox session")
+
+        # Without a spool, kga.emit_rows adds each program's rows to its own results
+        group_result = await self.executor.execute(
+            self.build_script(codes), working_directory=kg_path, spool=False
+        )
+        shared = {
+            "execution_time": group_result.get("execution_time"),
+            "scheduler": group_result.get("scheduler"),
+            "resources": group_result.get("resources"),
+            # Shared by the whole group, like the resource usage
+            "timings": group_result.get("timings"),
+            "cache_hit": False,
+        }
+
+        output = group_result.get("result") or {}
+        batch_results = output.get(BATCH_RESULT_KEY)
+        if (
+            not group_result.get("success")
+            or not isinstance(batch_results, list)
+            or len(batch_results) != len(codes)
+        ):
+            self._stats["group_failures"] += 1
+            error = group_result.get("error") or output.get("error") or "Batch execution failed"
+            return [
+                {
+                    **shared,
+                    "success": False,
+                    "error": error,
+                    "stdout": group_result.get("stdout", ""),
+                    "stderr": group_result.get("stderr", ""),
+                }
+                for _ in codes
+            ]
+
+        results = []
+        for code, entry in zip(codes, batch_results):
+            result = {
+                **shared,
+                "success": True,
+                "result": self._parse_output(entry),
+                "stdout": entry.get("stdout", ""),
+                "stderr": "",
+            }
+            # Later runs of the same program can reuse its result
+            self.executor.cache_result(code, kg_path, result)
+            results.append(result)
+        return results
+
+    @staticmethod
+    def _parse_output(entry: Dict[str, Any]) -> Dict[str, Any]:
+        """Parse a program's result like the sandbox does: its last JSON line."""
+        if "error" in entry:
+            return {
+                "error": entry["error"],
+                "traceback": entry.get("traceback"),
+                "data": [],
+                "metadata": {"execution_failed": True},
+            }
+        for line in reversed(entry.get("stdout", "").strip().split("\n")):
+            if line.strip():
+                try:
+                    return json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+        return {"data": [], "raw_output": entry.get("stdout", "")}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get batch execution counters."""
+        return dict(self._stats)
@@ -0,0 +1,121 @@
+# release_agent/code_cache.py
+
+import copy
+import hashlib
+import json
+import logging
+import os
+import re
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from .date_extractor import DateExtractor
+from .ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCodeCache:
+    """
+    Caches the analysis and validated code generated for a query.
+
+    Queries are keyed on their normalized wording (lowercased, punctuation
+    and extra whitespace removed, date phrases replaced by a placeholder)
+    plus the months the dates resolve to, the KG path and the schema
+    version. "Top stores in Florida, Jan 2022" and "top stores in florida
+    january 2022?" therefore share an entry, while the same question about
+    a different month does not.
+    """
+
+    def __init__(
+        self,
+        schema_version: str,
+        date_extractor: DateExtractor = None,
+        max_entries: int = 512,
+        ttl_seconds: float = 24 * 3600,
+    ):
+        self.schema_version = schema_version
+        self.date_extractor = date_extractor or DateExtractor()
+        self._cache = TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+
+    def normalize_query(
+        self, query: str, date_range: Optional[List[str]] = None
+    ) -> Tuple[str, Optional[List[str]]]:
+        """
+        Normalize a query for cache lookups.
+
+        Args:
+            query: Natural language query
+            date_range: Explicit date range from the request, if any
+
+        Returns:
+            (normalized text, resolved months or None if no dates were found)
+        """
+        text = self.date_extractor.strip_dates(query)
+        text = re.sub(r"[^\w<>\s]", " ", text)
+        text = re.sub(r"\s+", " ", text).strip()
+        dates = date_range or self.date_extractor.extract_dates(query)
+        return text, sorted(set(dates)) if dates else None
+
+    def make_key(
+        self, query: str, kg_path: str, date_range: Optional[List[str]] = None
+    ) -> str:
+        """
+        Build the cache key for a query.
+
+        Queries without resolvable dates ("recent trends") are interpreted
+        relative to today, so their key includes the current month.
+        """
+        text, dates = self.normalize_query(query, date_range)
+        payload = {
+            "query": text,
+            "dates": dates or f"as_of:{datetime.now():%Y%m}",
+            "kg_path": os.path.normpath(kg_path),
+            "schema": self.schema_version,
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Return a copy of a cached entry if all of its KG files still exist.
+
+        Returns:
+            Dict with query_analysis, target_files, generated_code and
+            formatted_code, or None
+        """
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        if not all(os.path.exists(file_path) for file_path in entry["target_files"]):
+            self._cache.delete(key)
+            return None
+        return copy.deepcopy(entry)
+
+    def set(
+        self,
+        key: str,
+        query_analysis: Dict[str, Any],
+        target_files: List[str],
+        generated_code: str,
+        formatted_code: str,
+    ) -> None:
+        """Cache the analysis and validated code for a query."""
+        self._cache.set(
+            key,
+            copy.deepcopy(
+                {
+                    "query_analysis": query_analysis,
+                    "target_files": target_files,
+                    "generated_code": generated_code,
+                    "formatted_code": formatted_code,
+                }
+            ),
+        )
+
+    def clear(self) -> None:
+        """Drop all cached code."""
+        self._cache.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics."""
+        return {**self._cache.get_stats(), "schema_version": self.schema_version}
@@ -1,11 +1,13 @@
 # release_agent/code_generator.py
 
-import json
 import re
 import ast
 import logging
-from typing import Dict, Any, List
+import textwrap
+from typing import Dict, Any, List, Optional, Tuple
 
+from .deadline import DeadlineExceededError
+from .prompt_builder import KGPromptBuilder, compact_json
 from .schema_manager import KGSchemaManager
 
 logger = logging.getLogger(__name__)
@@ -14,15 +16,23 @@ logger = logging.getLogger(__name__)
 class KGCodeGenerator:
     """Generates Python code to query knowledge graphs based on analysis."""
     
-    def __init__(self, llm_model=None, schema_manager: KGSchemaManager = None):
+    def __init__(
+        self,
+        llm_model=None,
+        schema_manager: KGSchemaManager = None,
+        prompt_builder: KGPromptBuilder = None
+    ):
         self.llm = llm_model
         self.schema_manager = schema_manager or KGSchemaManager()
+        self.prompt_builder = prompt_builder or KGPromptBuilder(self.schema_manager)
     
-    def generate_query_code(
+    async def generate_query_code(
         self, 
         query: str, 
         analysis: Dict[str, Any], 
-        target_files: List[str]
+        target_files: List[str],
+        query_params: Dict[str, Any] = None,
+        example: Optional[Dict[str, Any]] = None
     ) -> str:
         """
         Generate Python code to query the knowledge graph based on analysis.
@@ -31,13 +41,20 @@ class KGCodeGenerator:
             query: Original natural language query
             analysis: Query analysis results
             target_files: List of KG files to query
+            query_params: State/SBU/department filters extracted from the query
+            example: Similar earlier query and its working code, used in
+                place of the generic code template
             
         Returns:
             Generated Python code as string
         """
         if self.llm:
             try:
-                return self._generate_with_llm(query, analysis, target_files)
+                return await self._generate_with_llm(
+                    query, analysis, target_files, query_params, example
+                )
+            except DeadlineExceededError:
+                raise
             except Exception as e:
                 logger.warning(f"LLM code generation failed, using template: {e}")
         
@@ -45,37 +62,190 @@ class KGCodeGenerator:
         # Fallback to template-based generation
         return self._generate_with_template(analysis, target_files)
     
-    def _generate_with_llm(
+    async def _generate_with_llm(
         self, 
         query: str, 
         analysis: Dict[str, Any], 
-        target_files: List[str]
+        target_files: List[str],
+        query_params: Dict[str, Any] = None,
+        example: Optional[Dict[str, Any]] = None
     ) -> str:
         """Generate code using LLM for more sophisticated queries."""
-        code_prompt = f"""
-        Generate Python code to query knowledge graphs for this analysis:
+        code_prompt = self.prompt_builder.build(
+            "Generate Python code to query knowledge graphs for the analysis given at the end.",
+            self._code_guidance(),
+            self._schema_context(analysis),
+            f"""
+            Query: "{query}"
+            Analysis: {compact_json(analysis)}
+            Target files: {target_files}
+            """,
+            self._code_template(analysis, target_files, query_params, example),
+        )
         
-        Query: "{query}"
-        Analysis: {json.dumps(analysis, indent=2)}
-        Target files: {target_files}
+        # Async call so the event loop keeps serving other requests meanwhile
+        generated_code = await self.llm.generate_content_async(code_prompt, purpose="codegen")
         
-        Complete KG Schema:
-        {json.dumps(self.schema_manager.schema, indent=2)}
+        return self._extract_code(generated_code)
+    
+    async def generate_analysis_and_code(
+        self,
+        query: str,
+        preliminary_analysis: Dict[str, Any],
+        target_files: List[str],
+        analysis_instructions: str,
+        query_context: str,
+        query_params: Dict[str, Any] = None,
+        example: Optional[Dict[str, Any]] = None
+    ) -> Tuple[str, str]:
+        """
+        Analyze the query and generate its code in a single LLM round trip.
         
+        The target files are resolved up front (from the dates found in the
+        query), so the model can write the code in the same response as the
+        analysis instead of waiting for a separate analysis call.
+        
+        Args:
+            query: Original natural language query
+            preliminary_analysis: Rule-based analysis used to pre-select files
+            target_files: KG files already selected for the query
+            analysis_instructions: Static analysis task description from QueryAnalyzer
+            query_context: Query and current date section from QueryAnalyzer
+            query_params: State/SBU/department filters extracted from the query
+            example: Similar earlier query and its working code
+            
+        Returns:
+            (raw analysis JSON text, generated code)
+        """
+        combined_prompt = self.prompt_builder.build(
+            """
+            You will answer in ONE response with two fenced blocks:
+            1. A ```json block containing the query analysis (PART 1)
+            2. A ```python block containing the query code (PART 2)
+            """,
+            f"PART 1 - Query analysis:\n{textwrap.dedent(analysis_instructions)}",
+            f"""
+            PART 2 - Query code:
+            Generate Python code that answers the query according to YOUR PART 1 analysis
+            (node types, query pattern, filters). The KG files have already been selected
+            from the dates in the query; keep "extracted_date_range" in PART 1 consistent
+            with them. The code at the end was chosen from a preliminary keyword analysis;
+            adjust it to your analysis.
+            """,
+            self._code_guidance(),
+            self._schema_context(preliminary_analysis),
+            query_context,
+            f"Target files: {target_files}",
+            self._code_template(preliminary_analysis, target_files, query_params, example),
+        )
+        
+        response = await self.llm.generate_content_async(combined_prompt, purpose="analysis+codegen")
+        
+        analysis_match = re.search(r'```json\s*\n(.*?)\n```', response, re.DOTALL)
+        if not analysis_match:
+            raise ValueError("Combined LLM response is missing the analysis block")
+        
+        return analysis_match.group(1), self._extract_code(response)
+    
+    def _extract_code(self, response: str) -> str:
+        """Extract Python code from an LLM response."""
+        # Clean up the code (remove markdown formatting if present)
+        code_match = re.search(r'```python\n(.*?)\n```', response, re.DOTALL)
+        if code_match:
+            return code_match.group(1)
+        else:
+            # If no markdown formatting, return as-is but validate
+            return self.validate_and_fix_code(response)
+    
+    def _schema_context(self, analysis: Dict[str, Any]) -> str:
+        """Compact schema section scoped to the analysis' pattern and node types."""
+        scoped = self.prompt_builder.scoped_schema(
+            analysis.get('query_pattern'), analysis.get('target_node_types')
+        )
+        return f"Relevant schema (node ID patterns and properties): {scoped}"
+    
+    def _code_guidance(self) -> str:
+        """Static code requirements and kga helper catalog (cacheable prompt prefix)."""
+        return """
         Requirements:
-        1. Load the NetworkX graphs from JSON files
-        2. Query the graph structure according to the hierarchy and node types
-        3. Focus on node types: {analysis.get('target_node_types', [])}
-        4. Use query pattern: {analysis.get('query_pattern', 'general')}
-        5. Extract relevant data based on the query
-        6. Return results in a standardized format
+        1. Access the KG files through the preloaded kga helpers (indexed, memory-mapped)
+        2. Filter with kga filters (state/sbu/dept/store/date) rather than scanning all nodes
+        3. Focus on the node types and query pattern of the analysis
+        4. Extract relevant data based on the query
+        5. Return results in a standardized format
         
         Available imports: json, networkx as nx, pandas as pd, numpy as np, datetime
         
-        Node ID patterns to use:
-        {json.dumps(self.schema_manager.schema['node_id_patterns'], indent=2)}
+        KG access library: `kga` is preloaded (do not import it). It is backed by precomputed,
+        memory-mapped indexes, so ALWAYS use it instead of json.load + nx.node_link_graph and
+        instead of looping over every node and splitting node IDs:
+        - kga.nodes_by_type(files, node_type, state=None, sbu=None, dept=None, store=None, date=None)
+          -> list of dicts (node_id, node_type, file_source, properties); filters accept a value
+          or a list, are case-insensitive, and date matches by prefix ("202201", "20220115")
+        - kga.filter_nodes(files, node_type, state=..., sbu=..., dept=...) -> same as above
+        - kga.iter_nodes(files, node_type, **filters) -> generator of the same records, one month
+          at a time
+        - kga.emit_rows(results, rows) -> adds rows to results['data'] without holding them in
+          memory and returns the count; use it with kga.iter_nodes whenever raw node records are
+          returned (e.g. every store node over several months) instead of building a list
+        - kga.aggregate(files, node_type, metric, by=["state", "sbu", ...], **filters)
+          -> list of dicts with group keys, summed metric and count (by: date, month, sbu,
+          dept, store, state or any property)
+        - kga.store_series(files, store_id, metric="total_gmv_amt", node_type="day_store",
+          sbu=None, dept=None) -> [{"date": "YYYYMMDD", "value": ...}] sorted by date
+        - kga.get_node(files, node_id), kga.children(files, node_id, node_type=None),
+          kga.parent(files, node_id)
+        - kga.open_kgs(files) -> per-month views with column(node_type, name) (NumPy arrays),
+          field(node_type, name), select(node_type, **filters) and records(node_type, positions)
+        
+        Write the query as a reusable function, exactly as in the code template:
+        def run_query(files, date_range=None, state=None, sbu=None, dept=None) -> results dict
+        - Use ONLY the arguments for KG files, dates, state, SBU and department; never
+          hardcode file paths, dates or filter values inside the function (it is reused
+          for other months, states, SBUs and departments)
+        - Pass state/sbu/dept straight to the kga filters (None means no filter)
+        - Bind this query's values in the PARAMS dict given in the template, unchanged
+        
+        Generate complete, executable Python code that prints the 'results' dictionary as JSON.
+        The final lines MUST be: results = run_query(**PARAMS) and print(json.dumps(results))
+        
+        IMPORTANT: Do not end with just 'results' - always end with print(json.dumps(results)) so the executor can capture the output.
+        
+        Focus on extracting meaningful data that matches the query intent and uses the correct node types.
+        """
+    
+    def _code_template(
+        self,
+        analysis: Dict[str, Any],
+        target_files: List[str],
+        query_params: Dict[str, Any] = None,
+        example: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """
+        Build the per-query code part of the prompt.
         
-        Code template:
+        With an example (a similar earlier query and its working code) the
+        example replaces the generic template, which is both shorter and a
+        better starting point.
+        """
+        params = {
+            "files": target_files,
+            "date_range": analysis.get('extracted_date_range'),
+            "state": None,
+            "sbu": None,
+            "dept": None,
+            **(query_params or {}),
+        }
+        if example:
+            return (
+                "A similar query was answered successfully by the code below. Adapt it to "
+                "this query, keep the run_query function reusable and bind this query's "
+                f"parameters:\nPARAMS = {params!r}\n\n"
+                f"Similar query: \"{example['query']}\"\n"
+                f"```python\n{example['code']}\n```"
+            )
+        return f"""
+        Code template for node types {analysis.get('target_node_types', [])}, query pattern {analysis.get('query_pattern', 'general')}:
         ```python
         import json
         import networkx as nx
@@ -83,76 +253,49 @@ class KGCodeGenerator:
         import numpy as np
         from datetime import datetime
         
-        # Results dictionary to return
-        results = {{
-            'data': [],
-            'metadata': {{}},
-            'summary': {{}}
-        }}
         
-        try:
-            # Load KG files
-            graphs = []
-            for file_path in {target_files}:
-                with open(file_path, 'r') as f:
-                    kg_data = json.load(f)
-                    kg = nx.node_link_graph(kg_data)
-                    graphs.append((file_path, kg))
-            
-            # Initialize data collection
-            analyzed_data = []
+        def run_query(files, date_range=None, state=None, sbu=None, dept=None):
+            # Results dictionary to return
+            results = {{
+                'data': [],
+                'metadata': {{}},
+                'summary': {{}}
+            }}
             
-            # Process each graph
-            for file_path, kg in graphs:
-                # Extract nodes by type based on analysis
+            try:
+                # Stream node records by type based on analysis, using the indexed helpers
+                total_records = 0
                 target_node_types = {analysis.get('target_node_types', ['sbu', 'store'])}
+                for node_type in target_node_types:
+                    total_records += kga.emit_rows(
+                        results, kga.iter_nodes(files, node_type, state=state, sbu=sbu, dept=dept)
+                    )
                 
-                for node_id, node_attrs in kg.nodes(data=True):
-                    node_type = node_attrs.get('node_type')
-                    if node_type in target_node_types:
-                        # Collect relevant data based on query
-                        data_point = {{
-                            'node_id': node_id,
-                            'node_type': node_type,
-                            'file_source': file_path,
-                            **node_attrs
-                        }}
-                        analyzed_data.append(data_point)
-            
-            # Format results based on query pattern
-            results['data'] = analyzed_data
-            results['metadata'] = {{
-                'query_type': '{analysis['type']}', 
-                'file_count': len(graphs),
-                'target_node_types': {analysis.get('target_node_types', [])},
-                'query_pattern': '{analysis.get('query_pattern', 'general')}'
-            }}
-            results['summary'] = {{'total_records': len(analyzed_data)}}
+                # Format results based on query pattern
+                results['metadata'] = {{
+                    'query_type': '{analysis['type']}', 
+                    'file_count': len(files),
+                    'date_range': date_range,
+                    'filters': {{'state': state, 'sbu': sbu, 'dept': dept}},
+                    'target_node_types': {analysis.get('target_node_types', [])},
+                    'query_pattern': '{analysis.get('query_pattern', 'general')}'
+                }}
+                results['summary'] = {{'total_records': total_records}}
+                
+            except Exception as e:
+                results['error'] = str(e)
             
-        except Exception as e:
-            results['error'] = str(e)
+            return results
+        
+        
+        # Parameters of this query
+        PARAMS = {params!r}
+        results = run_query(**PARAMS)
         
         # Print results as JSON for capture by executor
         print(json.dumps(results))
         ```
-        
-        Generate complete, executable Python code that prints the 'results' dictionary as JSON.
-        The final line MUST be: print(json.dumps(results))
-        
-        IMPORTANT: Do not end with just 'results' - always end with print(json.dumps(results)) so the executor can capture the output.
-        
-        Focus on extracting meaningful data that matches the query intent and uses the correct node types.
         """
-        
-        generated_code = self.llm.generate(code_prompt)
-        
-        # Clean up the code (remove markdown formatting if present)
-        code_match = re.search(r'```python\n(.*?)\n```', generated_code, re.DOTALL)
-        if code_match:
-            return code_match.group(1)
-        else:
-            # If no markdown formatting, return as-is but validate
-            return self.validate_and_fix_code(generated_code)
     
     def _generate_with_template(self, analysis: Dict[str, Any], target_files: List[str]) -> str:
         """Generate code using a template-based approach."""
@@ -175,33 +318,15 @@ class KGCodeGenerator:
         }}
 
         try:
-            # Load KG files
-            graphs = []
-            for file_path in {target_files}:
-                with open(file_path, 'r') as f:
-                    kg_data = json.load(f)
-                    kg = nx.node_link_graph(kg_data)
-                    graphs.append((file_path, kg))
+            files = {target_files}
             
             # Initialize data collection
             analyzed_data = []
             
-            # Process each graph
-            for file_path, kg in graphs:
-                # Extract nodes by type based on analysis
-                target_node_types = {target_node_types}
-                
-                for node_id, node_attrs in kg.nodes(data=True):
-                    node_type = node_attrs.get('node_type')
-                    if node_type in target_node_types:
-                        # Collect relevant data based on query
-                        data_point = {{
-                            'node_id': node_id,
-                            'node_type': node_type,
-                            'file_source': file_path,
-                            **node_attrs
-                        }}
-                        analyzed_data.append(data_point)
+            # Extract nodes by type based on analysis, using the indexed helpers
+            target_node_types = {target_node_types}
+            for node_type in target_node_types:
+                analyzed_data.extend(kga.nodes_by_type(files, node_type))
             
             # Apply pattern-specific processing
             {self._get_pattern_specific_code(query_pattern)}
@@ -210,7 +335,7 @@ class KGCodeGenerator:
             results['data'] = analyzed_data
             results['metadata'] = {{
                 'query_type': '{analysis.get('type', 'general')}', 
-                'file_count': len(graphs),
+                'file_count': len(files),
                 'target_node_types': {target_node_types},
                 'query_pattern': '{query_pattern}'
             }}
@@ -33,6 +33,43 @@ class DateExtractor:
             'hurricane harvey': ['201708', '201707'], # August 2017
         }
     
+    def strip_dates(self, query: str, placeholder: str = "<dates>") -> str:
+        """
+        Replace the date phrases this extractor understands with a placeholder.
+        
+        Used to build cache keys where the wording of a date doesn't matter,
+        only the months it resolves to. A bare year is only a date after
+        "year", "in", "of" or "during" ("in 2022"); other numbers, such
+        as store 2001, are part of the query and stay.
+        
+        Args:
+            query: Natural language query
+            placeholder: Text to put in place of each date phrase
+            
+        Returns:
+            Lowercased query with date phrases replaced
+        """
+        months = '|'.join(sorted(self.month_map, key=len, reverse=True))
+        quarters = '|'.join(sorted(self.quarter_map, key=len, reverse=True))
+        patterns = [
+            rf'\b(?:{months})\s+to\s+(?:{months})(?:\s+\d{{4}})?\b',
+            rf'\b(?:{months})\s+\d{{4}}\b',
+            rf'\b(?:{quarters})\s+\d{{4}}\b',
+            r'\blast\s+\d+\s+months?\b',
+            r'\blast\s+(?:quarter|year)\b',
+            r'\byear\s+(?:19|20)\d{2}\b',
+        ]
+        
+        stripped = query.lower()
+        for pattern in patterns:
+            stripped = re.sub(pattern, placeholder, stripped)
+        # Keep the preposition, as for "in <month> <year>"
+        return re.sub(
+            r'\b(in|of|during)\s+(?:19|20)\d{2}\b',
+            lambda match: f'{match.group(1)} {placeholder}',
+            stripped,
+        )
+    
     def extract_dates(self, query: str) -> Optional[List[str]]:
         """
         Extract dates from query using various patterns.
@@ -0,0 +1,156 @@
+# release_agent/deadline.py
+
+import asyncio
+import contextvars
+import logging
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Deadline of the request being processed in the current task; copied into
+# tasks and threads started from it
+_CURRENT_DEADLINE: contextvars.ContextVar[Optional["Deadline"]] = contextvars.ContextVar(
+    "deadline", default=None
+)
+
+
+class DeadlineExceededError(Exception):
+    """Raised when a request runs past its deadline (HTTP 504)."""
+
+    status_code = 504
+
+    def __init__(self, message: str, stage: Optional[str] = None):
+        super().__init__(message)
+        self.stage = stage
+
+
+class ClientDisconnectedError(Exception):
+    """Raised when the client went away before its request finished."""
+
+    # nginx's "client closed request"; the client never sees it
+    status_code = 499
+
+
+class Deadline:
+    """Point in time by which a request must finish."""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        """Seconds left, never negative."""
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def check(self, stage: str) -> None:
+        """
+        Raise if the deadline has passed.
+
+        Raises:
+            DeadlineExceededError: Naming the stage that was about to start
+        """
+        if self.expired:
+            raise DeadlineExceededError(
+                f"Request deadline of {self.seconds:g}s exceeded before {stage}", stage
+            )
+
+    def clamp(self, timeout: Optional[float]) -> float:
+        """The smaller of a timeout and the time left."""
+        remaining = self.remaining()
+        return remaining if timeout is None else min(timeout, remaining)
+
+
+def current_deadline() -> Optional[Deadline]:
+    """The deadline of the request being processed, if any."""
+    return _CURRENT_DEADLINE.get()
+
+
+def check_deadline(stage: str) -> None:
+    """Raise DeadlineExceededError if the current request is out of time."""
+    deadline = _CURRENT_DEADLINE.get()
+    if deadline is not None:
+        deadline.check(stage)
+
+
+def clamp_timeout(timeout: Optional[float]) -> Optional[float]:
+    """Shorten a timeout to the current request's remaining time."""
+    deadline = _CURRENT_DEADLINE.get()
+    return timeout if deadline is None else deadline.clamp(timeout)
+
+
+def shared_context() -> contextvars.Context:
+    """
+    Copy the current context without the request deadline.
+
+    For work started on behalf of several requests, each of which waits on
+    it under its own deadline; everything else (e.g. the stage timer) is
+    kept.
+    """
+    context = contextvars.copy_context()
+    context.run(_CURRENT_DEADLINE.set, None)
+    return context
+
+
+async def run_with_deadline(
+    fn: Callable[[], Awaitable[Any]],
+    seconds: float,
+    is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+    poll_interval: float = 0.5,
+) -> Any:
+    """
+    Run a request's work under a deadline, watching for client disconnects.
+
+    The work runs as its own task with the deadline current, so LLM calls
+    and sandbox executions started from it shorten their timeouts to the
+    time left. When the deadline passes or the client disconnects, the task
+    is cancelled: pending LLM calls are abandoned and running sandbox
+    processes are killed.
+
+    Args:
+        fn: Coroutine function doing the work
+        seconds: Deadline, from now
+        is_disconnected: Async callable reporting whether the client left,
+            e.g. Request.is_disconnected
+        poll_interval: Seconds between disconnect checks
+
+    Returns:
+        The work's result
+
+    Raises:
+        DeadlineExceededError: If the deadline passed first
+        ClientDisconnectedError: If the client disconnected first
+    """
+    deadline = Deadline(seconds)
+
+    async def scoped() -> Any:
+        _CURRENT_DEADLINE.set(deadline)
+        return await fn()
+
+    task = asyncio.create_task(scoped())
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=min(poll_interval, deadline.remaining()))
+            if done:
+                return task.result()
+            if deadline.expired:
+                logger.warning(f"Request deadline of {seconds:g}s exceeded; cancelling its work")
+                await _cancel(task)
+                raise DeadlineExceededError(f"Request deadline of {seconds:g}s exceeded")
+            if is_disconnected is not None and await is_disconnected():
+                logger.info("Client disconnected; cancelling its request")
+                await _cancel(task)
+                raise ClientDisconnectedError("Client disconnected")
+    except asyncio.CancelledError:
+        await _cancel(task)
+        raise
+
+
+async def _cancel(task: asyncio.Task) -> None:
+    """Cancel a task and wait until it has unwound (sandboxes killed)."""
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
@@ -0,0 +1,179 @@
+# release_agent/execution_scheduler.py
+
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+from .deadline import DeadlineExceededError, clamp_timeout
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutionRejectedError(Exception):
+    """Raised when a sandbox execution cannot be admitted (HTTP 429)."""
+
+    status_code = 429
+
+    def __init__(self, message: str, queue_depth: int, retry_after: int = 1):
+        super().__init__(message)
+        self.queue_depth = queue_depth
+        self.retry_after = retry_after
+
+
+class ExecutionScheduler:
+    """
+    Global admission control for sandbox executions.
+
+    At most ``max_concurrent`` sandboxes run at once. Up to ``max_queue``
+    further requests wait for a slot for at most ``queue_timeout`` seconds,
+    or until the request's deadline if that comes first; anything beyond
+    that is rejected immediately instead of piling more interpreters onto
+    the host.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = 4,
+        max_queue: int = 16,
+        queue_timeout: float = 10.0,
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._running = 0
+        self._waiting = 0
+        self._stats = {
+            "admitted": 0,
+            "rejected_queue_full": 0,
+            "rejected_timeout": 0,
+            "deadline_exceeded": 0,
+            "total_wait_time": 0.0,
+            "max_wait_time": 0.0,
+        }
+
+    @property
+    def running(self) -> int:
+        """Number of executions currently holding a slot."""
+        return self._running
+
+    @property
+    def waiting(self) -> int:
+        """Number of executions currently waiting for a slot."""
+        return self._waiting
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Hold an execution slot for the duration of the block.
+
+        Yields:
+            Admission info: queue depth on arrival, time spent waiting and
+            the number of executions running when the slot was granted
+
+        Raises:
+            ExecutionRejectedError: If the wait queue is full or the wait
+                exceeded ``queue_timeout``
+            DeadlineExceededError: If the request's deadline passed while
+                waiting
+        """
+        queue_depth = self._waiting
+        if self._semaphore.locked() and queue_depth >= self.max_queue:
+            self._stats["rejected_queue_full"] += 1
+            logger.warning(
+                f"Rejecting execution: {self._running} running, {queue_depth} queued"
+            )
+            raise ExecutionRejectedError(
+                f"Execution queue is full ({queue_depth} waiting); retry later",
+                queue_depth=queue_depth,
+            )
+
+        wait_start = time.time()
+        timeout = clamp_timeout(self.queue_timeout)
+        self._waiting += 1
+        try:
+            acquired = await self._acquire(timeout)
+        finally:
+            self._waiting -= 1
+        if not acquired and timeout < self.queue_timeout:
+            self._stats["deadline_exceeded"] += 1
+            raise DeadlineExceededError(
+                "Request deadline exceeded waiting for an execution slot",
+                stage="sandbox queue",
+            )
+        if not acquired:
+            self._stats["rejected_timeout"] += 1
+            raise ExecutionRejectedError(
+                f"Timed out after {self.queue_timeout}s waiting for an execution slot",
+                queue_depth=queue_depth,
+                retry_after=max(1, int(self.queue_timeout)),
+            )
+
+        wait_time = time.time() - wait_start
+        self._running += 1
+        self._stats["admitted"] += 1
+        self._stats["total_wait_time"] += wait_time
+        self._stats["max_wait_time"] = max(self._stats["max_wait_time"], wait_time)
+
+        try:
+            yield {
+                "queue_depth": queue_depth,
+                "wait_time": wait_time,
+                "running": self._running,
+                "max_concurrent": self.max_concurrent,
+            }
+        finally:
+            self._running -= 1
+            self._semaphore.release()
+
+    async def _acquire(self, timeout: Optional[float]) -> bool:
+        """
+        Take a semaphore permit, waiting at most ``timeout`` seconds.
+
+        asyncio.wait_for can drop a permit granted just as the wait times
+        out or is cancelled (before Python 3.12), so the acquire runs as its
+        own task and a permit it gets after the wait gave up is released.
+
+        Returns:
+            Whether a permit was taken
+        """
+        if not self._semaphore.locked():
+            # Taken without suspending, so nothing can interrupt it
+            await self._semaphore.acquire()
+            return True
+
+        def release_late_permit(task: asyncio.Future) -> None:
+            if not task.cancelled():
+                self._semaphore.release()
+
+        acquire = asyncio.ensure_future(self._semaphore.acquire())
+        done = set()
+        try:
+            done, _ = await asyncio.wait({acquire}, timeout=timeout)
+        finally:
+            if not done:
+                acquire.cancel()
+                acquire.add_done_callback(release_late_permit)
+        return bool(done)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get current scheduler state and counters."""
+        return {
+            "running": self._running,
+            "waiting": self._waiting,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "queue_timeout": self.queue_timeout,
+            **self._stats,
+        }
+
+
+# Global scheduler shared by every executor in the process
+execution_scheduler = ExecutionScheduler(
+    max_concurrent=int(os.environ.get("KG_SANDBOX_MAX_CONCURRENT", "4")),
+    max_queue=int(os.environ.get("KG_SANDBOX_MAX_QUEUE", "16")),
+    queue_timeout=float(os.environ.get("KG_SANDBOX_QUEUE_TIMEOUT_SECONDS", "10")),
+)
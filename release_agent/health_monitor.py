@@ -0,0 +1,146 @@
+# release_agent/health_monitor.py
+
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class HealthMonitor:
+    """
+    Runs a health probe in the background and caches its outcome.
+
+    The probe (e.g. TestAgent.health_check, a real LLM completion) is slow
+    and paid for, so it runs every ``interval_seconds`` rather than on every
+    load balancer probe. Readiness is answered from the cached outcome and
+    its age; an outcome older than ``stale_after_seconds`` - the probe loop
+    stalled - counts as not ready.
+    """
+
+    def __init__(
+        self,
+        probe: Callable[[], Dict[str, Any]],
+        interval_seconds: float = 60.0,
+        timeout_seconds: float = 30.0,
+        stale_after_seconds: Optional[float] = None,
+    ):
+        """
+        Args:
+            probe: Blocking callable returning a dict with "status"
+                ("healthy" or "unhealthy"); run in a worker thread
+            interval_seconds: Time between probes
+            timeout_seconds: Probes running longer count as failed
+            stale_after_seconds: Age after which a cached outcome is not
+                trusted; defaults to three intervals
+        """
+        self.probe = probe
+        self.interval_seconds = interval_seconds
+        self.timeout_seconds = timeout_seconds
+        self.stale_after_seconds = stale_after_seconds or 3 * interval_seconds
+        self.started_at = time.time()
+        self._last: Optional[Dict[str, Any]] = None
+        self._checked_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self._stats = {"probes": 0, "failures": 0, "consecutive_failures": 0}
+
+    @property
+    def running(self) -> bool:
+        """Whether the background probe loop is active."""
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """Start probing in the background (call from the running event loop)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop probing."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await self.check()
+            await asyncio.sleep(self.interval_seconds)
+
+    async def check(self) -> Dict[str, Any]:
+        """
+        Run the probe now and cache its outcome.
+
+        Concurrent callers share one probe run.
+        """
+        if self._lock.locked():
+            async with self._lock:
+                return self._last
+        async with self._lock:
+            start = time.time()
+            try:
+                outcome = await asyncio.wait_for(
+                    asyncio.to_thread(self.probe), timeout=self.timeout_seconds
+                )
+            except asyncio.TimeoutError:
+                outcome = {
+                    "status": "unhealthy",
+                    "message": f"Health probe timed out after {self.timeout_seconds}s",
+                    "error": "timeout",
+                }
+            except Exception as e:
+                outcome = {
+                    "status": "unhealthy",
+                    "message": "Health probe failed",
+                    "error": str(e),
+                }
+
+            outcome = {**outcome, "probe_seconds": round(time.time() - start, 3)}
+            healthy = outcome.get("status") == "healthy"
+            self._stats["probes"] += 1
+            if healthy:
+                self._stats["consecutive_failures"] = 0
+            else:
+                self._stats["failures"] += 1
+                self._stats["consecutive_failures"] += 1
+                logger.warning(f"Health probe failed: {outcome.get('error')}")
+            self._last = outcome
+            self._checked_at = time.time()
+            return outcome
+
+    def last_result(self) -> Optional[Dict[str, Any]]:
+        """The cached probe outcome with its age, or None before the first probe."""
+        if self._last is None:
+            return None
+        return {
+            **self._last,
+            "checked_at": self._checked_at,
+            "age_seconds": round(time.time() - self._checked_at, 3),
+        }
+
+    def readiness(self) -> Dict[str, Any]:
+        """
+        Readiness from the cached probe outcome.
+
+        Returns:
+            Dict with ready, reason and the last probe outcome ("probe"),
+            without running the probe
+        """
+        last = self.last_result()
+        if last is None:
+            return {"ready": False, "reason": "no probe completed yet", "probe": None}
+        if last["age_seconds"] > self.stale_after_seconds:
+            return {"ready": False, "reason": "last probe is stale", "probe": last}
+        if last.get("status") != "healthy":
+            return {"ready": False, "reason": "last probe failed", "probe": last}
+        return {"ready": True, "reason": None, "probe": last}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get probe counters and the age of the cached outcome."""
+        last = self.last_result()
+        return {
+            **self._stats,
+            "interval_seconds": self.interval_seconds,
+            "last_age_seconds": last["age_seconds"] if last else None,
+        }
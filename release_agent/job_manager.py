@@ -0,0 +1,299 @@
+# release_agent/job_manager.py
+
+import asyncio
+import logging
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+# Share of the work done once a pipeline event has been seen
+STAGE_PROGRESS = {
+    "analysis": 0.2,
+    "files": 0.3,
+    "code": 0.5,
+    "execution_started": 0.6,
+    "result": 0.9,
+    "insights": 0.95,
+}
+
+# Runs one query: (query, kg_path, date_range, context, on_event) -> result
+QueryRunner = Callable[..., Awaitable[Dict[str, Any]]]
+
+
+class JobRejectedError(Exception):
+    """Raised when the job queue is full (HTTP 429)."""
+
+    status_code = 429
+
+    def __init__(self, message: str, queue_depth: int, retry_after: int = 5):
+        super().__init__(message)
+        self.queue_depth = queue_depth
+        self.retry_after = retry_after
+
+
+class QueryJob:
+    """State of one submitted query job."""
+
+    def __init__(
+        self,
+        query: str,
+        kg_path: str,
+        date_range: Optional[List[str]] = None,
+        context: Optional[Dict[str, Any]] = None,
+    ):
+        self.job_id = uuid.uuid4().hex
+        self.query = query
+        self.kg_path = kg_path
+        self.date_range = date_range
+        self.context = context
+        self.status = QUEUED
+        self.stage: Optional[str] = None
+        self.progress = 0.0
+        self.target_files: List[str] = []
+        self.rows_ready = 0
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATES
+
+    def record_event(self, event: str, payload: Dict[str, Any]) -> None:
+        """Advance stage and progress from a pipeline event."""
+        self.stage = event
+        self.progress = max(self.progress, STAGE_PROGRESS.get(event, self.progress))
+        if event == "files":
+            self.target_files = payload.get("target_files", [])
+        elif event == "result" and "rows" in payload:
+            self.rows_ready += len(payload["rows"])
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Status view of the job, without the result."""
+        now = self.finished_at or time.time()
+        return {
+            "job_id": self.job_id,
+            "query": self.query,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": round(self.progress, 3),
+            "target_files": self.target_files,
+            "rows_ready": self.rows_ready,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "elapsed_seconds": round(now - (self.started_at or now), 3),
+        }
+
+
+class QueryJobManager:
+    """
+    Runs long queries as background jobs.
+
+    Multi-year comparisons can select two dozen monthly files and outlive
+    HTTP timeouts, so clients submit them, poll status and progress, and
+    fetch the result later. A fixed pool of worker tasks takes jobs from a
+    bounded queue; when the queue is full, submissions are rejected rather
+    than accepted and left waiting. Cancelling a running job cancels its
+    pipeline task, which stops the sandbox process it is waiting on.
+    Finished jobs and their results are kept for ``result_ttl_seconds``.
+    """
+
+    def __init__(
+        self,
+        runner: QueryRunner,
+        max_workers: int = 2,
+        max_queued: int = 50,
+        result_ttl_seconds: float = 3600.0,
+    ):
+        """
+        Args:
+            runner: Coroutine function running one query, e.g.
+                KGQueryAgent.process_query
+            max_workers: Jobs running at the same time
+            max_queued: Jobs waiting for a worker before submissions are rejected
+            result_ttl_seconds: How long finished jobs stay available
+        """
+        self.runner = runner
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.result_ttl_seconds = result_ttl_seconds
+        self._jobs: Dict[str, QueryJob] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._stats = {
+            "submitted": 0,
+            "rejected": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "cancelled": 0,
+            "expired": 0,
+        }
+
+    def submit(
+        self,
+        query: str,
+        kg_path: str = "Data/KGs",
+        date_range: Optional[List[str]] = None,
+        context: Optional[Dict[str, Any]] = None,
+    ) -> QueryJob:
+        """
+        Queue a query for background execution.
+
+        Returns:
+            The queued job
+
+        Raises:
+            JobRejectedError: If max_queued jobs are already waiting
+        """
+        self._purge_expired()
+        self._ensure_workers()
+        if self._queue.qsize() >= self.max_queued:
+            self._stats["rejected"] += 1
+            raise JobRejectedError(
+                f"Job queue is full ({self._queue.qsize()} waiting)",
+                queue_depth=self._queue.qsize(),
+            )
+
+        job = QueryJob(query, kg_path, date_range, context)
+        self._jobs[job.job_id] = job
+        self._queue.put_nowait(job)
+        self._stats["submitted"] += 1
+        logger.info(f"Queued query job {job.job_id}: {query[:100]}")
+        return job
+
+    def get(self, job_id: str) -> Optional[QueryJob]:
+        """Look up a job; None if unknown or expired."""
+        self._purge_expired()
+        return self._jobs.get(job_id)
+
+    def list_jobs(self) -> List[QueryJob]:
+        """Jobs currently known, oldest first."""
+        self._purge_expired()
+        return sorted(self._jobs.values(), key=lambda job: job.created_at)
+
+    def cancel(self, job_id: str) -> Optional[QueryJob]:
+        """
+        Cancel a queued or running job.
+
+        Returns:
+            The job (unchanged if already finished), or None if unknown
+        """
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return job
+        if job.task is not None:
+            # The worker marks the job cancelled once the pipeline unwinds
+            job.task.cancel()
+        else:
+            self._finish(job, CANCELLED)
+        logger.info(f"Cancelling query job {job_id}")
+        return job
+
+    async def shutdown(self) -> None:
+        """Cancel running jobs and stop the workers."""
+        for job in self._jobs.values():
+            if not job.finished:
+                self.cancel(job.job_id)
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+
+    def _ensure_workers(self) -> None:
+        """Start the worker pool on first use, inside the running event loop."""
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if not self._workers:
+            self._workers = [
+                asyncio.create_task(self._worker(index)) for index in range(self.max_workers)
+            ]
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                if not job.finished:
+                    await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: QueryJob) -> None:
+        job.status = RUNNING
+        job.started_at = time.time()
+        job.task = asyncio.create_task(
+            self.runner(
+                query=job.query,
+                kg_path=job.kg_path,
+                date_range=job.date_range,
+                context=job.context,
+                on_event=job.record_event,
+            )
+        )
+        try:
+            result = await job.task
+        except asyncio.CancelledError:
+            if not job.task.cancelled():
+                # The worker itself is being stopped
+                job.task.cancel()
+                self._finish(job, CANCELLED)
+                raise
+            self._finish(job, CANCELLED)
+            return
+        except Exception as e:
+            logger.error(f"Query job {job.job_id} failed: {e}")
+            self._finish(job, FAILED, error=str(e))
+            return
+
+        if "error" in result and "data" not in result:
+            self._finish(job, FAILED, error=result["error"])
+        else:
+            job.result = result
+            job.progress = 1.0
+            self._finish(job, SUCCEEDED)
+
+    def _finish(self, job: QueryJob, status: str, error: Optional[str] = None) -> None:
+        job.status = status
+        job.error = error
+        job.finished_at = time.time()
+        job.task = None
+        self._stats[status] += 1
+        logger.info(f"Query job {job.job_id} {status}")
+
+    def _purge_expired(self) -> None:
+        """Drop finished jobs older than the result TTL."""
+        cutoff = time.time() - self.result_ttl_seconds
+        expired = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.finished and job.finished_at < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+        self._stats["expired"] += len(expired)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get job counters and current queue state."""
+        states: Dict[str, int] = {}
+        for job in self._jobs.values():
+            states[job.status] = states.get(job.status, 0) + 1
+        return {
+            **self._stats,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "workers": len(self._workers),
+            "jobs": states,
+        }
@@ -1,26 +1,51 @@
 # release_agent/kg_query_agent.py
 
 import ast
+import asyncio
+import hashlib
 import json
 import logging
 import os
 import re
+import time
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from google.adk.agents import Agent
 
+from .code_cache import QueryCodeCache
 from .code_formatter import CodeFormatter
 from .code_generator import KGCodeGenerator
 from .file_manager import KGFileManager
+from .job_manager import QueryJobManager
+from .kg_store import KGColumnStore
 from .llm_model import llm_model
+from .metrics import observe_query_timings
+from .native_engine import NativeQueryEngine
 from .query_analyzer import QueryAnalyzer
+from .query_ir import QueryIR
+from .query_library import QueryExampleLibrary
+from .query_planner import QueryPlanner
 from .result_formatter import ResultFormatter
+from .program_library import QueryProgramLibrary
+from .prompt_builder import KGPromptBuilder
 from .schema_manager import KGSchemaManager
+from .single_flight import SingleFlight
+from .stage_timer import StageTimer, current_timer, stage
+from .sandbox_lib import kg_access
+from .batch_executor import QueryBatchExecutor
+from .deadline import DeadlineExceededError, check_deadline
+from .execution_scheduler import ExecutionRejectedError
 from .secure_executor import SecureCodeExecutor
 
 logger = logging.getLogger(__name__)
 
+# Rows per "result" event when streaming pipeline progress
+RESULT_CHUNK_ROWS = 200
+
+# Receives (event name, payload) as pipeline stages complete; may be async
+EventCallback = Callable[[str, Dict[str, Any]], Any]
+
 
 class KGQueryAgent(Agent):
     """
@@ -28,41 +53,98 @@ class KGQueryAgent(Agent):
 
     This agent coordinates multiple components to:
     1. Analyze user queries to understand intent
-    2. Generate Python code to query KG files
-    3. Execute code safely in a sandbox
+    2. Generate Python code to query KG files, unless the query is expressible
+       as a QueryIR
+    3. Execute code safely in a sandbox, or the IR in-process with the native
+       engine
     4. Format results for frontend consumption
     """
 
-    def __init__(self):
+    def __init__(self, combined_llm_call: bool = True):
+        """
+        Args:
+            combined_llm_call: Analyze the query and generate its code in one
+                LLM round trip instead of two sequential calls
+        """
         super().__init__(
             name="kg_query_agent",
             description="Agent specialized in dynamic knowledge graph querying using LLM-generated code",
         )
         # Use object.__setattr__ to bypass Pydantic validation
         object.__setattr__(self, "llm", llm_model)
+        object.__setattr__(self, "combined_llm_call", combined_llm_call)
         object.__setattr__(self, "executor", SecureCodeExecutor())
+        object.__setattr__(self, "batch_executor", QueryBatchExecutor(self.executor))
         object.__setattr__(self, "schema_manager", KGSchemaManager())
         object.__setattr__(
-            self, "query_analyzer", QueryAnalyzer(llm_model, self.schema_manager)
+            self, "prompt_builder", KGPromptBuilder(self.schema_manager)
+        )
+        object.__setattr__(
+            self,
+            "query_analyzer",
+            QueryAnalyzer(llm_model, self.schema_manager, self.prompt_builder),
         )
         object.__setattr__(
-            self, "code_generator", KGCodeGenerator(llm_model, self.schema_manager)
+            self,
+            "code_generator",
+            KGCodeGenerator(llm_model, self.schema_manager, self.prompt_builder),
         )
         object.__setattr__(self, "result_formatter", ResultFormatter())
         object.__setattr__(self, "file_manager", KGFileManager())
         object.__setattr__(self, "code_formatter", CodeFormatter())
+        object.__setattr__(self, "kg_store", KGColumnStore())
+        object.__setattr__(self, "native_engine", NativeQueryEngine())
+        object.__setattr__(self, "query_planner", QueryPlanner())
+        object.__setattr__(self, "single_flight", SingleFlight())
+        object.__setattr__(self, "job_manager", QueryJobManager(self.process_query))
+        object.__setattr__(
+            self,
+            "program_library",
+            QueryProgramLibrary(
+                self.schema_manager.version,
+                date_extractor=self.query_analyzer.date_extractor,
+            ),
+        )
+        object.__setattr__(self, "query_library", QueryExampleLibrary())
+        object.__setattr__(
+            self,
+            "code_cache",
+            QueryCodeCache(
+                self.schema_manager.version, self.query_analyzer.date_extractor
+            ),
+        )
 
     @property
     def kg_schema(self) -> Dict[str, Any]:
         """Access to the KG schema via schema manager."""
         return self.schema_manager.schema
 
+    def get_stats(self) -> Dict[str, Any]:
+        """Collect counters from the LLM, caches, scheduler and column store."""
+        return {
+            "llm_usage": self.llm.get_usage_stats(),
+            "llm_response_cache": self.llm.get_cache_stats(),
+            "execution_scheduler": self.executor.scheduler.get_stats(),
+            "execution_result_cache": self.executor.result_cache.get_stats(),
+            "batch_executor": self.batch_executor.get_stats(),
+            "query_code_cache": self.code_cache.get_stats(),
+            "query_program_library": self.program_library.get_stats(),
+            "query_example_library": self.query_library.get_stats(),
+            "kg_column_store": self.kg_store.get_stats(),
+            "native_engine": self.native_engine.get_stats(),
+            "query_planner": self.query_planner.get_stats(),
+            "single_flight": self.single_flight.get_stats(),
+            "query_jobs": self.job_manager.get_stats(),
+            "result_store": self.executor.result_store.get_stats(),
+        }
+
     async def process_query(
         self,
         query: str,
         kg_path: str = "Data/KGs",
         date_range: Optional[List[str]] = None,
         context: Optional[Dict[str, Any]] = None,
+        on_event: Optional[EventCallback] = None,
     ) -> Dict[str, Any]:
         """
         Process a natural language query against KG data.
@@ -72,69 +154,753 @@ class KGQueryAgent(Agent):
             kg_path: Path to KG files directory
             date_range: Optional list of KG files to query (e.g., ["202201", "202202"])
             context: Additional context for the query
+            on_event: Called as stages complete with "analysis", "files",
+                "code", "execution_started", "result" (row chunks) and
+                "insights" events. Streaming requests run on their own
+                rather than sharing an identical in-flight request.
 
         Returns:
             Dictionary containing data, generated code, insights, etc.
+            execution_metadata.single_flight tells whether the result was
+            shared with identical concurrent requests
         """
-        try:
-            # Step 1: Analyze query intent and classify query type
-            query_analysis = self.query_analyzer.analyze_query(query)
+        if on_event is not None:
+            result = await self._process_query(query, kg_path, date_range, on_event)
+            result["execution_metadata"]["single_flight"] = {"shared": False, "waiters": 0}
+            return result
 
-            # Step 2: Determine which KG files to use
-            target_files = self.file_manager.determine_target_files(
-                query_analysis, kg_path, date_range
-            )
+        # Identical requests in flight at the same time share one run
+        key = self._single_flight_key(query, kg_path, date_range, context)
+        result, flight = await self.single_flight.do(
+            key, lambda: self._process_query(query, kg_path, date_range)
+        )
+        result["execution_metadata"]["single_flight"] = flight
+        return result
 
-            # Step 3: Generate Python code to query the KG
-            generated_code = self.code_generator.generate_query_code(
-                query, query_analysis, target_files
+    def _single_flight_key(
+        self,
+        query: str,
+        kg_path: str,
+        date_range: Optional[List[str]] = None,
+        context: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """
+        Identity of a request for coalescing: the normalized query (as used
+        by the code cache), the context and the versions of the KG files the
+        query can read - the months its dates resolve to, or the whole KG
+        directory when they need the LLM to resolve.
+        """
+        dates = self._rule_based_dates(query, date_range)
+        if dates:
+            files = self.file_manager.determine_target_files(
+                {"extracted_date_range": dates}, kg_path, date_range
+            )
+        elif os.path.isdir(kg_path):
+            files = sorted(
+                os.path.join(kg_path, name)
+                for name in os.listdir(kg_path)
+                if name.endswith(".json")
             )
+        else:
+            files = []
 
-            # Step 3.5: Format and validate the generated code
-            formatted_code, is_valid, format_errors = (
-                self.code_formatter.format_and_validate(generated_code)
+        versions = []
+        for file_path in files:
+            try:
+                versions.append([file_path, kg_access.source_signature(file_path)])
+            except OSError:
+                continue
+        payload = {
+            "query": self.code_cache.make_key(query, kg_path, date_range),
+            "context": context,
+            "files": versions,
+        }
+        return hashlib.sha256(
+            json.dumps(payload, sort_keys=True, default=str).encode()
+        ).hexdigest()
+
+    async def _process_query(
+        self,
+        query: str,
+        kg_path: str,
+        date_range: Optional[List[str]] = None,
+        on_event: Optional[EventCallback] = None,
+    ) -> Dict[str, Any]:
+        """Run the query pipeline; see process_query."""
+        with StageTimer().activate():
+            return await self._run_pipeline(query, kg_path, date_range, on_event)
+
+    async def _run_pipeline(
+        self,
+        query: str,
+        kg_path: str,
+        date_range: Optional[List[str]],
+        on_event: Optional[EventCallback],
+    ) -> Dict[str, Any]:
+        """Prepare, plan, execute and finish one query, timing each stage."""
+        try:
+            prepared = await self._prepare_query(query, kg_path, date_range)
+            timer = prepared["timer"]
+            query_analysis = prepared["query_analysis"]
+            await self._emit(on_event, "analysis", {
+                "query_type": query_analysis.get("type"),
+                "analysis_path": query_analysis.get("analysis_path"),
+                "code_source": prepared["code_source"],
+                "query_analysis": query_analysis,
+            })
+            await self._emit(on_event, "files", {"target_files": prepared["target_files"]})
+            await self._emit(on_event, "code", {
+                "generated_code": prepared["formatted_code"],
+                "is_valid": prepared["is_valid"],
+            })
+
+            # Step 4: Make sure the shared column stores are built, let the
+            # planner pick the cheapest engine from their catalog statistics,
+            # then run the query IR natively or execute the validated code
+            check_deadline("execution")
+            with timer.stage("column_store"):
+                await self.kg_store.ensure_many_async(prepared["target_files"])
+            with timer.stage("planning"):
+                query_plan = self._plan_query(prepared, kg_path)
+            await self._emit(on_event, "execution_started", {
+                "engine": query_plan["engine"],
+                "estimated_cost": query_plan["estimated_cost"],
+            })
+
+            execution_start = time.perf_counter()
+            with timer.stage("execution"):
+                if query_plan["engine"] == "native":
+                    execution_result = await self.native_engine.execute_async(
+                        QueryIR.from_dict(prepared["query_analysis"]["query_ir"]),
+                        prepared["target_files"],
+                    )
+                else:
+                    execution_result = await self._execute_code_safely(
+                        prepared["sandbox_code"], kg_path
+                    )
+            check_deadline("result formatting")
+
+            return await self._finish_query(
+                prepared,
+                execution_result,
+                query_plan,
+                time.perf_counter() - execution_start,
+                on_event,
             )
 
-            if not is_valid:
-                logger.warning(f"Generated code has syntax errors: {format_errors}")
-                logger.info("Using fallback code template")
-                formatted_code = self.code_formatter.generate_fallback_code(
-                    query, target_files
+        except Exception as e:
+            logger.error(f"Error processing query '{query}': {e!s}")
+            raise
+
+    async def process_batch(
+        self,
+        queries: List[str],
+        kg_path: str = "Data/KGs",
+        date_range: Optional[List[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Process several queries, sharing LLM round trips and sandbox sessions.
+
+        Queries are analyzed and their code generated concurrently. Native
+        and cached ones run individually; the rest are grouped by overlapping
+        target files and each group runs in one sandbox session, so every
+        monthly KG is opened once per group instead of once per query.
+
+        Args:
+            queries: Natural language queries
+            kg_path: Path to KG files directory
+            date_range: Optional list of KG files to query for every query
+
+        Returns:
+            One result per query, in order: the process_query result, or a
+            dict with an "error" key if the query failed
+        """
+        async def prepare(query: str) -> Dict[str, Any]:
+            # Each query gets its own timer; shared work isn't attributed
+            with StageTimer().activate():
+                return await self._prepare_query(query, kg_path, date_range)
+
+        prepared = await asyncio.gather(
+            *(prepare(query) for query in queries),
+            return_exceptions=True,
+        )
+        ready = [
+            index for index, item in enumerate(prepared) if not isinstance(item, BaseException)
+        ]
+        await self.kg_store.ensure_many_async(
+            sorted({path for index in ready for path in prepared[index]["target_files"]})
+        )
+        plans = {index: self._plan_query(prepared[index], kg_path) for index in ready}
+
+        async def run_single(index: int) -> Tuple[Dict[str, Any], float]:
+            start = time.perf_counter()
+            if plans[index]["engine"] == "native":
+                result = await self.native_engine.execute_async(
+                    QueryIR.from_dict(prepared[index]["query_analysis"]["query_ir"]),
+                    prepared[index]["target_files"],
+                )
+            else:
+                result = await self._execute_code_safely(
+                    prepared[index]["sandbox_code"], kg_path
                 )
+            return result, time.perf_counter() - start
 
-            logger.info(
-                f"Using {'validated' if is_valid else 'fallback'} code for execution"
+        sandboxed = [index for index in ready if plans[index]["engine"] == "sandbox"]
+        groups = QueryBatchExecutor.group_by_files(
+            [prepared[index]["target_files"] for index in sandboxed]
+        )
+        single = [index for index in ready if plans[index]["engine"] != "sandbox"]
+        # A group of one gains nothing from the batch script
+        single.extend(sandboxed[group[0]] for group in groups if len(group) == 1)
+        batched = [[sandboxed[position] for position in group] for group in groups if len(group) > 1]
+
+        outcomes: Dict[int, Tuple[Dict[str, Any], float]] = {}
+        # Queries whose execution raised (e.g. rejected by the scheduler)
+        failures: Dict[int, BaseException] = {}
+        single_results = await asyncio.gather(
+            *(run_single(index) for index in single),
+            return_exceptions=True,
+        )
+        for index, outcome in zip(single, single_results):
+            if isinstance(outcome, BaseException):
+                failures[index] = outcome
+            else:
+                outcomes[index] = outcome
+        group_results = await asyncio.gather(
+            *(
+                self.batch_executor.execute_group(
+                    [prepared[index]["sandbox_code"] for index in group], kg_path
+                )
+                for group in batched
+            ),
+            return_exceptions=True,
+        )
+        for group_number, (group, results) in enumerate(zip(batched, group_results)):
+            if isinstance(results, BaseException):
+                results = [{"success": False, "error": str(results)} for _ in group]
+            for index, result in zip(group, results):
+                result["batch"] = {"group": group_number, "group_size": len(group)}
+                outcomes[index] = (result, result.get("execution_time", 0.0) / len(group))
+
+        responses = []
+        for index, query in enumerate(queries):
+            if isinstance(prepared[index], BaseException):
+                logger.error(f"Error preparing batch query '{query}': {prepared[index]!s}")
+                responses.append({"query": query, "error": str(prepared[index])})
+                continue
+            if index in failures:
+                logger.error(f"Error executing batch query '{query}': {failures[index]!s}")
+                responses.append({"query": query, "error": str(failures[index])})
+                continue
+            execution_result, elapsed = outcomes[index]
+            prepared[index]["timer"].add("execution", elapsed)
+            response = await self._finish_query(
+                prepared[index], execution_result, plans[index], elapsed
             )
+            responses.append({"query": query, **response})
+        return responses
 
-            # Step 4: Execute the validated code safely
-            execution_result = await self._execute_code_safely(formatted_code, kg_path)
+    async def _prepare_query(
+        self,
+        query: str,
+        kg_path: str,
+        date_range: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Resolve the analysis, target files and code (or IR) for a query.
 
-            # Step 5: Format results for frontend
+        Returns:
+            Dict with query, code_cache_key, query_analysis, target_files,
+            generated_code, formatted_code, is_valid, format_errors,
+            code_source, sandbox_code (the code a sandbox run would execute,
+            or None) and the query's StageTimer
+        """
+        # Step 0: Reuse the analysis and code of an equivalent earlier query
+        code_cache_key = self.code_cache.make_key(query, kg_path, date_range)
+        cached = self.code_cache.get(code_cache_key)
+        if cached:
+            logger.info("Query code cache hit; skipping analysis and code generation")
+            program = (
+                cached["query_analysis"],
+                cached["target_files"],
+                cached["generated_code"],
+                cached["formatted_code"],
+                True,
+                [],
+                "code_cache",
+            )
+        else:
+            # Step 0.5: Run simple aggregations natively, bind this query's
+            # parameters to a stored program of the same shape, or generate
+            # new code
+            with stage("analysis"):
+                fast_analysis = self.query_analyzer.fast_path_analysis(query)
+            program = self._prepare_native(fast_analysis, kg_path, date_range)
+            if program is None:
+                with stage("program_reuse"):
+                    program = self._bind_library_program(query, kg_path, date_range)
+                if program is not None:
+                    program = (*program, "program_library")
+            if program is None:
+                program = await self._prepare_code(query, kg_path, date_range)
+
+        query_analysis, target_files, formatted_code = program[0], program[1], program[3]
+        sandbox_code = formatted_code
+        if query_analysis.get("query_ir") and program[6] in ("native", "code_cache"):
+            # The IR's JSON isn't code. A stored program of the same shape
+            # over the same files lets the planner weigh the sandbox, and
+            # any cached result of that program, against the native engine.
+            with stage("program_reuse"):
+                alternative = self._bind_library_program(query, kg_path, date_range)
+            sandbox_code = (
+                alternative[3]
+                if alternative is not None and alternative[1] == target_files
+                else None
+            )
+
+        fields = (
+            "query_analysis",
+            "target_files",
+            "generated_code",
+            "formatted_code",
+            "is_valid",
+            "format_errors",
+            "code_source",
+        )
+        return {
+            "query": query,
+            "code_cache_key": code_cache_key,
+            **dict(zip(fields, program)),
+            "sandbox_code": sandbox_code,
+            "timer": current_timer() or StageTimer(),
+        }
+
+    def _plan_query(self, prepared: Dict[str, Any], kg_path: str) -> Dict[str, Any]:
+        """
+        Let the planner choose the engine for a prepared query.
+
+        A query with an IR is a native candidate, and a sandbox candidate
+        too when a stored program answers it. A cached sandbox result then
+        usually beats re-running the IR. The result_cache plan executes like
+        a sandbox plan; the executor returns the cached copy.
+        """
+        query_analysis = prepared["query_analysis"]
+        runs_ir = prepared["code_source"] == "native" or (
+            prepared["code_source"] == "code_cache" and bool(query_analysis.get("query_ir"))
+        )
+        sandbox_code = prepared["sandbox_code"]
+        return self.query_planner.plan(
+            prepared["target_files"],
+            query_ir=query_analysis["query_ir"] if runs_ir else None,
+            has_code=sandbox_code is not None,
+            result_cached=sandbox_code is not None
+            and self.executor.is_result_cached(sandbox_code, kg_path),
+        )
+
+    async def _finish_query(
+        self,
+        prepared: Dict[str, Any],
+        execution_result: Dict[str, Any],
+        query_plan: Dict[str, Any],
+        execution_seconds: float,
+        on_event: Optional[EventCallback] = None,
+    ) -> Dict[str, Any]:
+        """Record the outcome of an executed query and build its response."""
+        query = prepared["query"]
+        query_analysis = prepared["query_analysis"]
+        target_files = prepared["target_files"]
+        generated_code = prepared["generated_code"]
+        formatted_code = prepared["formatted_code"]
+        is_valid = prepared["is_valid"]
+        code_source = prepared["code_source"]
+        timer = prepared["timer"]
+        timer.execution = execution_result.get("timings")
+
+        succeeded = bool(
+            execution_result.get("success")
+            and "error" not in (execution_result.get("result") or {})
+        )
+        with timer.stage("bookkeeping"):
+            self.query_planner.record(query_plan, execution_seconds, succeeded)
+            if succeeded and is_valid and code_source != "code_cache":
+                self.code_cache.set(
+                    prepared["code_cache_key"],
+                    query_analysis,
+                    target_files,
+                    generated_code,
+                    formatted_code,
+                )
+            if is_valid and code_source.startswith("generated"):
+                await asyncio.to_thread(
+                    self._record_generated_code,
+                    query,
+                    query_analysis,
+                    formatted_code,
+                    succeeded,
+                )
+
+        if query_plan["engine"] != "native" and prepared["sandbox_code"] != formatted_code:
+            # A stored program answered a query that has an IR; show its code
+            generated_code = formatted_code = prepared["sandbox_code"]
+
+        # Step 5: Format results for frontend
+        with timer.stage("result_formatting"):
             formatted_data = self.result_formatter.format_results(
                 execution_result, query_analysis
             )
 
-            # Step 6: Generate insights
-            insights = self.result_formatter.generate_insights(formatted_data, query)
+        await self._emit_results(on_event, formatted_data)
 
-            return {
-                "data": formatted_data,
-                "generated_code": formatted_code,  # Return the validated/formatted code
-                "original_code": generated_code,  # Keep original for debugging
-                "code_validation": {
-                    "is_valid": is_valid,
-                    "errors": format_errors,
-                    "used_fallback": not is_valid,
-                },
-                "query_type": query_analysis["type"],
-                "insights": insights,
-                "target_files": target_files,
-                "execution_success": execution_result.get("success", False),
-            }
+        # Step 6: Generate insights
+        with timer.stage("insights"):
+            insights = self.result_formatter.generate_insights(formatted_data, query)
+        await self._emit(on_event, "insights", {"insights": insights})
+
+        timings = timer.to_dict()
+        timer.log(query, timings)
+        observe_query_timings(timings)
+
+        return {
+            "data": formatted_data,
+            "generated_code": formatted_code,  # Return the validated/formatted code
+            "original_code": generated_code,  # Keep original for debugging
+            "code_validation": {
+                "is_valid": is_valid,
+                "errors": prepared["format_errors"],
+                "used_fallback": not is_valid,
+            },
+            "query_type": query_analysis["type"],
+            "analysis_path": (
+                query_analysis.get("analysis_path")
+                if code_source.startswith("generated") or code_source == "native"
+                else "reused"
+            ),
+            "insights": insights,
+            "target_files": target_files,
+            "execution_success": execution_result.get("success", False),
+            "execution_metadata": {
+                "queue": execution_result.get("scheduler"),
+                "cache_hit": execution_result.get("cache_hit", False),
+                "code_cache_hit": code_source == "code_cache",
+                "code_source": code_source,
+                "engine": execution_result.get("engine", "sandbox"),
+                "batch": execution_result.get("batch"),
+            },
+            "resource_usage": execution_result.get("resources"),
+            "query_plan": query_plan,
+            "timings": timings,
+        }
 
+    @staticmethod
+    async def _emit(
+        on_event: Optional[EventCallback], event: str, payload: Dict[str, Any]
+    ) -> None:
+        """Report a pipeline event; a failing listener doesn't fail the query."""
+        if on_event is None:
+            return
+        try:
+            outcome = on_event(event, payload)
+            if asyncio.iscoroutine(outcome):
+                await outcome
         except Exception as e:
-            logger.error(f"Error processing query '{query}': {e!s}")
+            logger.warning(f"Event listener failed on '{event}': {e}")
+
+    async def _emit_results(
+        self, on_event: Optional[EventCallback], formatted_data: Dict[str, Any]
+    ) -> None:
+        """Stream formatted result rows in chunks, followed by the metadata."""
+        if on_event is None:
+            return
+        if "error" in formatted_data:
+            await self._emit(on_event, "result", {"error": formatted_data["error"]})
+            return
+
+        rows = formatted_data.get("data")
+        if not isinstance(rows, list):
+            rows = [rows] if rows else []
+        for offset in range(0, len(rows), RESULT_CHUNK_ROWS):
+            await self._emit(on_event, "result", {
+                "offset": offset,
+                "rows": rows[offset:offset + RESULT_CHUNK_ROWS],
+                "total_rows": len(rows),
+            })
+        await self._emit(on_event, "result", {
+            "total_rows": len(rows),
+            "final": True,
+            **{key: value for key, value in formatted_data.items() if key != "data"},
+        })
+
+    def _prepare_native(
+        self,
+        query_analysis: Optional[Dict[str, Any]],
+        kg_path: str,
+        date_range: Optional[List[str]] = None,
+    ) -> Optional[Tuple[Dict[str, Any], List[str], str, str, bool, List[str], str]]:
+        """
+        Plan native execution for an analysis that carries a query IR.
+
+        The IR's JSON stands in for generated code in the response and the
+        code cache.
+
+        Returns:
+            (query_analysis, target_files, generated_code, formatted_code,
+            is_valid, format_errors, "native"), or None without a usable IR
+        """
+        if not query_analysis or not query_analysis.get("query_ir"):
+            return None
+        ir = QueryIR.from_dict(query_analysis["query_ir"])
+        if date_range:
+            ir.date_range = list(date_range)
+        if ir.validate(self.schema_manager):
+            return None
+
+        query_analysis = {**query_analysis, "query_ir": ir.to_dict()}
+        target_files = self.file_manager.determine_target_files(
+            query_analysis, kg_path, date_range
+        )
+        ir_json = json.dumps(ir.to_dict(), indent=2)
+        logger.info(f"Executing query natively over {ir.node_type}; skipping code generation")
+        return query_analysis, target_files, ir_json, ir_json, True, [], "native"
+
+    def _bind_library_program(
+        self,
+        query: str,
+        kg_path: str,
+        date_range: Optional[List[str]] = None,
+    ) -> Optional[Tuple[Dict[str, Any], List[str], str, str, bool, List[str]]]:
+        """
+        Reuse a stored program for a query of the same shape.
+
+        Returns:
+            (query_analysis, target_files, generated_code, formatted_code,
+            is_valid, format_errors), or None if there is no usable program
+        """
+        if not self._rule_based_dates(query, date_range):
+            return None
+        entry = self.program_library.lookup(query)
+        if entry is None:
+            return None
+
+        logger.info(f"Reusing query program for intent '{entry['template']}'")
+        return self._bind_program(
+            query, kg_path, date_range, entry["analysis"], entry["function_code"]
+        )
+
+    def _rule_based_dates(
+        self, query: str, date_range: Optional[List[str]] = None
+    ) -> Optional[List[str]]:
+        """Dates of the query resolved without the LLM, if possible."""
+        return date_range or self.query_analyzer.date_extractor.extract_dates(query)
+
+    def _bind_program(
+        self,
+        query: str,
+        kg_path: str,
+        date_range: Optional[List[str]],
+        analysis: Dict[str, Any],
+        function_code: str,
+    ) -> Optional[Tuple[Dict[str, Any], List[str], str, str, bool, List[str]]]:
+        """
+        Bind this query's files, dates and filters to a reusable program.
+
+        Only possible when the dates resolve without the LLM, since the
+        program gets its dates from the parameters bound here.
+        """
+        dates = self._rule_based_dates(query, date_range)
+        if not dates:
+            return None
+
+        query_analysis = {**analysis, "extracted_date_range": dates}
+        target_files = self.file_manager.determine_target_files(
+            query_analysis, kg_path, date_range
+        )
+        params = {
+            "files": target_files,
+            "date_range": dates,
+            **self.program_library.extract_parameters(query),
+        }
+        code = self.program_library.bind(function_code, params)
+        return query_analysis, target_files, code, code, True, []
+
+    def _record_generated_code(
+        self,
+        query: str,
+        query_analysis: Dict[str, Any],
+        code: str,
+        succeeded: bool,
+    ) -> None:
+        """Add newly generated code to the program and example libraries."""
+        if succeeded:
+            self.program_library.store(query, query_analysis, code)
+        self.query_library.add(
+            query,
+            self.program_library.intent_template(query),
+            query_analysis,
+            code,
+            succeeded,
+            index_analysis=self.query_analyzer.preliminary_analysis(query),
+        )
+
+    async def _prepare_code(
+        self,
+        query: str,
+        kg_path: str,
+        date_range: Optional[List[str]] = None,
+    ) -> Tuple[Dict[str, Any], List[str], str, str, bool, List[str], str]:
+        """
+        Analyze the query, select KG files and generate validated code.
+
+        A similar earlier query's code is passed to code generation as an
+        example instead of the generic template. It is never run as is: a
+        near miss ("above 1000000" vs "below 1000000") needs different code,
+        and queries of identical shape are already answered by the program
+        library. If the analysis expresses the query as a QueryIR, code
+        generation is skipped and the query is planned for the native engine
+        (code_source "native").
+
+        Returns:
+            (query_analysis, target_files, generated_code, formatted_code,
+            is_valid, format_errors, code_source)
+        """
+        query_params = self.program_library.extract_parameters(query)
+
+        example = None
+        with stage("example_retrieval"):
+            match = self.query_library.find_similar(
+                self.program_library.intent_template(query),
+                self.query_analyzer.preliminary_analysis(query),
+                self.query_library.example_threshold,
+            )
+        if match:
+            example = {"query": match["query"], "code": match["code"]}
+
+        # Simple queries are analyzed by the rules alone, without the LLM
+        with stage("analysis"):
+            query_analysis = self.query_analyzer.fast_path_analysis(query)
+
+        combined = None
+        if query_analysis is None and self.combined_llm_call and self.code_generator.llm:
+            # Steps 1-3 in a single LLM round trip
+            with stage("analysis_and_code_generation"):
+                combined = await self._analyze_and_generate(
+                    query, kg_path, date_range, query_params, example
+                )
+
+        if combined:
+            query_analysis, target_files, generated_code = combined
+            # The LLM may have expressed the query as an IR as well
+            native = self._prepare_native(query_analysis, kg_path, date_range)
+            if native:
+                return native
+        else:
+            # Step 1: Analyze query intent and classify query type
+            if query_analysis is None:
+                with stage("analysis"):
+                    query_analysis = await self.query_analyzer.analyze_query(query)
+            native = self._prepare_native(query_analysis, kg_path, date_range)
+            if native:
+                return native
+
+            # Step 2: Determine which KG files to use
+            with stage("file_selection"):
+                target_files = self.file_manager.determine_target_files(
+                    query_analysis, kg_path, date_range
+                )
+
+            # Step 3: Generate Python code to query the KG
+            with stage("code_generation"):
+                generated_code = await self.code_generator.generate_query_code(
+                    query, query_analysis, target_files, query_params, example
+                )
+
+        # Step 3.5: Format and validate the generated code (black runs as a
+        # subprocess, so keep it off the event loop)
+        with stage("code_formatting"):
+            formatted_code, is_valid, format_errors = await asyncio.to_thread(
+                self.code_formatter.format_and_validate, generated_code
+            )
+
+        if not is_valid:
+            logger.warning(f"Generated code has syntax errors: {format_errors}")
+            logger.info("Using fallback code template")
+            formatted_code = self.code_formatter.generate_fallback_code(
+                query, target_files
+            )
+
+        logger.info(
+            f"Using {'validated' if is_valid else 'fallback'} code for execution"
+        )
+
+        return (
+            query_analysis,
+            target_files,
+            generated_code,
+            formatted_code,
+            is_valid,
+            format_errors,
+            "generated_from_example" if example else "generated",
+        )
+
+    async def _analyze_and_generate(
+        self,
+        query: str,
+        kg_path: str,
+        date_range: Optional[List[str]] = None,
+        query_params: Optional[Dict[str, Any]] = None,
+        example: Optional[Dict[str, Any]] = None,
+    ) -> Optional[Tuple[Dict[str, Any], List[str], str]]:
+        """
+        Analyze the query and generate its code with one LLM call.
+
+        Target files are resolved from a rule-based preliminary analysis
+        before the call. If the LLM's date range selects different files,
+        the code is regenerated for those files.
+
+        Returns:
+            (query_analysis, target_files, generated_code), or None if the
+            combined call failed and the two-step path should be used
+        """
+        preliminary = self.query_analyzer.preliminary_analysis(query)
+        target_files = self.file_manager.determine_target_files(
+            preliminary, kg_path, date_range
+        )
+
+        try:
+            analysis_json, generated_code = (
+                await self.code_generator.generate_analysis_and_code(
+                    query,
+                    preliminary,
+                    target_files,
+                    self.query_analyzer.analysis_instructions(),
+                    self.query_analyzer.query_context(query),
+                    query_params,
+                    example,
+                )
+            )
+            query_analysis = {
+                **preliminary,
+                **self.query_analyzer.parse_analysis(analysis_json),
+                "analysis_path": "llm",
+            }
+        except DeadlineExceededError:
             raise
+        except Exception as e:
+            logger.warning(f"Combined analysis/codegen failed, using two calls: {e}")
+            return None
+
+        analysis_files = self.file_manager.determine_target_files(
+            query_analysis, kg_path, date_range
+        )
+        if analysis_files != target_files:
+            logger.info(
+                "LLM date range selects different KG files; regenerating code"
+            )
+            target_files = analysis_files
+            generated_code = await self.code_generator.generate_query_code(
+                query, query_analysis, target_files, query_params, example
+            )
+
+        return query_analysis, target_files, generated_code
 
     def _extract_dates_regex(self, query: str) -> Optional[List[str]]:
         """Extract dates from query using regex patterns."""
@@ -584,8 +1350,12 @@ class KGQueryAgent(Agent):
             logger.info(f"Execution success: {result.get('success')}")
             logger.info(f"Stdout length: {len(result.get('stdout', ''))}")
             logger.info(f"Stderr: {result.get('stderr', '')}")
+            logger.info(f"Sandbox resources: {json.dumps(result.get('resources'))}")
 
             return result
+        except (ExecutionRejectedError, DeadlineExceededError):
+            # Surface admission control rejections and deadlines to the API as-is
+            raise
         except Exception as e:
             logger.error(f"Code execution failed: {e}")
             return {"success": False, "error": str(e)}
@@ -0,0 +1,96 @@
+# release_agent/kg_store.py
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from .sandbox_lib import kg_access
+
+logger = logging.getLogger(__name__)
+
+
+class KGColumnStore:
+    """
+    Maintains memory-mapped column stores for monthly KG files on the API host.
+
+    Each KG file is parsed once per version and written as NumPy column tables
+    that sandboxes attach to read-only (see sandbox_lib/kg_access.py), so memory
+    use stays flat no matter how many queries run concurrently.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {
+            "stores_built": 0,
+            "build_failures": 0,
+            "build_time_seconds": 0.0,
+        }
+
+    def ensure(self, file_path: str) -> Optional[str]:
+        """
+        Make sure the column store for a KG file exists and is current.
+
+        Args:
+            file_path: Path to a monthly KG JSON file
+
+        Returns:
+            The store directory, or None if the store could not be built
+        """
+        store_dir = kg_access.store_dir_for(file_path)
+        if kg_access.is_store_current(file_path):
+            return store_dir
+
+        with self._lock:
+            # Another request may have built it while we waited
+            if kg_access.is_store_current(file_path):
+                return store_dir
+
+            start_time = time.time()
+            try:
+                manifest = kg_access.write_store(file_path)
+            except Exception as e:
+                self._stats["build_failures"] += 1
+                logger.warning(f"Could not build column store for {file_path}: {e}")
+                return None
+
+            build_time = time.time() - start_time
+            self._stats["stores_built"] += 1
+            self._stats["build_time_seconds"] += build_time
+            logger.info(
+                f"Built column store for {file_path} "
+                f"({manifest['node_count']} nodes) in {build_time:.2f}s"
+            )
+            return store_dir
+
+    def ensure_many(self, file_paths: List[str]) -> Dict[str, Optional[str]]:
+        """Ensure column stores exist for several KG files."""
+        return {file_path: self.ensure(file_path) for file_path in file_paths}
+
+    async def ensure_many_async(self, file_paths: List[str]) -> Dict[str, Optional[str]]:
+        """Ensure column stores exist without blocking the event loop."""
+        return await asyncio.to_thread(self.ensure_many, file_paths)
+
+    def warm(self, kg_path: str) -> int:
+        """
+        Build stores for every monthly KG file in a directory.
+
+        Returns:
+            Number of files with a current store
+        """
+        if not os.path.isdir(kg_path):
+            return 0
+
+        file_paths = sorted(
+            os.path.join(kg_path, file)
+            for file in os.listdir(kg_path)
+            if file.endswith(".json") and len(file) == 11  # YYYYMM.json format
+        )
+        stores = self.ensure_many(file_paths)
+        return sum(1 for store_dir in stores.values() if store_dir)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get store build statistics."""
+        return dict(self._stats)
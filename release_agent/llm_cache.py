@@ -0,0 +1,189 @@
+# release_agent/llm_cache.py
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from .ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class LLMReplayMissError(Exception):
+    """Raised in replay-only mode when a prompt has no recorded response."""
+
+
+class LLMResponseCache:
+    """
+    Response cache for LLM calls: an in-memory LRU in front of a SQLite file.
+
+    Entries are keyed by a hash of (model, prompt, call kwargs), so only
+    byte-identical requests share a response. Both tiers honour the same TTL;
+    the disk tier is trimmed to ``max_disk_entries`` least recently used rows.
+
+    With ``replay_only`` set, misses raise LLMReplayMissError instead of
+    reaching the gateway, which lets benchmarks replay a recorded session
+    offline and deterministically.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_entries: int = 512,
+        max_disk_entries: int = 10000,
+        ttl_seconds: Optional[float] = 7 * 24 * 3600,
+        replay_only: bool = False,
+    ):
+        """
+        Args:
+            path: SQLite file for the on-disk tier; memory only if None
+            max_entries: Size bound of the in-memory tier
+            max_disk_entries: Size bound of the on-disk tier
+            ttl_seconds: Entry lifetime in both tiers; None to never expire
+            replay_only: Fail on misses instead of calling the LLM
+        """
+        self.path = path
+        self.max_disk_entries = max_disk_entries
+        self.ttl_seconds = ttl_seconds
+        self.replay_only = replay_only
+        self._memory = TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._stats = {
+            "hits": 0,
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "replay_misses": 0,
+        }
+
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_responses ("
+                "key TEXT PRIMARY KEY, model TEXT, response TEXT, "
+                "created_at REAL, last_used REAL)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def make_key(model: str, prompt: str, kwargs: Dict[str, Any]) -> str:
+        """Hash the model, prompt and call kwargs into a cache key."""
+        payload = json.dumps(
+            {"model": model, "prompt": prompt, "kwargs": kwargs},
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Look up a response, promoting disk hits into memory.
+
+        Raises:
+            LLMReplayMissError: On a miss in replay-only mode
+        """
+        response = self._memory.get(key)
+        if response is not None:
+            with self._lock:
+                self._stats["hits"] += 1
+                self._stats["memory_hits"] += 1
+            return response
+
+        response = self._disk_get(key)
+        with self._lock:
+            if response is not None:
+                self._stats["hits"] += 1
+                self._stats["disk_hits"] += 1
+            else:
+                self._stats["misses"] += 1
+                if self.replay_only:
+                    self._stats["replay_misses"] += 1
+        if response is not None:
+            self._memory.set(key, response)
+            return response
+
+        if self.replay_only:
+            raise LLMReplayMissError(f"No recorded LLM response for key {key[:12]}")
+        return None
+
+    def set(self, key: str, response: str, model: str = "") -> None:
+        """Store a response in both tiers."""
+        self._memory.set(key, response)
+        with self._lock:
+            self._stats["stores"] += 1
+            if self._db is None:
+                return
+            now = time.time()
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO llm_responses VALUES (?, ?, ?, ?, ?)",
+                    (key, model, response, now, now),
+                )
+                self._db.execute(
+                    "DELETE FROM llm_responses WHERE key IN ("
+                    "SELECT key FROM llm_responses ORDER BY last_used DESC "
+                    "LIMIT -1 OFFSET ?)",
+                    (self.max_disk_entries,),
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Could not persist LLM response: {e}")
+
+    def _disk_get(self, key: str) -> Optional[str]:
+        if self._db is None:
+            return None
+        with self._lock:
+            try:
+                row = self._db.execute(
+                    "SELECT response, created_at FROM llm_responses WHERE key = ?",
+                    (key,),
+                ).fetchone()
+                if row is None:
+                    return None
+
+                response, created_at = row
+                if self.ttl_seconds is not None and time.time() - created_at > self.ttl_seconds:
+                    self._db.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+                    self._db.commit()
+                    return None
+
+                self._db.execute(
+                    "UPDATE llm_responses SET last_used = ? WHERE key = ?",
+                    (time.time(), key),
+                )
+                self._db.commit()
+                return response
+            except sqlite3.Error as e:
+                logger.warning(f"Could not read cached LLM response: {e}")
+                return None
+
+    def clear(self) -> None:
+        """Drop all cached responses from both tiers."""
+        self._memory.clear()
+        with self._lock:
+            if self._db is not None:
+                self._db.execute("DELETE FROM llm_responses")
+                self._db.commit()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters for both tiers."""
+        with self._lock:
+            stats = dict(self._stats)
+            lookups = stats["hits"] + stats["misses"]
+            stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+            if self._db is not None:
+                stats["disk_entries"] = self._db.execute(
+                    "SELECT COUNT(*) FROM llm_responses"
+                ).fetchone()[0]
+        stats["memory_entries"] = len(self._memory)
+        stats["path"] = self.path
+        stats["replay_only"] = self.replay_only
+        return stats
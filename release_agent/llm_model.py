@@ -1,9 +1,18 @@
 from google.adk.models.base_llm import BaseLlm
 from .constants import API_BASE_URL, API_KEY
+from .deadline import DeadlineExceededError, current_deadline
+from .llm_cache import LLMResponseCache
+from .metrics import LLM_CALL_SECONDS, LLM_TOKENS
+from .stage_timer import record_llm_call
 import asyncio
+import logging
+import os
+import time
 import litellm
 from typing import Optional, Dict, Any
 
+logger = logging.getLogger(__name__)
+
 
 class LLMModel(BaseLlm):
     """LLM Model class that extends BaseLlm from google_adk.
@@ -12,11 +21,12 @@ class LLMModel(BaseLlm):
     using the appropriate API base URL, authentication headers, and SSL configuration.
     """
     
-    def __init__(self, model="azure/gpt-4.1"):
+    def __init__(self, model="azure/gpt-4.1", cache: Optional[LLMResponseCache] = None):
         """Initialize the LLMModel.
         
         Args:
             model (str): The model identifier. Defaults to "azure/gpt-4.1".
+            cache (LLMResponseCache): Optional response cache. Off by default.
         """
         super().__init__(
             model=model,
@@ -29,46 +39,176 @@ class LLMModel(BaseLlm):
         self._model_name = model
         self._api_base_url = API_BASE_URL
         self._custom_headers = {"X-Api-Key": API_KEY}
+        self._usage_totals = {
+            "calls": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "cached_prompt_tokens": 0,
+            "cache_hits": 0,
+        }
+        self._cache = cache
+
+    def enable_cache(self, path: Optional[str] = None, **cache_kwargs) -> LLMResponseCache:
+        """Turn on the response cache for this instance.
+        
+        Args:
+            path (str): SQLite file for the on-disk tier; memory only if None.
+            **cache_kwargs: Size, TTL and replay_only settings for LLMResponseCache.
+            
+        Returns:
+            LLMResponseCache: The cache now in use.
+        """
+        self._cache = LLMResponseCache(path=path, **cache_kwargs)
+        return self._cache
+
+    def disable_cache(self) -> None:
+        """Turn off the response cache for this instance."""
+        self._cache = None
+
+    def get_cache_stats(self) -> Optional[Dict[str, Any]]:
+        """Get response cache hit/miss counters, or None if caching is off."""
+        return self._cache.get_stats() if self._cache else None
+
+    def _cache_key(self, prompt: str, kwargs: Dict[str, Any]) -> Optional[str]:
+        if self._cache is None:
+            return None
+        return self._cache.make_key(self._model_name, prompt, kwargs)
+
+    def _cached_response(self, key: Optional[str], purpose: Optional[str]) -> Optional[str]:
+        """Return a cached response for the key, counting and logging the hit."""
+        if key is None:
+            return None
+        response = self._cache.get(key)
+        if response is not None:
+            self._usage_totals["cache_hits"] += 1
+            logger.info(f"LLM call [{purpose or 'unspecified'}] served from response cache")
+        return response
+
+    def _record_usage(self, response, purpose: Optional[str], elapsed: float) -> None:
+        """Log the token counts of one call and add them to the running totals.
+        
+        Args:
+            response: The litellm completion response.
+            purpose (str): Label of the call site (e.g. "analysis", "codegen").
+            elapsed (float): Wall time of the call in seconds.
+        """
+        usage = getattr(response, "usage", None)
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = getattr(details, "cached_tokens", 0) or 0
+        
+        self._usage_totals["calls"] += 1
+        self._usage_totals["prompt_tokens"] += prompt_tokens
+        self._usage_totals["completion_tokens"] += completion_tokens
+        self._usage_totals["cached_prompt_tokens"] += cached_tokens
+        LLM_TOKENS.inc(prompt_tokens, purpose=purpose or "unspecified", kind="prompt")
+        LLM_TOKENS.inc(completion_tokens, purpose=purpose or "unspecified", kind="completion")
+        LLM_TOKENS.inc(cached_tokens, purpose=purpose or "unspecified", kind="cached_prompt")
+        
+        logger.info(
+            f"LLM call [{purpose or 'unspecified'}] model={self._model_name} "
+            f"prompt_tokens={prompt_tokens} (cached={cached_tokens}) "
+            f"completion_tokens={completion_tokens} time={elapsed:.2f}s"
+        )
+
+    def _observe_call(self, purpose: Optional[str], elapsed: float, cached: bool = False) -> None:
+        """Record a call's latency in the query's timings and the metrics."""
+        record_llm_call(purpose, elapsed, cached)
+        LLM_CALL_SECONDS.observe(
+            elapsed, purpose=purpose or "unspecified", cached=str(cached).lower()
+        )
 
+    def get_usage_stats(self) -> Dict[str, Any]:
+        """Get cumulative token usage across all calls made by this instance.
+        
+        Returns:
+            Dict[str, Any]: Call count and prompt/completion/cached token totals.
+        """
+        return dict(self._usage_totals)
 
-    async def generate_content_async(self, prompt: str, **kwargs) -> str:
+
+    async def generate_content_async(self, prompt: str, purpose: Optional[str] = None, **kwargs) -> str:
         """Generate content asynchronously using the LLM.
         
         Args:
             prompt (str): The input prompt for the LLM.
+            purpose (str): Label for the token usage log (e.g. "analysis").
             **kwargs: Additional keyword arguments for the LLM call.
             
         Returns:
             str: The generated content from the LLM.
         """
+        start_time = time.time()
+        cache_key = self._cache_key(prompt, kwargs)
+        if cache_key is not None:
+            # The disk tier is SQLite; keep its I/O off the event loop
+            cached = await asyncio.to_thread(self._cached_response, cache_key, purpose)
+            if cached is not None:
+                self._observe_call(purpose, time.time() - start_time, cached=True)
+                return cached
+        
+        # Don't start, or keep waiting on, a call the request has no time for
+        deadline = current_deadline()
+        if deadline is not None:
+            deadline.check(f"LLM call [{purpose or 'unspecified'}]")
+        
         try:
             # Use litellm to make the async call
-            response = await litellm.acompletion(
-                model=self._model_name,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ],
-                api_base=self._api_base_url,
-                api_key="<ignored>",  # We use custom headers instead
-                extra_headers=self._custom_headers,
-                **kwargs
+            response = await asyncio.wait_for(
+                litellm.acompletion(
+                    model=self._model_name,
+                    messages=[
+                        {"role": "user", "content": prompt}
+                    ],
+                    api_base=self._api_base_url,
+                    api_key="<ignored>",  # We use custom headers instead
+                    extra_headers=self._custom_headers,
+                    **kwargs
+                ),
+                timeout=deadline.remaining() if deadline is not None else None
             )
+            self._record_usage(response, purpose, time.time() - start_time)
+            self._observe_call(purpose, time.time() - start_time)
+            content = response.choices[0].message.content
             
-            return response.choices[0].message.content
-            
+        except asyncio.TimeoutError as e:
+            if deadline is None or not deadline.expired:
+                raise Exception(f"Error generating content with LLM: {str(e)}")
+            raise DeadlineExceededError(
+                f"Request deadline of {deadline.seconds:g}s exceeded during LLM call "
+                f"[{purpose or 'unspecified'}]",
+                stage="llm",
+            )
         except Exception as e:
             raise Exception(f"Error generating content with LLM: {str(e)}")
+        
+        if cache_key is not None and content:
+            await asyncio.to_thread(self._cache.set, cache_key, content, self._model_name)
+        return content
     
-    def generate(self, prompt: str, **kwargs) -> str:
+    def generate(
+        self, prompt: str, purpose: Optional[str] = None, use_cache: bool = True, **kwargs
+    ) -> str:
         """Generate content synchronously using the LLM.
         
         Args:
             prompt (str): The input prompt for the LLM.
+            purpose (str): Label for the token usage log (e.g. "analysis").
+            use_cache (bool): Whether the response cache may serve or store
+                this call; connectivity probes must reach the gateway.
             **kwargs: Additional keyword arguments for the LLM call.
             
         Returns:
             str: The generated content from the LLM.
         """
+        start_time = time.time()
+        cache_key = self._cache_key(prompt, kwargs) if use_cache else None
+        cached = self._cached_response(cache_key, purpose)
+        if cached is not None:
+            self._observe_call(purpose, time.time() - start_time, cached=True)
+            return cached
+        
         try:
             # Use litellm to make the sync call
             response = litellm.completion(
@@ -81,12 +221,24 @@ class LLMModel(BaseLlm):
                 extra_headers=self._custom_headers,
                 **kwargs
             )
-            
-            return response.choices[0].message.content
+            self._record_usage(response, purpose, time.time() - start_time)
+            self._observe_call(purpose, time.time() - start_time)
+            content = response.choices[0].message.content
             
         except Exception as e:
             raise Exception(f"Error generating content with LLM: {str(e)}")
+        
+        if cache_key is not None and content:
+            self._cache.set(cache_key, content, self._model_name)
+        return content
 
 
-# Create a default LLM model instance for use in other modules
+# Create a default LLM model instance for use in other modules.
+# Set LLM_RESPONSE_CACHE to a SQLite path to cache responses across restarts;
+# LLM_CACHE_REPLAY=1 serves only recorded responses (offline benchmarks).
 llm_model = LLMModel()
+if os.environ.get("LLM_RESPONSE_CACHE"):
+    llm_model.enable_cache(
+        os.environ["LLM_RESPONSE_CACHE"],
+        replay_only=os.environ.get("LLM_CACHE_REPLAY") == "1",
+    )
@@ -0,0 +1,376 @@
+# release_agent/metrics.py
+
+import asyncio
+import bisect
+import logging
+import math
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; covers sub-millisecond native queries up to long sandbox runs
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_INVALID_NAME_CHARS = re.compile(r"[^a-zA-Z0-9_]")
+
+# (metric name suffix, labels, value)
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels.items()) + "}"
+
+
+def sanitize_name(name: str) -> str:
+    """Make a string usable as a metric name."""
+    name = _INVALID_NAME_CHARS.sub("_", name)
+    return name if not name[:1].isdigit() else f"_{name}"
+
+
+class _Metric:
+    """A metric family with a fixed set of label names."""
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[Sample]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing count per label set."""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            return [
+                ("", dict(zip(self.labelnames, key)), value) for key, value in self._values.items()
+            ]
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, per label set."""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+    def value(self, **labels: Any) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            return [
+                ("", dict(zip(self.labelnames, key)), value) for key, value in self._values.items()
+            ]
+
+
+class Histogram(_Metric):
+    """Cumulative bucket counts, sum and count of observations per label set."""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label key -> (per-bucket counts incl. +Inf, sum, count)
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self) -> List[Sample]:
+        samples: List[Sample] = []
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                labels = dict(zip(self.labelnames, key))
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                    cumulative += bucket_count
+                    samples.append(
+                        ("_bucket", {**labels, "le": _format_value(bound)}, cumulative)
+                    )
+                samples.append(("_sum", labels, total))
+                samples.append(("_count", labels, count))
+        return samples
+
+
+class MetricsRegistry:
+    """
+    Metrics of this process, rendered in the Prometheus text exposition format.
+
+    Components record into metrics registered here as things happen.
+    Collectors are called at scrape time for values that are cheaper to read
+    than to track, e.g. the counters the components already keep for
+    get_stats().
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[_Metric]]] = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Metric {metric.name} is already registered differently")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def register_collector(self, collector: Callable[[], Iterable[_Metric]]) -> None:
+        """Add a callable returning freshly built metrics at every scrape."""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        """All metrics in the text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        for collector in collectors:
+            try:
+                metrics.extend(collector())
+            except Exception as e:
+                logger.warning(f"Metrics collector failed: {e}")
+
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def stats_collector(prefix: str, get_stats: Callable[[], Dict[str, Any]]) -> Callable[[], List[Gauge]]:
+    """
+    Collector exposing the numeric values of a get_stats() dict as gauges.
+
+    Each component's stats become ``<prefix>_<component>_<stat>`` gauges
+    (e.g. kg_execution_result_cache_hit_ratio); a nested dict of numbers,
+    such as the planner's choices per engine, becomes one gauge with a
+    ``key`` label. Strings, booleans and None are skipped.
+    """
+
+    def collect() -> List[Gauge]:
+        gauges: Dict[str, Gauge] = {}
+
+        def gauge(component: str, stat: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+            name = sanitize_name(f"{prefix}_{component}_{stat}")
+            if name not in gauges:
+                gauges[name] = Gauge(name, f"{stat} of {component}", labelnames)
+            return gauges[name]
+
+        def is_number(value: Any) -> bool:
+            return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+        for component, stats in get_stats().items():
+            if not isinstance(stats, dict):
+                continue
+            for stat, value in stats.items():
+                if is_number(value):
+                    gauge(component, stat).set(value)
+                elif isinstance(value, dict) and value and all(map(is_number, value.values())):
+                    for key, item in value.items():
+                        gauge(component, stat, ("key",)).set(item, key=key)
+        return list(gauges.values())
+
+    return collect
+
+
+async def monitor_event_loop_lag(interval: float = 0.5) -> None:
+    """
+    Measure event loop lag until cancelled.
+
+    Sleeps for ``interval`` and records how much later than scheduled it
+    woke up; blocking calls on the loop show up as lag.
+    """
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag = max(time.perf_counter() - start - interval, 0.0)
+        EVENT_LOOP_LAG.set(lag)
+        EVENT_LOOP_LAG_SECONDS.observe(lag)
+
+
+# Process-wide registry and the metrics components record into
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUESTS = REGISTRY.counter(
+    "kg_http_requests_total", "HTTP requests handled", ("method", "endpoint", "status")
+)
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "kg_http_request_duration_seconds", "HTTP request latency", ("method", "endpoint")
+)
+HTTP_IN_FLIGHT = REGISTRY.gauge("kg_http_requests_in_flight", "HTTP requests being handled")
+QUERY_STAGE_SECONDS = REGISTRY.histogram(
+    "kg_query_stage_duration_seconds", "Time spent in each query pipeline stage", ("stage",)
+)
+QUERY_EXECUTION_PHASE_SECONDS = REGISTRY.histogram(
+    "kg_query_execution_phase_seconds",
+    "Time spent in each phase of query execution (sandbox spawn, KG load, compute, ...)",
+    ("phase",),
+)
+LLM_CALL_SECONDS = REGISTRY.histogram(
+    "kg_llm_call_duration_seconds", "LLM call latency", ("purpose", "cached")
+)
+LLM_TOKENS = REGISTRY.counter("kg_llm_tokens_total", "LLM tokens used", ("purpose", "kind"))
+SANDBOX_RUNS = REGISTRY.counter(
+    "kg_sandbox_runs_total", "Sandbox executions by outcome", ("strategy", "outcome")
+)
+SANDBOX_BYTES = REGISTRY.counter(
+    "kg_sandbox_bytes_total", "Bytes read and KG data loaded by sandboxes", ("kind",)
+)
+EVENT_LOOP_LAG = REGISTRY.gauge("kg_event_loop_lag_seconds", "Most recent event loop lag")
+EVENT_LOOP_LAG_SECONDS = REGISTRY.histogram(
+    "kg_event_loop_lag_distribution_seconds",
+    "Event loop lag",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+)
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware counting HTTP requests and timing them per endpoint.
+
+    Written against plain ASGI rather than as an ``@app.middleware("http")``
+    function: Starlette's BaseHTTPMiddleware hides client disconnects from
+    the endpoint, which then cannot cancel abandoned queries.
+    """
+
+    def __init__(self, app: Callable):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message: Dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            # Label by route template, not raw path, so job IDs don't add series
+            endpoint = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUESTS.inc(method=scope["method"], endpoint=endpoint, status=status)
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - start, method=scope["method"], endpoint=endpoint
+            )
+
+
+def observe_query_timings(timings: Dict[str, Any]) -> None:
+    """Record a query's StageTimer breakdown."""
+    for stage, seconds in (timings.get("stages") or {}).items():
+        QUERY_STAGE_SECONDS.observe(seconds, stage=stage)
+    for phase, seconds in (timings.get("execution") or {}).items():
+        if isinstance(seconds, (int, float)):
+            QUERY_EXECUTION_PHASE_SECONDS.observe(seconds, phase=phase)
@@ -0,0 +1,334 @@
+# release_agent/program_library.py
+
+import ast
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from .date_extractor import DateExtractor
+
+logger = logging.getLogger(__name__)
+
+# Arguments every reusable query program must accept
+PROGRAM_PARAMETERS = ["files", "date_range", "state", "sbu", "dept"]
+
+# Filters a reusable program must read in its body; each tuple is satisfied
+# by reading any one of its arguments
+PROGRAM_FILTERS = [("state",), ("sbu",), ("dept",), ("date_range", "files")]
+
+US_STATES = {
+    "alabama": "AL", "alaska": "AK", "arizona": "AZ", "arkansas": "AR",
+    "california": "CA", "colorado": "CO", "connecticut": "CT", "delaware": "DE",
+    "florida": "FL", "georgia": "GA", "hawaii": "HI", "idaho": "ID",
+    "illinois": "IL", "indiana": "IN", "iowa": "IA", "kansas": "KS",
+    "kentucky": "KY", "louisiana": "LA", "maine": "ME", "maryland": "MD",
+    "massachusetts": "MA", "michigan": "MI", "minnesota": "MN",
+    "mississippi": "MS", "missouri": "MO", "montana": "MT", "nebraska": "NE",
+    "nevada": "NV", "new hampshire": "NH", "new jersey": "NJ",
+    "new mexico": "NM", "new york": "NY", "north carolina": "NC",
+    "north dakota": "ND", "ohio": "OH", "oklahoma": "OK", "oregon": "OR",
+    "pennsylvania": "PA", "rhode island": "RI", "south carolina": "SC",
+    "south dakota": "SD", "tennessee": "TN", "texas": "TX", "utah": "UT",
+    "vermont": "VT", "virginia": "VA", "washington": "WA",
+    "west virginia": "WV", "wisconsin": "WI", "wyoming": "WY",
+}
+
+SBU_VALUES = ["FOOD", "HOME"]
+
+# Words that precede "department" without naming one
+_NON_DEPARTMENT_WORDS = {
+    "a", "all", "any", "best", "by", "each", "every", "per", "the", "top",
+    "which", "worst", "whole", "same", "sbu", "food", "home",
+}
+
+_STATE_NAME_PATTERN = re.compile(
+    r"\b(" + "|".join(sorted(US_STATES, key=len, reverse=True)) + r")\b"
+)
+# Codes that are also common words ("IN", "OR") are only taken from state names
+_AMBIGUOUS_STATE_CODES = {"HI", "IN", "ME", "OH", "OK", "OR"}
+_STATE_CODE_PATTERN = re.compile(
+    r"\b("
+    + "|".join(sorted(set(US_STATES.values()) - _AMBIGUOUS_STATE_CODES))
+    + r")\b"
+)
+_SBU_PATTERN = re.compile(r"\b(" + "|".join(value.lower() for value in SBU_VALUES) + r")\b")
+_DEPT_PATTERN = re.compile(r"\b([a-z][\w&-]*)\s+(?:dept|department)s?\b")
+_STORE_ID_PATTERN = re.compile(r"\bstores?\s+#?(\d+)\b")
+
+
+def _single_or_list(values: List[str]) -> Any:
+    """Collapse a filter to a single value, a list, or None."""
+    unique = list(dict.fromkeys(values))
+    if not unique:
+        return None
+    return unique[0] if len(unique) == 1 else unique
+
+
+def extract_store_ids(query: str) -> List[str]:
+    """
+    Pull the store numbers out of a query ("store 1001", "stores #12").
+
+    Store numbers aren't program parameters: they stay in the intent
+    template, so a program is only reused for the same stores.
+    """
+    return list(dict.fromkeys(_STORE_ID_PATTERN.findall(query.lower())))
+
+
+def extract_parameters(query: str) -> Dict[str, Any]:
+    """
+    Pull the state, SBU and department filters out of a query.
+
+    Returns:
+        Dict with state, sbu and dept (a value, a list, or None)
+    """
+    query_lower = query.lower()
+    states = [US_STATES[name] for name in _STATE_NAME_PATTERN.findall(query_lower)]
+    states.extend(_STATE_CODE_PATTERN.findall(query))
+    sbus = [sbu.upper() for sbu in _SBU_PATTERN.findall(query_lower)]
+    depts = [
+        dept
+        for dept in _DEPT_PATTERN.findall(query_lower)
+        if dept not in _NON_DEPARTMENT_WORDS
+    ]
+    return {
+        "state": _single_or_list(states),
+        "sbu": _single_or_list(sbus),
+        "dept": _single_or_list(depts),
+    }
+
+
+class QueryProgramLibrary:
+    """
+    Local library of parameterized query programs, keyed by query intent.
+
+    Generated code defines ``run_query(files, date_range, state, sbu, dept)``
+    and binds this query's values in a ``PARAMS`` block. The library keeps the
+    function under an intent template - the normalized query with states,
+    SBUs, departments and dates masked - so a later query of the same shape
+    ("FOOD sales in Florida for Feb 2022" after "... Jan 2022") binds its own
+    parameters and runs without generating code.
+
+    Programs are persisted as JSON so they survive restarts.
+    """
+
+    def __init__(
+        self,
+        schema_version: str,
+        path: Optional[str] = os.path.join("Data", "query_library", "programs.json"),
+        date_extractor: DateExtractor = None,
+    ):
+        """
+        Args:
+            schema_version: KG schema version the programs were written against
+            path: JSON file backing the library; in-memory only if None
+            date_extractor: Extractor used to mask date phrases
+        """
+        self.schema_version = schema_version
+        self.path = path
+        self.date_extractor = date_extractor or DateExtractor()
+        self._lock = threading.Lock()
+        self._programs: Dict[str, Dict[str, Any]] = self._load()
+        self._stats = {"hits": 0, "misses": 0, "stored": 0, "rejected": 0}
+
+    def extract_parameters(self, query: str) -> Dict[str, Any]:
+        """Pull the state, SBU and department filters out of a query."""
+        return extract_parameters(query)
+
+    def intent_template(self, query: str) -> str:
+        """Normalize a query and mask its parameter values."""
+        text = self.date_extractor.strip_dates(query)
+        text = _STATE_NAME_PATTERN.sub("<state>", text)
+        # State codes are only recognized in upper case in the original query
+        codes = set(_STATE_CODE_PATTERN.findall(query))
+        if codes:
+            text = re.sub(
+                r"\b(" + "|".join(code.lower() for code in codes) + r")\b", "<state>", text
+            )
+        text = _SBU_PATTERN.sub("<sbu>", text)
+        text = _DEPT_PATTERN.sub(
+            lambda match: match.group(0)
+            if match.group(1) in _NON_DEPARTMENT_WORDS
+            else "<dept> department",
+            text,
+        )
+        text = re.sub(r"[^\w<>\s]", " ", text)
+        return re.sub(r"\s+", " ", text).strip()
+
+    def _key(self, query: str) -> str:
+        return f"{self.schema_version}:{self.intent_template(query)}"
+
+    def lookup(self, query: str) -> Optional[Dict[str, Any]]:
+        """
+        Find a stored program for a query of the same shape.
+
+        Returns:
+            Entry with template, analysis and function_code, or None
+        """
+        with self._lock:
+            entry = self._programs.get(self._key(query))
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["hits"] += 1
+            entry["uses"] = entry.get("uses", 0) + 1
+            return dict(entry)
+
+    def store(self, query: str, analysis: Dict[str, Any], code: str) -> bool:
+        """
+        Add a program to the library if the code is properly parameterized.
+
+        Args:
+            query: Query the code answered
+            analysis: Analysis the code was generated for
+            code: Validated code that executed successfully
+
+        Returns:
+            True if the program was stored
+        """
+        function_code = self.extract_program(
+            code, {**self.extract_parameters(query), "store": extract_store_ids(query)}
+        )
+        if function_code is None:
+            with self._lock:
+                self._stats["rejected"] += 1
+            return False
+
+        template = self.intent_template(query)
+        with self._lock:
+            self._programs[self._key(query)] = {
+                "template": template,
+                "example_query": query,
+                "analysis": analysis,
+                "function_code": function_code,
+                "created_at": time.time(),
+                "uses": 0,
+            }
+            self._stats["stored"] += 1
+            self._save()
+        logger.info(f"Stored query program for intent '{template}'")
+        return True
+
+    def extract_program(
+        self, code: str, query_params: Optional[Dict[str, Any]] = None
+    ) -> Optional[str]:
+        """
+        Return the reusable part of generated code (imports and definitions).
+
+        Code qualifies when it defines ``run_query`` taking every parameter in
+        PROGRAM_PARAMETERS, its body reads the filters in PROGRAM_FILTERS,
+        and the body contains no KG file paths and none of the originating
+        query's filter values or store numbers (a program filtering on a
+        literal "FL" would answer every later state's query with Florida's
+        data). Top-level
+        statements other than imports and definitions - the PARAMS binding
+        and the call - are dropped.
+
+        Args:
+            code: Generated code
+            query_params: State, SBU, department and store values of the
+                query the code was generated for (see extract_parameters and
+                extract_store_ids)
+
+        Returns:
+            The program source, or None if the code isn't reusable
+        """
+        try:
+            tree = ast.parse(code)
+        except SyntaxError:
+            return None
+
+        run_query = next(
+            (
+                node
+                for node in tree.body
+                if isinstance(node, ast.FunctionDef) and node.name == "run_query"
+            ),
+            None,
+        )
+        if run_query is None:
+            return None
+
+        arg_names = {arg.arg for arg in run_query.args.args + run_query.args.kwonlyargs}
+        if not set(PROGRAM_PARAMETERS) <= arg_names:
+            return None
+
+        loaded_names = {
+            node.id
+            for statement in run_query.body
+            for node in ast.walk(statement)
+            if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load)
+        }
+        if not all(loaded_names.intersection(names) for names in PROGRAM_FILTERS):
+            return None
+
+        hardcoded_values = set()
+        for value in (query_params or {}).values():
+            values = value if isinstance(value, list) else [value]
+            hardcoded_values.update(str(item).casefold() for item in values if item)
+
+        for node in ast.walk(run_query):
+            if not isinstance(node, ast.Constant) or isinstance(node.value, bool):
+                continue
+            if isinstance(node.value, str) and node.value.endswith(".json"):
+                return None
+            # Store numbers may be written as ints
+            if isinstance(node.value, (str, int)) and str(node.value).casefold() in hardcoded_values:
+                return None
+
+        definitions = (ast.Import, ast.ImportFrom, ast.FunctionDef, ast.ClassDef)
+        segments = [
+            ast.get_source_segment(code, node)
+            for node in tree.body
+            if isinstance(node, definitions)
+        ]
+        return "\n\n".join(segment for segment in segments if segment)
+
+    @staticmethod
+    def bind(function_code: str, params: Dict[str, Any]) -> str:
+        """Build executable code that runs a program with the given parameters."""
+        return (
+            f"{function_code}\n\n"
+            f"PARAMS = {params!r}\n"
+            "results = run_query(**PARAMS)\n"
+            "print(json.dumps(results, default=str))\n"
+        )
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not load query program library {self.path}: {e}")
+            return {}
+
+    def _save(self) -> None:
+        """Write the library atomically; callers hold the lock."""
+        if not self.path:
+            return
+        try:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(self._programs, f, indent=2, default=str)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not save query program library {self.path}: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get library size and lookup counters."""
+        with self._lock:
+            return {
+                **self._stats,
+                "programs": len(self._programs),
+                "path": self.path,
+                "schema_version": self.schema_version,
+            }
+
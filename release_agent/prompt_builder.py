@@ -0,0 +1,168 @@
+# release_agent/prompt_builder.py
+
+import json
+import textwrap
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .schema_manager import KGSchemaManager
+
+# Relationship endpoints use display names; map them to node type keys
+_DISPLAY_TO_NODE_TYPE = {
+    "Month": "month",
+    "Day": "day",
+    "SBU": "sbu",
+    "Department": "dept",
+    "SBU-Store": "sbu_store",
+    "Day-Store": "day_store",
+    "Store": "store",
+    "Weather": "weather",
+}
+
+
+def compact_json(value: Any) -> str:
+    """Serialize a value as JSON without indentation or padding."""
+    return json.dumps(value, separators=(",", ":"), default=str)
+
+
+class KGPromptBuilder:
+    """
+    Builds compact, pattern-scoped schema context for the LLM prompts.
+
+    Every prompt starts with the same static prefix (role and a one-line
+    catalog of node types and query patterns) so the gateway can reuse its
+    cached prefix across calls. The detailed part of the schema - properties,
+    ID patterns, relationships and filter values - is only included for the
+    node types relevant to the query pattern, serialized compactly.
+    """
+
+    def __init__(self, schema_manager: KGSchemaManager = None):
+        self.schema_manager = schema_manager or KGSchemaManager()
+        self._prefix = self._build_prefix()
+        self._scoped: Dict[Tuple[str, ...], str] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def prefix(self) -> str:
+        """Static prompt prefix shared by every LLM call."""
+        return self._prefix
+
+    def _build_prefix(self) -> str:
+        schema = self.schema_manager.schema
+        catalog = {
+            "node_types": {
+                node_type: info.get("description", "")
+                for node_type, info in schema["node_types"].items()
+            },
+            "query_patterns": {
+                pattern: info.get("description", "")
+                for pattern, info in schema["query_patterns"].items()
+            },
+            "hierarchy": schema["hierarchy"],
+        }
+        return (
+            "You analyze and query monthly retail sales knowledge graphs (KGs) "
+            "for Walmart stores.\n"
+            f"KG catalog: {compact_json(catalog)}\n"
+        )
+
+    def node_types_for(
+        self, query_pattern: Optional[str] = None, node_types: Optional[Iterable[str]] = None
+    ) -> List[str]:
+        """
+        Resolve the node types a prompt needs to describe.
+
+        Args:
+            query_pattern: Query pattern from the analysis
+            node_types: Node types named by the analysis
+
+        Returns:
+            Known node types in schema order; all of them if nothing matched
+        """
+        wanted = set(self.schema_manager.get_node_types_for_pattern(query_pattern or ""))
+        wanted.update(node_types or [])
+        selected = [
+            node_type
+            for node_type in self.schema_manager.schema["node_types"]
+            if node_type in wanted
+        ]
+        return selected or list(self.schema_manager.schema["node_types"])
+
+    def scoped_schema(
+        self, query_pattern: Optional[str] = None, node_types: Optional[Iterable[str]] = None
+    ) -> str:
+        """
+        Compact schema context limited to the relevant node types.
+
+        Args:
+            query_pattern: Query pattern from the analysis
+            node_types: Node types named by the analysis
+
+        Returns:
+            Compact JSON with properties and ID patterns per node type, the
+            relationships between them and the filter values that apply
+        """
+        selected = self.node_types_for(query_pattern, node_types)
+        cache_key = (query_pattern or "",) + tuple(selected)
+        with self._lock:
+            cached = self._scoped.get(cache_key)
+        if cached is not None:
+            return cached
+
+        schema = self.schema_manager.schema
+        id_patterns = schema["node_id_patterns"]
+        context: Dict[str, Any] = {
+            "node_types": {
+                node_type: {
+                    "id": id_patterns.get(node_type, ""),
+                    "properties": schema["node_types"][node_type].get("properties", []),
+                }
+                for node_type in selected
+            },
+        }
+
+        relationships = []
+        for relationship in schema["relationships"]:
+            source = _DISPLAY_TO_NODE_TYPE.get(relationship["source"])
+            target = _DISPLAY_TO_NODE_TYPE.get(relationship["target"])
+            if source in selected and target in selected:
+                relationships.append(f"{source}->{target}")
+        if relationships:
+            context["relationships"] = relationships
+
+        properties = {
+            prop
+            for node_type in selected
+            for prop in schema["node_types"][node_type].get("properties", [])
+        }
+        filters = {"sbu_values": schema["common_filters"]["sbu_values"]}
+        for category, values in schema["common_filters"].items():
+            relevant = [value for value in values if value in properties]
+            if relevant and category != "sbu_values":
+                filters[category] = relevant
+        context["filters"] = filters
+
+        pattern_info = schema["query_patterns"].get(query_pattern or "")
+        if pattern_info:
+            context["query_pattern"] = {query_pattern: pattern_info["description"]}
+
+        scoped = compact_json(context)
+        with self._lock:
+            self._scoped[cache_key] = scoped
+        return scoped
+
+    def build(self, *sections: str) -> str:
+        """
+        Assemble a prompt from the static prefix and the given sections.
+
+        Callers pass static sections (task instructions) before dynamic ones
+        (schema scope, query, analysis) so the cacheable prefix is as long as
+        possible. Sections are dedented, since indentation is paid for in
+        prompt tokens too.
+        """
+        parts = [self._prefix.strip()]
+        for section in sections:
+            section = textwrap.dedent(section or "").strip()
+            if section:
+                parts.append(section)
+        return "\n\n".join(parts) + "\n"
@@ -3,24 +3,65 @@
 import json
 import re
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from datetime import datetime
 
 from .date_extractor import DateExtractor
+from .deadline import DeadlineExceededError
+from .program_library import extract_parameters
+from .prompt_builder import KGPromptBuilder
+from .query_ir import QueryIR, QueryIRBuilder
 from .schema_manager import KGSchemaManager
 
 logger = logging.getLogger(__name__)
 
+# Keywords per intent, in the precedence order _classify_query_type applies them
+INTENT_KEYWORDS = {
+    'weather_impact': ['hurricane', 'storm', 'weather', 'temperature'],
+    'comparison': ['compare', 'vs', 'versus', 'difference'],
+    'temporal_analysis': ['trend', 'over time', 'timeline', 'before', 'after'],
+    'store_performance': ['store', 'location', 'shop'],
+    'department_analysis': ['department', 'category', 'dept'],
+}
+
+# Plain aggregations ("total FOOD sales ...") need no other intent keyword
+AGGREGATION_KEYWORDS = ['total', 'sum', 'top', 'average', 'how much', 'how many']
+
+METRIC_KEYWORDS = ['sales', 'gmv', 'revenue', 'units', 'forecast', 'temperature', 'precipitation']
+
+# Signs of reasoning the keyword rules can't capture
+COMPLEX_QUERY_KEYWORDS = [
+    'why', 'explain', 'correlat', 'predict', 'anomal', 'unusual', 'cause',
+    'what if', 'recommend', 'should', 'outlier',
+]
+
 
 class QueryAnalyzer:
     """Analyzes natural language queries to understand intent and extract information."""
     
-    def __init__(self, llm_model=None, schema_manager: KGSchemaManager = None):
+    def __init__(
+        self,
+        llm_model=None,
+        schema_manager: KGSchemaManager = None,
+        prompt_builder: KGPromptBuilder = None,
+        confidence_threshold: float = 0.8
+    ):
+        """
+        Args:
+            llm_model: LLM used for queries the rules can't classify confidently
+            schema_manager: KG schema
+            prompt_builder: Builder for the compact analysis prompt
+            confidence_threshold: Rule-based confidence at or above which the
+                LLM analysis is skipped
+        """
         self.llm = llm_model
         self.date_extractor = DateExtractor()
         self.schema_manager = schema_manager or KGSchemaManager()
+        self.prompt_builder = prompt_builder or KGPromptBuilder(self.schema_manager)
+        self.confidence_threshold = confidence_threshold
+        self.ir_builder = QueryIRBuilder(self.schema_manager)
     
-    def analyze_query(self, query: str) -> Dict[str, Any]:
+    async def analyze_query(self, query: str) -> Dict[str, Any]:
         """
         Analyze the query to understand intent and extract key information.
         
@@ -28,30 +69,127 @@ class QueryAnalyzer:
             query: Natural language query
             
         Returns:
-            Dictionary containing analysis results
+            Dictionary containing analysis results; "analysis_path" tells
+            whether the rules ("rule_based"), the LLM ("llm") or the rules
+            after an LLM failure ("rule_based_fallback") produced it
         """
+        # Simple queries are classified by the rules alone
+        analysis = self.fast_path_analysis(query)
+        if analysis:
+            return analysis
+        
         current_date = datetime.now()
         
-        # Try LLM-based analysis first
+        # Try LLM-based analysis next
         if self.llm:
             try:
-                return self._analyze_with_llm(query, current_date)
+                analysis = await self._analyze_with_llm(query, current_date)
+                analysis['analysis_path'] = 'llm'
+                return analysis
+            except DeadlineExceededError:
+                raise
             except Exception as e:
                 logger.warning(f"LLM analysis failed, using basic analysis: {e}")
         
         # Fallback to basic analysis
-        return self._analyze_basic(query)
+        analysis = self._analyze_basic(query)
+        analysis['analysis_path'] = 'rule_based_fallback'
+        return analysis
+    
+    def fast_path_analysis(self, query: str) -> Optional[Dict[str, Any]]:
+        """
+        Rule-based analysis, if the rules are confident enough to skip the LLM.
+        
+        Returns:
+            The analysis with analysis_path "rule_based", or None. Queries
+            the rules can also express as a QueryIR carry it under "query_ir".
+        """
+        analysis = self._analyze_basic(query)
+        if analysis['analysis_confidence'] < self.confidence_threshold:
+            return None
+        logger.info(
+            f"Rule-based analysis confidence {analysis['analysis_confidence']:.2f}; "
+            "skipping LLM analysis"
+        )
+        analysis['analysis_path'] = 'rule_based'
+        query_ir = self.ir_builder.build(query, analysis)
+        if query_ir is not None:
+            analysis['query_ir'] = query_ir.to_dict()
+        return analysis
+    
+    def score_confidence(
+        self, query: str, analysis: Dict[str, Any], filters: Dict[str, Any]
+    ) -> float:
+        """
+        Score how well the keyword rules understood a query (0.0 - 1.0).
+        
+        Evidence: exactly one intent matched (several matches are ambiguous),
+        a resolved date range, recognized state/SBU/department/store entities
+        and a named metric. Questions asking for explanations or predictions,
+        and long multi-clause queries, are penalized.
+        """
+        query_lower = query.lower()
+        intents = [
+            intent for intent, keywords in INTENT_KEYWORDS.items()
+            if any(word in query_lower for word in keywords)
+        ]
+        if not intents and any(word in query_lower for word in AGGREGATION_KEYWORDS + METRIC_KEYWORDS):
+            intents = ['aggregation']
+        
+        confidence = 0.0
+        if len(intents) == 1:
+            confidence += 0.4
+        elif intents:
+            confidence += 0.15
+        if analysis.get('extracted_date_range'):
+            confidence += 0.3
+        if any(filters.values()) or re.search(r'\bstores?\s+#?\d+', query_lower):
+            confidence += 0.2
+        if any(word in query_lower for word in METRIC_KEYWORDS):
+            confidence += 0.1
+        if any(word in query_lower for word in COMPLEX_QUERY_KEYWORDS):
+            confidence -= 0.4
+        if len(query.split()) > 20:
+            confidence -= 0.15
+        return round(min(max(confidence, 0.0), 1.0), 2)
     
-    def _analyze_with_llm(self, query: str, current_date: datetime) -> Dict[str, Any]:
+    async def _analyze_with_llm(self, query: str, current_date: datetime) -> Dict[str, Any]:
         """Analyze query using LLM for better understanding."""
-        analysis_prompt = f"""
-        Analyze this query about retail/sales data and classify it:
+        # Scope the schema by the keyword analysis; the prompt prefix still
+        # lists every node type and pattern for the LLM to choose from
+        preliminary = self._analyze_basic(query)
+        analysis_prompt = self.prompt_builder.build(
+            self.analysis_instructions(),
+            self.schema_context(preliminary),
+            self.query_context(query, current_date),
+        )
         
-        Query: "{query}"
-        Current Date: {current_date.strftime('%Y-%m-%d')}
+        # Async call so the event loop keeps serving other requests meanwhile
+        analysis_json = await self.llm.generate_content_async(
+            analysis_prompt, purpose="analysis"
+        )
         
-        KG Schema Context:
-        {json.dumps(self.schema_manager.schema, indent=2)}
+        return self.parse_analysis(analysis_json)
+    
+    def schema_context(self, analysis: Dict[str, Any]) -> str:
+        """Compact schema section scoped to an analysis' pattern and node types."""
+        scoped = self.prompt_builder.scoped_schema(
+            analysis.get('query_pattern'), analysis.get('target_node_types')
+        )
+        return f"Relevant schema: {scoped}"
+    
+    def query_context(self, query: str, current_date: datetime = None) -> str:
+        """Per-request part of the analysis prompt; goes last to keep the prefix stable."""
+        current_date = current_date or datetime.now()
+        return f"""
+        Current Date: {current_date.strftime('%Y-%m-%d')}
+        Query: "{query}"
+        """
+    
+    def analysis_instructions(self) -> str:
+        """Build the static analysis task description shared by the analysis prompts."""
+        return f"""
+        Analyze the query about retail/sales data given at the end and classify it.
         
         Extract specific date ranges from the query and determine:
         1. Query type (temporal_analysis, spatial_analysis, comparison, aggregation, correlation, impact_analysis)
@@ -63,6 +201,11 @@ class QueryAnalyzer:
         7. Required node types from schema
         8. Relevant query pattern from schema
         9. **EXTRACTED DATE RANGE**: Convert any date mentions to YYYYMM format
+        10. Query IR: if the query is a plain filter -> group by -> aggregate over ONE node type,
+            express it as "query_ir"; otherwise (joins, comparisons, trends, explanations) use null.
+            metrics[].agg: sum, mean, count, min, max; metrics[].field: a numeric property of node_type.
+            filters: state (st_cd code), sbu, dept, store. group_by: date, month, sbu, dept, store, state.
+            order_by: an output column named "<agg>_<field>" (or "count"), else null.
         
         Date Range Extraction Examples:
         - "January 2022" → ["202201"]
@@ -88,12 +231,17 @@ class QueryAnalyzer:
             "target_node_types": ["sbu", "sbu_store", "weather"],
             "query_pattern": "weather_impact",
             "extracted_date_range": ["202209", "202208"],
-            "date_extraction_reasoning": "Hurricane Ian occurred in September 2022, included August for before/after comparison"
+            "date_extraction_reasoning": "Hurricane Ian occurred in September 2022, included August for before/after comparison",
+            "query_ir": null
         }}
+        Example query_ir for "Total FOOD sales by state in January 2022":
+        {{"node_type": "sbu_store", "metrics": [{{"field": "total_gmv_amt", "agg": "sum"}}],
+          "filters": {{"sbu": "FOOD"}}, "group_by": ["state"], "date_range": ["202201"],
+          "order_by": null, "descending": true, "limit": null}}
         """
-        
-        analysis_json = self.llm.generate(analysis_prompt)
-        
+    
+    def parse_analysis(self, analysis_json: str) -> Dict[str, Any]:
+        """Parse and validate an analysis JSON returned by the LLM."""
         # Try to extract JSON from the response
         json_match = re.search(r'\{.*\}', analysis_json, re.DOTALL)
         if json_match:
@@ -101,11 +249,38 @@ class QueryAnalyzer:
             # Validate and clean up extracted date range
             if 'extracted_date_range' in analysis:
                 analysis['extracted_date_range'] = self._validate_date_range(analysis['extracted_date_range'])
+            analysis['query_ir'] = self._validate_query_ir(analysis.get('query_ir'), analysis)
             return analysis
         else:
             # If LLM response can't be parsed, fall back to basic
             raise ValueError("Could not parse LLM response as JSON")
     
+    def _validate_query_ir(
+        self, query_ir: Optional[Dict[str, Any]], analysis: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        """Keep an LLM-provided query IR only if it is executable against the schema."""
+        if not query_ir:
+            return None
+        try:
+            ir = QueryIR.from_dict(query_ir)
+        except (TypeError, ValueError) as e:
+            logger.info(f"Discarding malformed query IR: {e}")
+            return None
+        if not ir.date_range:
+            ir.date_range = analysis.get('extracted_date_range') or []
+        errors = ir.validate(self.schema_manager)
+        if errors:
+            logger.info(f"Discarding query IR that doesn't fit the schema: {errors}")
+            return None
+        return ir.to_dict()
+    
+    def preliminary_analysis(self, query: str) -> Dict[str, Any]:
+        """
+        Cheap keyword/date based analysis, used to resolve target files
+        before the combined LLM call.
+        """
+        return self._analyze_basic(query)
+    
     def _analyze_basic(self, query: str) -> Dict[str, Any]:
         """Fallback basic query analysis using keyword matching."""
         query_lower = query.lower()
@@ -133,13 +308,30 @@ class QueryAnalyzer:
         analysis.update(self._classify_query_type(query_lower))
         analysis.update(self._determine_scope(query_lower))
         
+        # Recognized filter values sharpen the scope
+        filters = extract_parameters(query)
+        analysis['filters'] = filters
+        analysis['entities'] = [
+            value
+            for values in filters.values() if values
+            for value in (values if isinstance(values, list) else [values])
+        ]
+        if filters['state']:
+            analysis['geographic_scope'] = 'specific_state'
+            analysis['requires_geospatial'] = True
+        if filters['dept']:
+            analysis['business_scope'] = 'specific_department'
+        elif filters['sbu']:
+            analysis['business_scope'] = 'specific_sbu'
+        
+        analysis['analysis_confidence'] = self.score_confidence(query, analysis, filters)
         return analysis
     
     def _classify_query_type(self, query_lower: str) -> Dict[str, Any]:
         """Classify query type based on keywords."""
         updates = {}
         
-        if any(word in query_lower for word in ['hurricane', 'storm', 'weather', 'temperature']):
+        if any(word in query_lower for word in INTENT_KEYWORDS['weather_impact']):
             updates.update({
                 'type': 'impact_analysis',
                 'requires_weather': True,
@@ -147,24 +339,24 @@ class QueryAnalyzer:
                 'target_node_types': ['weather', 'day_store', 'store'],
                 'query_pattern': 'weather_impact'
             })
-        elif any(word in query_lower for word in ['compare', 'vs', 'versus', 'difference']):
+        elif any(word in query_lower for word in INTENT_KEYWORDS['comparison']):
             updates.update({
                 'type': 'comparison',
                 'target_node_types': ['sbu', 'dept', 'store']
             })
-        elif any(word in query_lower for word in ['trend', 'over time', 'timeline', 'before', 'after']):
+        elif any(word in query_lower for word in INTENT_KEYWORDS['temporal_analysis']):
             updates.update({
                 'type': 'temporal_analysis',
                 'time_scope': 'multi_month',
                 'target_node_types': ['month', 'day', 'sbu', 'store'],
                 'query_pattern': 'temporal_analysis'
             })
-        elif any(word in query_lower for word in ['store', 'location', 'shop']):
+        elif any(word in query_lower for word in INTENT_KEYWORDS['store_performance']):
             updates.update({
                 'target_node_types': ['store', 'day_store', 'sbu_store'],
                 'query_pattern': 'store_performance'
             })
-        elif any(word in query_lower for word in ['department', 'category', 'dept']):
+        elif any(word in query_lower for word in INTENT_KEYWORDS['department_analysis']):
             updates.update({
                 'target_node_types': ['dept', 'store'],
                 'query_pattern': 'department_analysis'
@@ -0,0 +1,336 @@
+# release_agent/query_ir.py
+
+import logging
+import re
+from typing import Any, Dict, List, Optional
+
+from .program_library import extract_parameters, extract_store_ids
+from .schema_manager import KGSchemaManager
+
+logger = logging.getLogger(__name__)
+
+AGGREGATIONS = ["sum", "mean", "count", "min", "max"]
+
+FILTER_KEYS = ["state", "sbu", "dept", "store"]
+
+# Business keys each node type can be filtered and grouped by; "month" is
+# derived from "date"
+NODE_TYPE_KEYS = {
+    "month": ["date", "month"],
+    "day": ["date", "month"],
+    "sbu": ["date", "month", "sbu"],
+    "dept": ["date", "month", "sbu", "dept"],
+    "sbu_store": ["date", "month", "sbu", "store", "state"],
+    "day_store": ["date", "month", "store", "state"],
+    "store": ["date", "month", "sbu", "dept", "store", "state"],
+    "weather": ["date", "month", "store", "state"],
+}
+
+# Wording that needs more than filter -> group -> aggregate
+_UNSUPPORTED_WORDS = [
+    "compare", "comparison", " vs", "versus", "difference", "trend", "over time",
+    "growth", "change", "increase", "decrease", "percent", "%", "share", "ratio",
+    "before", "after", "impact", "affect", "effect", "hurricane", "storm",
+    "year over year", "yoy", "correlat", "why", "explain", "predict", "anomal",
+    "unusual", "outlier", "cause", "what if", "recommend", "should",
+]
+
+_WEATHER_METRICS = [
+    ("temperature", "AVG_AIR_TEMPR_DGR"),
+    ("precipitation", "AVG_POS_PRECIP_QTY"),
+    ("rain", "AVG_POS_PRECIP_QTY"),
+    ("snow", "AVG_POS_DLY_SNOWFALL_QTY"),
+]
+_SALES_WORDS = ["sales", "gmv", "revenue", "sold"]
+_UNIT_WORDS = ["units", "unit sales", "items sold"]
+_FORECAST_WORDS = ["forecast", "predicted", "projected"]
+
+_GROUP_WORDS = {
+    "state": "state", "store": "store", "department": "dept", "dept": "dept",
+    "sbu": "sbu", "day": "date", "date": "date", "month": "month",
+}
+_GROUP_PATTERN = re.compile(
+    r"\b(?:by|per|each|every|across)\s+(state|store|department|dept|sbu|day|date|month)s?\b"
+)
+_RANK_PATTERN = re.compile(r"\b(top|bottom|best|worst|highest|lowest)\b(?:\s+(\d+))?")
+_RANKED_ENTITY_PATTERN = re.compile(
+    r"\b(?:top|bottom|best|worst|highest|lowest|which)\s+(?:\d+\s+)?"
+    r"(states?|stores?|departments?|depts?|sbus?|days?|months?)\b"
+)
+
+
+class QueryIR:
+    """
+    Declarative form of a filter -> group-by -> aggregate query.
+
+    An IR names one node type, the filters to apply (state, SBU, department,
+    store and the months to read), the business keys to group by and the
+    metrics to compute per group, plus an optional ordering and row limit.
+    It is executed in-process by NativeQueryEngine; queries the IR can't
+    express go through LLM code generation instead.
+    """
+
+    def __init__(
+        self,
+        node_type: str,
+        metrics: List[Dict[str, Any]],
+        filters: Optional[Dict[str, Any]] = None,
+        group_by: Optional[List[str]] = None,
+        date_range: Optional[List[str]] = None,
+        order_by: Optional[str] = None,
+        descending: bool = True,
+        limit: Optional[int] = None,
+    ):
+        """
+        Args:
+            node_type: Node type to aggregate (e.g. "sbu_store")
+            metrics: Dicts with "field" (a numeric property; optional for
+                count) and "agg" (one of AGGREGATIONS)
+            filters: state, sbu, dept and store values (a value or a list)
+            group_by: Business keys to group by (see NODE_TYPE_KEYS)
+            date_range: Months to read, as YYYYMM strings
+            order_by: Output column to sort by; groups are sorted by key if None
+            descending: Sort order for order_by
+            limit: Maximum number of rows to return
+        """
+        self.node_type = node_type
+        self.metrics = metrics
+        self.filters = {key: value for key, value in (filters or {}).items() if value}
+        self.group_by = list(group_by or [])
+        self.date_range = list(date_range or [])
+        self.order_by = order_by
+        self.descending = descending
+        self.limit = limit
+
+    @staticmethod
+    def metric_name(metric: Dict[str, Any]) -> str:
+        """Output column name of a metric ("sum_total_gmv_amt", "count")."""
+        if metric["agg"] == "count" and not metric.get("field"):
+            return "count"
+        return f"{metric['agg']}_{metric['field']}"
+
+    @property
+    def output_columns(self) -> List[str]:
+        """Group keys followed by metric columns and the row count."""
+        metric_names = [self.metric_name(metric) for metric in self.metrics]
+        return self.group_by + metric_names + (["count"] if "count" not in metric_names else [])
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-serializable form, as stored in the analysis under "query_ir"."""
+        return {
+            "node_type": self.node_type,
+            "metrics": self.metrics,
+            "filters": self.filters,
+            "group_by": self.group_by,
+            "date_range": self.date_range,
+            "order_by": self.order_by,
+            "descending": self.descending,
+            "limit": self.limit,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "QueryIR":
+        """
+        Build an IR from its dict form, e.g. as returned by the LLM.
+
+        Raises:
+            ValueError: If required fields are missing or malformed
+        """
+        if not isinstance(data, dict) or not data.get("node_type"):
+            raise ValueError("Query IR needs a node_type")
+        metrics = data.get("metrics")
+        if not isinstance(metrics, list) or not metrics:
+            raise ValueError("Query IR needs at least one metric")
+        if not all(isinstance(metric, dict) and metric.get("agg") for metric in metrics):
+            raise ValueError("Query IR metrics need an agg")
+        limit = data.get("limit")
+        return cls(
+            node_type=str(data["node_type"]),
+            metrics=[
+                {"field": metric.get("field"), "agg": str(metric["agg"]).lower()}
+                for metric in metrics
+            ],
+            filters=data.get("filters") or {},
+            group_by=data.get("group_by") or [],
+            date_range=[str(month) for month in data.get("date_range") or []],
+            order_by=data.get("order_by"),
+            descending=bool(data.get("descending", True)),
+            limit=int(limit) if limit is not None else None,
+        )
+
+    def validate(self, schema_manager: KGSchemaManager) -> List[str]:
+        """
+        Check the IR against the KG schema.
+
+        Returns:
+            List of problems; empty if the IR can be executed
+        """
+        errors = []
+        if not schema_manager.validate_node_type(self.node_type):
+            return [f"Unknown node type '{self.node_type}'"]
+
+        properties = schema_manager.get_properties_for_node_type(self.node_type)
+        keys = NODE_TYPE_KEYS.get(self.node_type, [])
+        for metric in self.metrics:
+            if metric["agg"] not in AGGREGATIONS:
+                errors.append(f"Unsupported aggregation '{metric['agg']}'")
+            elif (metric["agg"] != "count" or metric.get("field")) and metric.get("field") not in properties:
+                errors.append(f"'{metric.get('field')}' is not a property of {self.node_type}")
+        for key in self.filters:
+            if key not in FILTER_KEYS or key not in keys:
+                errors.append(f"Cannot filter {self.node_type} by '{key}'")
+        for key in self.group_by:
+            if key not in keys:
+                errors.append(f"Cannot group {self.node_type} by '{key}'")
+        if not self.date_range:
+            errors.append("Query IR needs a date range")
+        for month in self.date_range:
+            if not (len(month) == 6 and month.isdigit()):
+                errors.append(f"Invalid month '{month}'")
+        if self.order_by and self.order_by not in self.output_columns:
+            errors.append(f"Cannot order by '{self.order_by}'")
+        if self.limit is not None and self.limit <= 0:
+            errors.append("Limit must be positive")
+        return errors
+
+
+class QueryIRBuilder:
+    """
+    Rule-based translation of simple queries into a QueryIR.
+
+    Recognizes one metric (sales, units, forecast or a weather measure), an
+    aggregation (total by default; average, maximum, minimum), "by/per/each"
+    group keys, top/bottom-N rankings and the state, SBU, department and
+    store filters. Anything else - comparisons, trends, joins between
+    weather and sales, explanations - yields None and is left to code
+    generation.
+    """
+
+    def __init__(self, schema_manager: KGSchemaManager = None):
+        self.schema_manager = schema_manager or KGSchemaManager()
+
+    def build(self, query: str, analysis: Dict[str, Any]) -> Optional[QueryIR]:
+        """
+        Translate a query into a validated IR.
+
+        Args:
+            query: Natural language query
+            analysis: Rule-based analysis of the query (dates and filters)
+
+        Returns:
+            The IR, or None if the query isn't expressible
+        """
+        query_lower = f" {query.lower()} "
+        date_range = analysis.get("extracted_date_range")
+        if not date_range or any(word in query_lower for word in _UNSUPPORTED_WORDS):
+            return None
+
+        filters = dict(analysis.get("filters") or extract_parameters(query))
+        stores = extract_store_ids(query)
+        if stores:
+            filters["store"] = stores[0] if len(stores) == 1 else stores
+
+        ranked_entities = _RANKED_ENTITY_PATTERN.findall(query_lower)
+        group_by = [_GROUP_WORDS[word] for word in _GROUP_PATTERN.findall(query_lower)]
+        group_by.extend(_GROUP_WORDS[word.rstrip("s")] for word in ranked_entities)
+        periodic = [key for word, key in (("daily", "date"), ("monthly", "month")) if word in query_lower]
+        group_by = list(dict.fromkeys(group_by + periodic))
+
+        measure = self._measure(query_lower)
+        if measure is None:
+            return None
+        node_type, field = self._node_type_and_field(measure, filters, group_by, query_lower)
+        if node_type is None:
+            return None
+
+        agg = "mean" if measure[0] == "weather" else "sum"
+        if re.search(r"\b(average|avg|mean)\b", query_lower):
+            agg = "mean"
+        rank = _RANK_PATTERN.search(query_lower)
+        if re.search(r"\b(max|maximum|peak)\b", query_lower) or (rank and not group_by and rank.group(1) == "highest"):
+            agg = "max"
+        elif re.search(r"\b(min|minimum)\b", query_lower) or (rank and not group_by and rank.group(1) == "lowest"):
+            agg = "min"
+
+        if periodic and agg != "sum":
+            # "Average daily sales" aggregates daily totals - two levels
+            return None
+
+        ir = QueryIR(
+            node_type=node_type,
+            metrics=[{"field": field, "agg": agg}],
+            filters=filters,
+            group_by=group_by,
+            date_range=date_range,
+        )
+        if rank and group_by:
+            ir.order_by = QueryIR.metric_name(ir.metrics[0])
+            ir.descending = rank.group(1) in ("top", "best", "highest")
+            if rank.group(2):
+                ir.limit = int(rank.group(2))
+            else:
+                # "Which store had the highest ..." asks for one row
+                singular = any(not word.endswith("s") for word in ranked_entities)
+                ir.limit = 1 if singular else 10
+
+        errors = ir.validate(self.schema_manager)
+        if errors:
+            logger.debug(f"Rule-based query IR rejected: {errors}")
+            return None
+        return ir
+
+    @staticmethod
+    def _measure(query_lower: str) -> Optional[tuple]:
+        """Return (kind, weather field) of the single metric the query names."""
+        weather = [field for word, field in _WEATHER_METRICS if word in query_lower]
+        sales = any(word in query_lower for word in _SALES_WORDS + _UNIT_WORDS)
+        if weather and sales:
+            # Weather vs. sales needs a join the IR can't express
+            return None
+        if weather:
+            return ("weather", weather[0]) if len(set(weather)) == 1 else None
+        if any(word in query_lower for word in _FORECAST_WORDS):
+            return ("forecast", None)
+        if any(word in query_lower for word in _UNIT_WORDS):
+            return ("units", None)
+        if sales:
+            return ("sales", None)
+        return None
+
+    @staticmethod
+    def _node_type_and_field(
+        measure: tuple,
+        filters: Dict[str, Any],
+        group_by: List[str],
+        query_lower: str,
+    ) -> tuple:
+        """Pick the coarsest node type that carries the metric, filters and keys."""
+        kind, weather_field = measure
+        if kind == "weather":
+            return "weather", weather_field
+
+        keys = set(group_by) | {key for key, value in filters.items() if value}
+        store_level = bool(keys & {"store", "state"}) or " store" in query_lower
+        by_dept = "dept" in keys
+        by_sbu = "sbu" in keys
+
+        if kind == "forecast":
+            if store_level:
+                return None, None
+            if by_dept:
+                return "dept", "daily_dept_GMV_AMT_pred"
+            return "sbu", "daily_sbu_GMV_AMT_pred"
+
+        if store_level or kind == "units":
+            field = "total_sales_unit" if kind == "units" else "total_gmv_amt"
+            if by_dept:
+                return "store", field
+            if by_sbu:
+                return "sbu_store", field
+            return "day_store", field
+
+        if by_dept:
+            return "dept", "daily_dept_GMV_AMT"
+        if by_sbu:
+            return "sbu", "daily_sbu_GMV_AMT"
+        return "day_store", "total_gmv_amt"
@@ -0,0 +1,214 @@
+# release_agent/query_library.py
+
+import json
+import logging
+import math
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_PATTERN = re.compile(r"<\w+>|[a-z0-9_]+")
+
+# Words too common in retail questions to say anything about the query shape
+_STOP_WORDS = {
+    "a", "an", "and", "are", "as", "at", "by", "for", "from", "how", "in", "is",
+    "me", "of", "on", "or", "show", "the", "to", "was", "were", "what", "which",
+    "with",
+}
+
+
+class QueryExampleLibrary:
+    """
+    Library of previously generated query code with a TF-IDF similarity index.
+
+    Each record holds a query, its analysis, the code that answered it and
+    whether the run succeeded. Documents are the query's intent template
+    (parameter values masked, see QueryProgramLibrary.intent_template) plus
+    the analysis' type, pattern and node types, so "FOOD sales in Texas" and
+    "HOME sales in Florida" look identical while "store trends" does not.
+
+    The index is plain Python - term counts per record and document
+    frequencies - and is small enough to score exhaustively per lookup.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = os.path.join("Data", "query_library", "examples.json"),
+        max_records: int = 1000,
+        example_threshold: float = 0.5,
+    ):
+        """
+        Args:
+            path: JSON file backing the library; in-memory only if None
+            max_records: Oldest records are dropped beyond this size
+            example_threshold: Similarity at which a match is used as a
+                few-shot example for code generation
+        """
+        self.path = path
+        self.max_records = max_records
+        self.example_threshold = example_threshold
+        self._lock = threading.Lock()
+        self._records: List[Dict[str, Any]] = self._load()
+        self._doc_freq: Counter = Counter()
+        for record in self._records:
+            self._doc_freq.update(set(record["terms"]))
+        self._stats = {"lookups": 0, "matches": 0, "added": 0}
+
+    @staticmethod
+    def document_terms(template: str, analysis: Dict[str, Any]) -> Dict[str, int]:
+        """Turn an intent template and analysis into term counts."""
+        terms = Counter(
+            token for token in _TOKEN_PATTERN.findall(template.lower())
+            if token not in _STOP_WORDS
+        )
+        for field in ("type", "query_pattern", "analysis_type", "time_scope"):
+            if analysis.get(field):
+                terms[f"{field}={analysis[field]}"] += 1
+        for node_type in analysis.get("target_node_types") or []:
+            terms[f"node={node_type}"] += 1
+        return dict(terms)
+
+    def add(
+        self,
+        query: str,
+        template: str,
+        analysis: Dict[str, Any],
+        code: str,
+        success: bool,
+        index_analysis: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """
+        Record generated code and whether it ran successfully.
+
+        Args:
+            query: Original query
+            template: Intent template of the query
+            analysis: Analysis the code was generated for
+            code: Validated code that was executed
+            success: Whether execution succeeded without an error result
+            index_analysis: Analysis to index the record by; lookups only
+                have the preliminary analysis, so index by that for
+                comparable vectors (defaults to ``analysis``)
+        """
+        record = {
+            "query": query,
+            "template": template,
+            "analysis": analysis,
+            "code": code,
+            "success": success,
+            "created_at": time.time(),
+            "terms": self.document_terms(template, index_analysis or analysis),
+        }
+        with self._lock:
+            # Keep one record per template: the latest run is the best evidence
+            for index, existing in enumerate(self._records):
+                if existing["template"] == template:
+                    self._doc_freq.subtract(set(existing["terms"]))
+                    del self._records[index]
+                    break
+            self._records.append(record)
+            self._doc_freq.update(set(record["terms"]))
+            while len(self._records) > self.max_records:
+                dropped = self._records.pop(0)
+                self._doc_freq.subtract(set(dropped["terms"]))
+            self._stats["added"] += 1
+            self._save()
+
+    def find_similar(
+        self, template: str, analysis: Dict[str, Any], min_score: float = 0.0
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Return the most similar successful record.
+
+        Args:
+            template: Intent template of the new query
+            analysis: Preliminary analysis of the new query
+            min_score: Minimum cosine similarity to report a match
+
+        Returns:
+            The record with a "score" key, or None
+        """
+        query_terms = self.document_terms(template, analysis)
+        with self._lock:
+            self._stats["lookups"] += 1
+            if not self._records or not query_terms:
+                return None
+
+            total = len(self._records)
+            idf = {
+                term: math.log((1 + total) / (1 + self._doc_freq.get(term, 0))) + 1.0
+                for term in query_terms
+            }
+            query_vector = {term: count * idf[term] for term, count in query_terms.items()}
+            query_norm = math.sqrt(sum(weight * weight for weight in query_vector.values()))
+
+            best, best_score = None, 0.0
+            for record in self._records:
+                if not record["success"]:
+                    continue
+                score = self._cosine(query_vector, query_norm, record["terms"], total)
+                if score > best_score:
+                    best, best_score = record, score
+
+            if best is None or best_score < min_score:
+                return None
+            self._stats["matches"] += 1
+            return {**best, "score": best_score}
+
+    def _cosine(
+        self,
+        query_vector: Dict[str, float],
+        query_norm: float,
+        terms: Dict[str, int],
+        total: int,
+    ) -> float:
+        dot = 0.0
+        norm = 0.0
+        for term, count in terms.items():
+            weight = count * (math.log((1 + total) / (1 + self._doc_freq.get(term, 0))) + 1.0)
+            norm += weight * weight
+            if term in query_vector:
+                dot += weight * query_vector[term]
+        if not dot:
+            return 0.0
+        return dot / (query_norm * math.sqrt(norm))
+
+    def _load(self) -> List[Dict[str, Any]]:
+        if not self.path or not os.path.exists(self.path):
+            return []
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not load query example library {self.path}: {e}")
+            return []
+
+    def _save(self) -> None:
+        """Write the library atomically; callers hold the lock."""
+        if not self.path:
+            return
+        try:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(self._records, f, default=str)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not save query example library {self.path}: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get library size and lookup counters."""
+        with self._lock:
+            return {
+                **self._stats,
+                "records": len(self._records),
+                "successful_records": sum(1 for record in self._records if record["success"]),
+                "path": self.path,
+            }
@@ -0,0 +1,217 @@
+# release_agent/query_planner.py
+
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+from .sandbox_lib import kg_access
+
+logger = logging.getLogger(__name__)
+
+# Cost model coefficients in seconds; the planner calibrates them at runtime
+DEFAULT_COST_MODEL = {
+    # Copy of a cached sandbox result
+    "result_cache": {"fixed": 0.001},
+    # Open the column store views, then NumPy over the rows of one node type
+    "native": {"fixed": 0.003, "per_row": 2e-7},
+    # Sandbox process start and imports, then Python over the KG's nodes
+    "sandbox": {"fixed": 0.5, "per_node": 4e-6},
+}
+
+# Rough size of one node in a node-link KG file, used without a column store
+_BYTES_PER_NODE = 300
+
+
+class QueryPlanner:
+    """
+    Cost-based choice of how to answer a query.
+
+    Candidate plans are the sandbox result cache (when the code's result is
+    cached), the native engine (when the analysis carries a query IR) and a
+    sandbox run of the code. Costs are estimated in seconds from catalog
+    statistics of the target months - node counts per node type from the
+    column store manifests, or file sizes when a month has no store yet -
+    and scaled by a per-engine calibration factor.
+
+    After execution, record() compares the actual cost with the estimate and
+    moves the calibration factor towards the observed ratio (an exponentially
+    weighted moving average), so estimates track the deployment.
+    """
+
+    def __init__(
+        self,
+        cost_model: Optional[Dict[str, Dict[str, float]]] = None,
+        smoothing: float = 0.2,
+    ):
+        """
+        Args:
+            cost_model: Coefficients per engine (see DEFAULT_COST_MODEL)
+            smoothing: Weight of the newest observation in calibration
+        """
+        self.cost_model = cost_model or DEFAULT_COST_MODEL
+        self.smoothing = smoothing
+        self._calibration = {engine: 1.0 for engine in self.cost_model}
+        self._catalog: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "plans": 0,
+            "chosen": {engine: 0 for engine in self.cost_model},
+            "recorded": 0,
+        }
+
+    def file_stats(self, file_path: str) -> Dict[str, Any]:
+        """
+        Catalog statistics for one monthly KG file.
+
+        Returns:
+            Dict with bytes, nodes, rows per node type (empty if unknown)
+            and whether a current column store exists
+        """
+        try:
+            signature = kg_access.source_signature(file_path)
+        except OSError:
+            return {"bytes": 0, "nodes": 0, "rows": {}, "store": False}
+
+        version = (signature["size"], signature["mtime_ns"])
+        with self._lock:
+            cached = self._catalog.get(file_path)
+        if cached and cached[0] == version:
+            return cached[1]
+
+        stats = {
+            "bytes": signature["size"],
+            "nodes": signature["size"] // _BYTES_PER_NODE,
+            "rows": {},
+            "store": False,
+        }
+        manifest = kg_access.read_manifest(kg_access.store_dir_for(file_path))
+        if manifest and manifest.get("source") == signature:
+            stats["store"] = True
+            stats["nodes"] = manifest.get("node_count", stats["nodes"])
+            stats["rows"] = {
+                name[:-len(".row")]: info.get("length", 0)
+                for name, info in manifest.get("tables", {}).items()
+                if name.endswith(".row") and not name.startswith("key.")
+            }
+            # Only cache manifest-backed stats; estimates improve once built
+            with self._lock:
+                self._catalog[file_path] = (version, stats)
+        return stats
+
+    def catalog_stats(
+        self, target_files: List[str], node_type: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Aggregate catalog statistics over the target months."""
+        files = [self.file_stats(file_path) for file_path in target_files]
+        nodes = sum(stats["nodes"] for stats in files)
+        rows = None
+        if node_type:
+            # Without a store the node type's share is unknown; assume all nodes
+            rows = sum(
+                stats["rows"].get(node_type, 0) if stats["store"] else stats["nodes"]
+                for stats in files
+            )
+        return {
+            "files": len(files),
+            "bytes": sum(stats["bytes"] for stats in files),
+            "nodes": nodes,
+            "rows": rows,
+            "stores_current": sum(1 for stats in files if stats["store"]),
+        }
+
+    def estimate(self, engine: str, catalog: Dict[str, Any]) -> float:
+        """Calibrated cost estimate in seconds for running a query on an engine."""
+        model = self.cost_model[engine]
+        cost = model.get("fixed", 0.0)
+        cost += model.get("per_node", 0.0) * catalog["nodes"]
+        cost += model.get("per_row", 0.0) * (
+            catalog["rows"] if catalog["rows"] is not None else catalog["nodes"]
+        )
+        with self._lock:
+            return cost * self._calibration[engine]
+
+    def plan(
+        self,
+        target_files: List[str],
+        query_ir: Optional[Dict[str, Any]] = None,
+        has_code: bool = False,
+        result_cached: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Choose the cheapest engine that can answer the query.
+
+        Args:
+            target_files: Monthly KG files the query reads
+            query_ir: Query IR, which makes the native engine eligible
+            has_code: Whether executable code is available for the sandbox
+            result_cached: Whether the sandbox result for the code is cached
+
+        Returns:
+            Plan dict with engine, estimated_cost, candidates (engine ->
+            estimate) and the catalog statistics used
+
+        Raises:
+            ValueError: If no engine can answer the query
+        """
+        catalog = self.catalog_stats(
+            target_files, query_ir.get("node_type") if query_ir else None
+        )
+
+        eligible = []
+        if has_code and result_cached:
+            eligible.append("result_cache")
+        if query_ir:
+            eligible.append("native")
+        if has_code:
+            eligible.append("sandbox")
+        if not eligible:
+            raise ValueError("No execution engine can answer this query")
+
+        candidates = {engine: round(self.estimate(engine, catalog), 6) for engine in eligible}
+        engine = min(eligible, key=lambda name: candidates[name])
+        with self._lock:
+            self._stats["plans"] += 1
+            self._stats["chosen"][engine] += 1
+
+        logger.info(
+            f"Query plan: {engine} (estimated {candidates[engine]:.4f}s; "
+            f"candidates {candidates})"
+        )
+        return {
+            "engine": engine,
+            "estimated_cost": candidates[engine],
+            "candidates": candidates,
+            "catalog": catalog,
+        }
+
+    def record(self, plan: Dict[str, Any], actual_cost: float, success: bool = True) -> None:
+        """
+        Record the actual cost of an executed plan and recalibrate its engine.
+
+        Failed executions are recorded in the plan but not used for
+        calibration, since timeouts and errors say nothing about cost.
+        """
+        plan["actual_cost"] = round(actual_cost, 6)
+        estimated = plan.get("estimated_cost") or 0.0
+        if not success or estimated <= 0 or actual_cost <= 0:
+            return
+
+        engine = plan["engine"]
+        with self._lock:
+            # The estimate already includes the factor; divide it back out
+            factor = self._calibration[engine]
+            observed = factor * actual_cost / estimated
+            factor = (1 - self.smoothing) * factor + self.smoothing * observed
+            self._calibration[engine] = min(max(factor, 0.01), 100.0)
+            self._stats["recorded"] += 1
+        plan["estimate_ratio"] = round(actual_cost / estimated, 3)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get plan counters and the current calibration factors."""
+        with self._lock:
+            return {
+                **self._stats,
+                "chosen": dict(self._stats["chosen"]),
+                "calibration": {engine: round(factor, 4) for engine, factor in self._calibration.items()},
+                "catalog_files": len(self._catalog),
+            }
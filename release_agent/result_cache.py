@@ -0,0 +1,98 @@
+# release_agent/result_cache.py
+
+import ast
+import copy
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from .ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutionResultCache:
+    """
+    Caches successful sandbox results for generated code.
+
+    Entries are keyed by a hash of the normalized code (its AST, so comments
+    and formatting don't matter) plus the (path, mtime, size) of every KG file
+    the code references, so a rebuilt monthly file invalidates the entry.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 300.0):
+        self._cache = TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+
+    def make_key(self, code: str, base_directory: str) -> Optional[str]:
+        """
+        Build the cache key for a piece of code.
+
+        Args:
+            code: Python code to execute
+            base_directory: Directory relative file paths are resolved against
+
+        Returns:
+            The key, or None if the code can't be cached (unparseable, no KG
+            file references, or a referenced file is missing)
+        """
+        try:
+            tree = ast.parse(code)
+        except SyntaxError:
+            return None
+
+        file_versions = self._referenced_file_versions(tree, base_directory)
+        if not file_versions:
+            return None
+
+        digest = hashlib.sha256()
+        digest.update(ast.dump(tree).encode())
+        digest.update(json.dumps(file_versions).encode())
+        return digest.hexdigest()
+
+    def _referenced_file_versions(
+        self, tree: ast.AST, base_directory: str
+    ) -> Optional[List[Tuple[str, int, int]]]:
+        """Return (path, mtime_ns, size) for every KG file literal in the code."""
+        paths = set()
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Constant) and isinstance(node.value, str):
+                if node.value.endswith(".json"):
+                    paths.add(os.path.abspath(os.path.join(base_directory, node.value)))
+
+        versions = []
+        for path in sorted(paths):
+            try:
+                stats = os.stat(path)
+            except OSError:
+                return None
+            versions.append((path, stats.st_mtime_ns, stats.st_size))
+        return versions
+
+    def get(self, key: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Return a copy of a cached execution result."""
+        if key is None:
+            return None
+        result = self._cache.get(key)
+        return copy.deepcopy(result) if result is not None else None
+
+    def contains(self, key: Optional[str]) -> bool:
+        """Check whether a result is cached, without counting a lookup."""
+        return key is not None and key in self._cache
+
+    def set(self, key: Optional[str], result: Dict[str, Any]) -> None:
+        """Cache an execution result if it succeeded."""
+        if key is None or not result.get("success"):
+            return
+        if "error" in (result.get("result") or {}):
+            return
+        self._cache.set(key, copy.deepcopy(result))
+
+    def clear(self) -> None:
+        """Drop all cached results."""
+        self._cache.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics."""
+        return self._cache.get_stats()
@@ -1,11 +1,15 @@
 # release_agent/result_formatter.py
 
 import logging
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# Shapes of the 'data' rows in API responses
+RECORDS = 'records'    # One object per row
+COLUMNAR = 'columnar'  # One array per field
+
 
 class ResultFormatter:
     """Formats execution results and generates insights for frontend consumption."""
@@ -39,6 +43,10 @@ class ResultFormatter:
             }
         }
         
+        # Large streamed results: 'data' is the first page, the rest is stored
+        if execution_result.get('pagination'):
+            formatted['pagination'] = execution_result['pagination']
+        
         return formatted
     
     def generate_insights(self, formatted_data: Dict[str, Any], original_query: str) -> List[str]:
@@ -59,7 +67,8 @@ class ResultFormatter:
         
         data = formatted_data.get('data', [])
         if isinstance(data, list) and len(data) > 0:
-            insights.append(f"Found {len(data)} data points matching your query")
+            row_count = formatted_data.get('pagination', {}).get('row_count', len(data))
+            insights.append(f"Found {row_count} data points matching your query")
             
             # Add insights based on node types
             node_types = formatted_data.get('schema_info', {}).get('node_types_used', [])
@@ -140,4 +149,44 @@ class ResultFormatter:
         if stores:
             insights.append(f"Data covers {len(stores)} unique stores")
         
-        return insights
\ No newline at end of file
+        return insights
+    
+    @staticmethod
+    def rows_to_columns(rows: Any) -> Optional[Dict[str, Any]]:
+        """
+        Reshape a list of row dicts into one array per field.
+        
+        Large results repeat every key name (and values such as label and
+        color) once per row; columnar rows name each field once. Fields are
+        ordered by first appearance and rows lacking a field get None.
+        
+        Args:
+            rows: Result rows
+            
+        Returns:
+            {'fields': [...], 'columns': {field: [values]}, 'row_count': n},
+            or None if rows is not a list of dicts
+        """
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            return None
+        
+        fields = list(dict.fromkeys(key for row in rows for key in row))
+        columns = {field: [row.get(field) for row in rows] for field in fields}
+        return {'fields': fields, 'columns': columns, 'row_count': len(rows)}
+    
+    def to_columnar(self, formatted_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Formatted results with their rows in columnar shape.
+        
+        Args:
+            formatted_data: Formatted results from format_results
+            
+        Returns:
+            Copy of formatted_data with 'data' reshaped by rows_to_columns
+            and 'data_format' set to 'columnar'; formatted_data itself if
+            its rows cannot be reshaped
+        """
+        columns = self.rows_to_columns(formatted_data.get('data'))
+        if columns is None:
+            return formatted_data
+        return {**formatted_data, 'data': columns, 'data_format': COLUMNAR}
@@ -0,0 +1,501 @@
+# release_agent/result_store.py
+
+import base64
+import binascii
+import csv
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from . import serialization
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Optional; only needed for Parquet export
+    pa = pq = None
+
+# Rows per page when the client doesn't ask for a size
+DEFAULT_PAGE_ROWS = 1000
+
+# Upper bound on rows per page
+MAX_PAGE_ROWS = 10000
+
+# Rows per chunk (CSV write / Parquet row group) in exports
+EXPORT_CHUNK_ROWS = 5000
+
+EXPORT_FORMATS = ("csv", "parquet")
+
+
+class ResultNotFoundError(Exception):
+    """Raised for unknown or expired result IDs (HTTP 404)."""
+
+    status_code = 404
+
+
+class InvalidCursorError(Exception):
+    """Raised for malformed cursors or cursors of another result (HTTP 400)."""
+
+    status_code = 400
+
+
+class ExportUnavailableError(Exception):
+    """Raised when an export format's optional dependency is missing (HTTP 501)."""
+
+    status_code = 501
+
+
+def _value_type(value: Any) -> str:
+    """Column type name of a value, used to choose the Parquet schema."""
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, int):
+        return "int"
+    if isinstance(value, float):
+        return "float"
+    if isinstance(value, (dict, list)):
+        return "json"
+    return "str"
+
+
+class _RowWriter:
+    """Appends rows to a spool file as JSON Lines, tracking fields and types."""
+
+    def __init__(self, path: str, meta: Dict[str, Any]):
+        self.meta = meta
+        self._file = open(path, "ab")
+
+    def write(self, row: Dict[str, Any]) -> None:
+        self._file.write(serialization.dumps(row) + b"\n")
+        self.track(row)
+
+    def track(self, row: Dict[str, Any]) -> None:
+        types = self.meta["types"]
+        for key, value in row.items():
+            if key not in types:
+                self.meta["fields"].append(key)
+                types[key] = []
+            value_type = _value_type(value)
+            if value_type not in types[key]:
+                types[key].append(value_type)
+        self.meta["row_count"] += 1
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class _ChunkSink(io.RawIOBase):
+    """
+    Write-only file collecting bytes until they are taken.
+
+    Keeps counting positions across take() calls, which the Parquet writer
+    needs for the offsets in the file footer.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._pending: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: Any) -> int:
+        data = bytes(data)
+        self._pending.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def take(self) -> bytes:
+        data = b"".join(self._pending)
+        self._pending = []
+        return data
+
+
+class ResultStore:
+    """
+    Keeps large query results on disk for cursor pagination and export.
+
+    Each result is a JSON Lines file (one row per line) plus a small JSON
+    metadata file with the row count and the fields and value types seen.
+    Pages are read by seeking to the byte offset carried in the cursor, and
+    exports stream the file in chunks, so neither reads a whole result into
+    memory. Results live on disk rather than in this process, so any worker
+    on the host can serve the pages of a result another worker stored.
+    Results expire ``ttl_seconds`` after they were stored.
+    """
+
+    def __init__(self, directory: Optional[str] = None, ttl_seconds: float = 3600.0):
+        """
+        Args:
+            directory: Where result files are kept; defaults to
+                $KG_RESULT_DIR or a kg_results directory in the temp dir
+            ttl_seconds: Lifetime of stored results
+        """
+        self.directory = directory or os.environ.get("KG_RESULT_DIR") or os.path.join(
+            tempfile.gettempdir(), "kg_results"
+        )
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+        self._stats = {"stored": 0, "rows_stored": 0, "pages_served": 0, "exports": 0, "expired": 0}
+
+    def _paths(self, result_id: str) -> tuple:
+        if not result_id or not result_id.isalnum():
+            raise ResultNotFoundError(f"Unknown or expired result: {result_id}")
+        base = os.path.join(self.directory, result_id)
+        return f"{base}.jsonl", f"{base}.json"
+
+    def _new_meta(self) -> Dict[str, Any]:
+        return {
+            "result_id": uuid.uuid4().hex,
+            "row_count": 0,
+            "fields": [],
+            "types": {},
+            "created_at": time.time(),
+        }
+
+    def _finish(self, meta: Dict[str, Any]) -> str:
+        rows_path, meta_path = self._paths(meta["result_id"])
+        meta["bytes"] = os.path.getsize(rows_path)
+        with open(meta_path, "w") as f:
+            json.dump(meta, f)
+        with self._lock:
+            self._stats["stored"] += 1
+            self._stats["rows_stored"] += meta["row_count"]
+        self._purge_expired()
+        return meta["result_id"]
+
+    def save(self, rows: Iterable[Dict[str, Any]]) -> str:
+        """
+        Store rows, consuming them one at a time.
+
+        Returns:
+            ID of the stored result
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        meta = self._new_meta()
+        writer = _RowWriter(self._paths(meta["result_id"])[0], meta)
+        try:
+            for row in rows:
+                writer.write(row)
+        finally:
+            writer.close()
+        return self._finish(meta)
+
+    def adopt(self, spool_path: str, extra_rows: Optional[Iterable[Dict[str, Any]]] = None) -> str:
+        """
+        Take over a JSON Lines file of rows written elsewhere (a sandbox spool).
+
+        The file is moved into the store and scanned line by line for the
+        row count, fields and types.
+
+        Args:
+            spool_path: File with one JSON row per line
+            extra_rows: Rows appended after the spooled ones
+
+        Returns:
+            ID of the stored result
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        meta = self._new_meta()
+        rows_path = self._paths(meta["result_id"])[0]
+        shutil.move(spool_path, rows_path)
+
+        writer = _RowWriter(rows_path, meta)
+        try:
+            with open(rows_path, "rb") as f:
+                for line in f:
+                    if line.strip():
+                        writer.track(serialization.loads(line))
+            for row in extra_rows or ():
+                writer.write(row)
+        finally:
+            writer.close()
+        return self._finish(meta)
+
+    def info(self, result_id: str) -> Dict[str, Any]:
+        """
+        Metadata of a stored result.
+
+        Raises:
+            ResultNotFoundError: If the result is unknown or has expired
+        """
+        meta_path = self._paths(result_id)[1]
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            raise ResultNotFoundError(f"Unknown or expired result: {result_id}")
+        if time.time() - meta["created_at"] > self.ttl_seconds:
+            self.delete(result_id)
+            raise ResultNotFoundError(f"Unknown or expired result: {result_id}")
+        return meta
+
+    def delete(self, result_id: str) -> bool:
+        """Remove a stored result; returns whether it existed."""
+        existed = False
+        for path in self._paths(result_id):
+            try:
+                os.remove(path)
+                existed = True
+            except OSError:
+                pass
+        return existed
+
+    @staticmethod
+    def encode_cursor(result_id: str, row: int, offset: int) -> str:
+        """Opaque cursor for the row starting at a byte offset of a result."""
+        return base64.urlsafe_b64encode(f"{result_id}:{row}:{offset}".encode()).decode().rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> tuple:
+        """
+        Split a cursor into (result_id, row, byte offset).
+
+        Raises:
+            InvalidCursorError: If the cursor was not produced by encode_cursor
+        """
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            result_id, row, offset = base64.urlsafe_b64decode(padded).decode().split(":")
+            return result_id, int(row), int(offset)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise InvalidCursorError(f"Invalid cursor: {cursor}")
+
+    def page(
+        self, result_id: str, cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_ROWS
+    ) -> Dict[str, Any]:
+        """
+        Read one page of a stored result.
+
+        Args:
+            result_id: ID returned by save or adopt
+            cursor: next_cursor of the previous page; None for the first page
+            limit: Rows per page (at most MAX_PAGE_ROWS)
+
+        Returns:
+            Dict with rows, offset (index of the first row), row_count and
+            next_cursor (None on the last page)
+
+        Raises:
+            ResultNotFoundError: If the result is unknown or has expired
+            InvalidCursorError: If the cursor is malformed or belongs to
+                another result
+        """
+        meta = self.info(result_id)
+        row, offset = 0, 0
+        if cursor:
+            cursor_result_id, row, offset = self.decode_cursor(cursor)
+            if cursor_result_id != result_id or not 0 <= offset <= meta["bytes"]:
+                raise InvalidCursorError(f"Cursor does not belong to result {result_id}")
+        limit = max(1, min(limit, MAX_PAGE_ROWS))
+
+        rows = []
+        with open(self._paths(result_id)[0], "rb") as f:
+            f.seek(offset)
+            while len(rows) < limit:
+                line = f.readline()
+                if not line:
+                    break
+                if line.strip():
+                    rows.append(serialization.loads(line))
+            next_offset = f.tell()
+
+        with self._lock:
+            self._stats["pages_served"] += 1
+        next_row = row + len(rows)
+        return {
+            "rows": rows,
+            "offset": row,
+            "row_count": meta["row_count"],
+            "next_cursor": (
+                self.encode_cursor(result_id, next_row, next_offset)
+                if next_row < meta["row_count"]
+                else None
+            ),
+        }
+
+    def iter_chunks(self, result_id: str, chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[List[Dict[str, Any]]]:
+        """Yield the rows of a stored result in chunks."""
+        chunk = []
+        with open(self._paths(result_id)[0], "rb") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                chunk.append(serialization.loads(line))
+                if len(chunk) >= chunk_rows:
+                    yield chunk
+                    chunk = []
+        if chunk:
+            yield chunk
+
+    def paginate(self, formatted_data: Dict[str, Any], page_size: int) -> Dict[str, Any]:
+        """
+        Limit formatted results to their first page, storing the rest.
+
+        Results already stored (by a sandbox that streamed its rows) are
+        re-paged at page_size. In-memory rows longer than a page are stored.
+
+        Args:
+            formatted_data: Formatted results with 'data' rows and, for
+                stored results, 'pagination'
+            page_size: Rows in the first page
+
+        Returns:
+            Copy of formatted_data whose 'data' is the first page and whose
+            'pagination' has result_id, row_count, page_size and next_cursor;
+            formatted_data itself if all rows fit in one page
+        """
+        result_id = (formatted_data.get("pagination") or {}).get("result_id")
+        if result_id is None:
+            rows = formatted_data.get("data")
+            if not isinstance(rows, list) or len(rows) <= page_size:
+                return formatted_data
+            if not all(isinstance(row, dict) for row in rows):
+                return formatted_data
+            result_id = self.save(rows)
+
+        page = self.page(result_id, limit=page_size)
+        return {
+            **formatted_data,
+            "data": page["rows"],
+            "pagination": {
+                "result_id": result_id,
+                "row_count": page["row_count"],
+                "page_size": page_size,
+                "next_cursor": page["next_cursor"],
+            },
+        }
+
+    def export_csv(self, result_id: str) -> Iterator[bytes]:
+        """
+        Stream a stored result as CSV, one chunk of rows at a time.
+
+        Columns are the result's fields in order of first appearance;
+        nested values are written as JSON and missing values as empty cells.
+
+        Raises:
+            ResultNotFoundError: If the result is unknown or has expired
+        """
+        fields = self.info(result_id)["fields"]
+        with self._lock:
+            self._stats["exports"] += 1
+
+        def cell(value: Any) -> Any:
+            return serialization.dumps(value).decode() if isinstance(value, (dict, list)) else value
+
+        def generate() -> Iterator[bytes]:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(fields)
+            for chunk in self.iter_chunks(result_id):
+                for row in chunk:
+                    writer.writerow([cell(row.get(field)) for field in fields])
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+            if buffer.tell():
+                yield buffer.getvalue().encode()
+
+        return generate()
+
+    def export_parquet(self, result_id: str) -> Iterator[bytes]:
+        """
+        Stream a stored result as Parquet, one row group per chunk of rows.
+
+        The schema comes from the value types recorded when the result was
+        stored: integer columns stay int64 unless floats also occur, boolean
+        columns stay bool, and anything else (mixed, nested) is written as
+        strings.
+
+        Raises:
+            ResultNotFoundError: If the result is unknown or has expired
+            ExportUnavailableError: If pyarrow is not installed
+        """
+        if pa is None:
+            raise ExportUnavailableError("Parquet export requires pyarrow")
+        meta = self.info(result_id)
+        with self._lock:
+            self._stats["exports"] += 1
+
+        schema_fields = []
+        converters = {}
+        for field in meta["fields"]:
+            types = set(meta["types"].get(field, [])) - {"null"}
+            if types == {"bool"}:
+                arrow_type, convert = pa.bool_(), None
+            elif types == {"int"}:
+                arrow_type, convert = pa.int64(), None
+            elif types and types <= {"int", "float"}:
+                arrow_type, convert = pa.float64(), float
+            else:
+                arrow_type = pa.string()
+                convert = lambda value: (
+                    value if isinstance(value, str) else serialization.dumps(value).decode()
+                )
+            schema_fields.append(pa.field(field, arrow_type))
+            converters[field] = convert
+        schema = pa.schema(schema_fields)
+
+        def generate() -> Iterator[bytes]:
+            sink = _ChunkSink()
+            with pq.ParquetWriter(sink, schema) as writer:
+                for chunk in self.iter_chunks(result_id):
+                    columns = {}
+                    for field, convert in converters.items():
+                        values = [row.get(field) for row in chunk]
+                        if convert is not None:
+                            values = [None if value is None else convert(value) for value in values]
+                        columns[field] = values
+                    writer.write_table(pa.table(columns, schema=schema))
+                    yield sink.take()
+            # Closing the writer adds the footer
+            yield sink.take()
+
+        return generate()
+
+    def _purge_expired(self) -> None:
+        """Delete expired results; runs at most once a minute."""
+        now = time.time()
+        with self._lock:
+            if now - self._last_purge < 60:
+                return
+            self._last_purge = now
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                if now - os.path.getmtime(path) > self.ttl_seconds:
+                    os.remove(path)
+                    if name.endswith(".json"):
+                        with self._lock:
+                            self._stats["expired"] += 1
+            except OSError:
+                pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get counters of stored results, served pages and exports."""
+        with self._lock:
+            return {**self._stats, "ttl_seconds": self.ttl_seconds}
+
+
+# Process-wide store shared by the executor (sandbox spools) and the API
+result_store = ResultStore()
@@ -0,0 +1,11 @@
+"""Helper modules preloaded into the code execution sandbox.
+
+Modules in this package are imported by the sandbox wrapper script as
+top-level modules (the directory itself is put on ``sys.path``), so they must
+only depend on the standard library and the libraries allowed in generated
+code. They must never import from ``release_agent``.
+"""
+
+import os
+
+SANDBOX_LIB_DIR = os.path.dirname(os.path.abspath(__file__))
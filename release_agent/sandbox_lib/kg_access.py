@@ -0,0 +1,766 @@
+# release_agent/sandbox_lib/kg_access.py
+"""
+Columnar, memory-mapped access to monthly KG files.
+
+The API host converts every monthly ``YYYYMM.json`` file into a set of NumPy
+column tables stored next to it (``<kg_path>/.kg_store/YYYYMM/``). Sandboxes
+attach to those tables read-only with ``np.load(mmap_mode='r')``, so every
+concurrent sandbox shares the same page-cache pages instead of holding its own
+parsed copy of the graph.
+
+Stores also carry precomputed indexes (sorted node IDs, CSR adjacency and the
+business keys encoded in node IDs) so the helpers below answer lookups,
+hierarchy walks and state/SBU/department filters without scanning every node.
+
+This module is imported by the host (to build stores) and by the sandbox
+wrapper (to attach to them), so it only depends on the standard library and
+numpy.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+STORE_DIRNAME = ".kg_store"
+MANIFEST_NAME = "manifest.json"
+FORMAT_VERSION = 3
+
+# Attributes kept in the node tables rather than as attribute columns; label
+# and color are columns because the frontend renders them
+SKIPPED_ATTRIBUTES = {"id", "node_type"}
+
+# Business keys encoded in node IDs (see KGSchemaManager node_id_patterns)
+ID_KEY_FIELDS = ("date", "sbu", "dept", "store")
+
+# Friendly filter names mapped to node attributes
+FILTER_ATTRIBUTES = {"state": "st_cd"}
+
+# Views opened in this process, keyed by absolute source path
+_OPEN_VIEWS: Dict[str, "KGView"] = {}
+
+# Views opened (attached or parsed) in this process and the time it took
+LOAD_STATS: Dict[str, Any] = {"views_opened": 0, "seconds": 0.0}
+
+# Environment variable naming the file emit_rows streams rows to; set by the
+# sandbox wrapper when the executor collects streamed rows
+RESULT_SPOOL_ENV = "KG_RESULT_SPOOL"
+
+
+def store_dir_for(file_path: str) -> str:
+    """Return the column store directory for a monthly KG file."""
+    base_dir = os.path.dirname(file_path)
+    month = os.path.splitext(os.path.basename(file_path))[0]
+    return os.path.join(base_dir, STORE_DIRNAME, month)
+
+
+def source_signature(file_path: str) -> Dict[str, int]:
+    """Return the (size, mtime) signature used to detect stale stores."""
+    stats = os.stat(file_path)
+    return {"size": stats.st_size, "mtime_ns": stats.st_mtime_ns}
+
+
+def read_manifest(store_dir: str) -> Optional[Dict[str, Any]]:
+    """Read a store manifest, returning None if it is missing or unreadable."""
+    try:
+        with open(os.path.join(store_dir, MANIFEST_NAME), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_store_current(file_path: str) -> bool:
+    """Check whether the column store for a KG file exists and is up to date."""
+    manifest = read_manifest(store_dir_for(file_path))
+    if not manifest or manifest.get("format_version") != FORMAT_VERSION:
+        return False
+    try:
+        return manifest.get("source") == source_signature(file_path)
+    except OSError:
+        # Source file is gone; the store is all that is left
+        return True
+
+
+def _column_array(values: List[Any]) -> np.ndarray:
+    """Convert a list of attribute values into a typed NumPy column."""
+    present = [v for v in values if v is not None]
+    if present and all(isinstance(v, (bool, int, float)) for v in present):
+        if len(present) == len(values) and all(
+            isinstance(v, (bool, int)) for v in present
+        ):
+            return np.array(values, dtype=np.int64)
+        return np.array(
+            [np.nan if v is None else float(v) for v in values], dtype=np.float64
+        )
+    return np.array(["" if v is None else str(v) for v in values], dtype=str)
+
+
+def parse_node_id(node_type: str, node_id: str) -> Dict[str, str]:
+    """
+    Extract the business keys encoded in a node ID.
+
+    Examples:
+        store "20220101-FOOD-Bakery-1001" -> date, sbu, dept, store
+        weather "20220101-1001-Weather" -> date, store
+    """
+    parts = node_id.split("-")
+    if node_type in ("month", "day"):
+        return {"date": node_id}
+    if node_type == "sbu" and len(parts) >= 2:
+        return {"date": parts[0], "sbu": parts[1]}
+    if node_type == "dept" and len(parts) >= 4:
+        return {"date": parts[0], "sbu": parts[1], "dept": "-".join(parts[2:-1])}
+    if node_type == "sbu_store" and len(parts) >= 3:
+        return {"date": parts[0], "sbu": parts[1], "store": parts[-1]}
+    if node_type == "day_store" and len(parts) >= 2:
+        return {"date": parts[0], "store": parts[-1]}
+    if node_type == "store" and len(parts) >= 4:
+        return {
+            "date": parts[0],
+            "sbu": parts[1],
+            "dept": "-".join(parts[2:-1]),
+            "store": parts[-1],
+        }
+    if node_type == "weather" and len(parts) >= 3:
+        return {"date": parts[0], "store": "-".join(parts[1:-1])}
+    return {"date": parts[0]} if parts and parts[0].isdigit() else {}
+
+
+def _csr(keys: np.ndarray, values: np.ndarray, size: int) -> tuple:
+    """Build a CSR (pointer, values) index of values grouped by key."""
+    order = np.argsort(keys, kind="stable")
+    pointers = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=size), out=pointers[1:])
+    return pointers, values[order].astype(np.int64)
+
+
+def build_tables(kg_data: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    """
+    Convert node-link KG data into named column tables.
+
+    Tables:
+        nodes.id / nodes.type: one row per node, in file order
+        edges.src / edges.dst: node row indices for every link
+        <node_type>.row: node rows belonging to a node type
+        <node_type>.<attribute>: attribute column for a node type
+        key.<node_type>.<field>: business keys parsed from node IDs
+        index.*: sorted ID index and CSR adjacency (out/in edges)
+    """
+    nodes = kg_data.get("nodes", [])
+    links = kg_data.get("links", kg_data.get("edges", []))
+
+    node_ids = [str(node.get("id")) for node in nodes]
+    node_types = [str(node.get("node_type", "")) for node in nodes]
+    row_of = {node_id: row for row, node_id in enumerate(node_ids)}
+
+    tables = {
+        "nodes.id": np.array(node_ids, dtype=str),
+        "nodes.type": np.array(node_types, dtype=str),
+        "edges.src": np.array(
+            [row_of.get(str(link.get("source")), -1) for link in links], dtype=np.int64
+        ),
+        "edges.dst": np.array(
+            [row_of.get(str(link.get("target")), -1) for link in links], dtype=np.int64
+        ),
+    }
+
+    rows_by_type: Dict[str, List[int]] = {}
+    positions = np.zeros(len(nodes), dtype=np.int64)
+    for row, node_type in enumerate(node_types):
+        type_rows = rows_by_type.setdefault(node_type, [])
+        positions[row] = len(type_rows)
+        type_rows.append(row)
+    tables["nodes.position"] = positions
+
+    # Sorted ID index for binary-search lookups
+    order = np.argsort(tables["nodes.id"], kind="stable")
+    tables["index.sorted_id"] = tables["nodes.id"][order]
+    tables["index.sorted_row"] = order.astype(np.int64)
+
+    # CSR adjacency for children/parent walks
+    src, dst = tables["edges.src"], tables["edges.dst"]
+    valid = (src >= 0) & (dst >= 0)
+    tables["index.out_ptr"], tables["index.out_row"] = _csr(src[valid], dst[valid], len(nodes))
+    tables["index.in_ptr"], tables["index.in_row"] = _csr(dst[valid], src[valid], len(nodes))
+
+    for node_type, rows in rows_by_type.items():
+        tables[f"{node_type}.row"] = np.array(rows, dtype=np.int64)
+
+        parsed = [parse_node_id(node_type, node_ids[row]) for row in rows]
+        for field in ID_KEY_FIELDS:
+            if any(field in keys for keys in parsed):
+                tables[f"key.{node_type}.{field}"] = np.array(
+                    [keys.get(field, "") for keys in parsed], dtype=str
+                )
+
+        columns = sorted(
+            {key for row in rows for key in nodes[row] if key not in SKIPPED_ATTRIBUTES}
+        )
+        for column in columns:
+            tables[f"{node_type}.{column}"] = _column_array(
+                [nodes[row].get(column) for row in rows]
+            )
+
+    return tables
+
+
+def write_store(file_path: str, kg_data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Build the column store for a KG file and swap it into place atomically.
+
+    Args:
+        file_path: Path to the monthly KG JSON file
+        kg_data: Already parsed KG data (parsed from file_path if omitted)
+
+    Returns:
+        The manifest of the written store
+    """
+    signature = source_signature(file_path)
+    if kg_data is None:
+        with open(file_path, "r") as f:
+            kg_data = json.load(f)
+
+    tables = build_tables(kg_data)
+    store_dir = store_dir_for(file_path)
+    parent_dir = os.path.dirname(store_dir)
+    os.makedirs(parent_dir, exist_ok=True)
+
+    tmp_dir = tempfile.mkdtemp(prefix=f".{os.path.basename(store_dir)}-", dir=parent_dir)
+    try:
+        manifest_tables = {}
+        for index, name in enumerate(sorted(tables)):
+            array = tables[name]
+            file_name = f"{index:04d}.npy"
+            np.save(os.path.join(tmp_dir, file_name), array, allow_pickle=False)
+            manifest_tables[name] = {
+                "file": file_name,
+                "dtype": array.dtype.str,
+                "length": int(len(array)),
+            }
+
+        manifest = {
+            "format_version": FORMAT_VERSION,
+            "source": signature,
+            "node_count": int(len(tables["nodes.id"])),
+            "edge_count": int(len(tables["edges.src"])),
+            "tables": manifest_tables,
+        }
+        with open(os.path.join(tmp_dir, MANIFEST_NAME), "w") as f:
+            json.dump(manifest, f)
+
+        # Swap the new store in; readers of the old one keep their mappings
+        old_dir = None
+        if os.path.exists(store_dir):
+            old_dir = f"{store_dir}.old-{os.getpid()}"
+            os.rename(store_dir, old_dir)
+        os.rename(tmp_dir, store_dir)
+        if old_dir:
+            shutil.rmtree(old_dir, ignore_errors=True)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    return manifest
+
+
+class KGView:
+    """Read-only columnar view of one monthly KG."""
+
+    def __init__(
+        self,
+        file_path: str,
+        tables: Dict[str, np.ndarray],
+        memory_mapped: bool,
+        source: Optional[Dict[str, int]] = None,
+    ):
+        self.file_path = file_path
+        self.memory_mapped = memory_mapped
+        self.source = source
+        self._tables = tables
+        self._store_state_map: Optional[Dict[str, str]] = None
+
+    @property
+    def node_types(self) -> List[str]:
+        """Node types present in this KG."""
+        return sorted(name[:-4] for name in self._tables if name.endswith(".row"))
+
+    def columns(self, node_type: str) -> List[str]:
+        """Attribute columns available for a node type."""
+        prefix = f"{node_type}."
+        return sorted(
+            name[len(prefix):]
+            for name in self._tables
+            if name.startswith(prefix) and name != f"{node_type}.row"
+        )
+
+    def column(self, node_type: str, name: str) -> np.ndarray:
+        """Return one attribute column of a node type (empty if absent)."""
+        array = self._tables.get(f"{node_type}.{name}")
+        if array is None:
+            return np.empty(0, dtype=np.float64)
+        return array
+
+    def keys(self, node_type: str, field: str) -> np.ndarray:
+        """Return a business key (date, sbu, dept, store) parsed from node IDs."""
+        array = self._tables.get(f"key.{node_type}.{field}")
+        if array is None:
+            return np.empty(0, dtype=str)
+        return array
+
+    def rows(self, node_type: str) -> np.ndarray:
+        """Return global node rows of a node type."""
+        return self._tables.get(f"{node_type}.row", np.empty(0, dtype=np.int64))
+
+    def node_ids(self, node_type: Optional[str] = None) -> np.ndarray:
+        """Return node IDs, optionally restricted to one node type."""
+        if node_type is None:
+            return self._tables["nodes.id"]
+        return self._tables["nodes.id"][self.rows(node_type)]
+
+    def count(self, node_type: str) -> int:
+        """Number of nodes of a node type."""
+        return int(len(self.rows(node_type)))
+
+    def edges(self) -> Iterator[tuple]:
+        """Iterate over (source_id, target_id) pairs."""
+        ids = self._tables["nodes.id"]
+        for src, dst in zip(self._tables["edges.src"], self._tables["edges.dst"]):
+            if src >= 0 and dst >= 0:
+                yield str(ids[src]), str(ids[dst])
+
+    def find(self, node_id: str) -> int:
+        """Return the global row of a node ID, or -1 if it is not present."""
+        sorted_ids = self._tables["index.sorted_id"]
+        index = int(np.searchsorted(sorted_ids, node_id))
+        if index < len(sorted_ids) and sorted_ids[index] == node_id:
+            return int(self._tables["index.sorted_row"][index])
+        return -1
+
+    def node(self, node_id: str) -> Optional[Dict[str, Any]]:
+        """Return a single node as a record, or None if it is not present."""
+        row = self.find(node_id)
+        if row < 0:
+            return None
+        return self._records_for_rows([row])[0]
+
+    def _neighbour_rows(self, node_id: str, direction: str) -> np.ndarray:
+        row = self.find(node_id)
+        if row < 0:
+            return np.empty(0, dtype=np.int64)
+        pointers = self._tables[f"index.{direction}_ptr"]
+        return self._tables[f"index.{direction}_row"][pointers[row]:pointers[row + 1]]
+
+    def children(self, node_id: str, node_type: Optional[str] = None) -> List[str]:
+        """Return IDs of the nodes directly below a node in the hierarchy."""
+        rows = self._neighbour_rows(node_id, "out")
+        if node_type is not None:
+            rows = rows[self._tables["nodes.type"][rows] == node_type]
+        return [str(node) for node in self._tables["nodes.id"][rows]]
+
+    def parents(self, node_id: str) -> List[str]:
+        """Return IDs of the nodes directly above a node in the hierarchy."""
+        rows = self._neighbour_rows(node_id, "in")
+        return [str(node) for node in self._tables["nodes.id"][rows]]
+
+    def parent(self, node_id: str) -> Optional[str]:
+        """Return the ID of the node directly above a node, if any."""
+        parents = self.parents(node_id)
+        return parents[0] if parents else None
+
+    def _store_states(self) -> Dict[str, str]:
+        """Map store IDs to state codes using any node type that has st_cd."""
+        mapping = self._store_state_map
+        if mapping is None:
+            mapping = {}
+            for node_type in ("day_store", "sbu_store", "store"):
+                stores = self.keys(node_type, "store")
+                states = self.column(node_type, "st_cd")
+                if len(stores) and len(states) == len(stores):
+                    unique_stores, first = np.unique(stores, return_index=True)
+                    for store, index in zip(unique_stores, first):
+                        mapping.setdefault(str(store), str(states[index]))
+            self._store_state_map = mapping
+        return mapping
+
+    def field(self, node_type: str, name: str) -> np.ndarray:
+        """
+        Return a column by friendly name.
+
+        Supports business keys (date, sbu, dept, store), "month" (YYYYMM),
+        "state" (st_cd, resolved through the store ID where the node type has
+        no st_cd property) and any node attribute.
+        """
+        if name in ID_KEY_FIELDS:
+            return self.keys(node_type, name)
+        if name == "month":
+            return self.keys(node_type, "date").astype("<U6")
+        if name == "state":
+            states = self.column(node_type, "st_cd")
+            if len(states) == self.count(node_type) and self.count(node_type):
+                return states
+            stores = self.keys(node_type, "store")
+            mapping = self._store_states()
+            return np.array([mapping.get(str(store), "") for store in stores], dtype=str)
+        return self.column(node_type, FILTER_ATTRIBUTES.get(name, name))
+
+    def select(
+        self,
+        node_type: str,
+        state: Any = None,
+        sbu: Any = None,
+        dept: Any = None,
+        store: Any = None,
+        date: Any = None,
+    ) -> np.ndarray:
+        """
+        Return positions of nodes of a type matching all given filters.
+
+        Each filter accepts a single value or a list of values. String
+        matches are case-insensitive; ``date`` matches by prefix, so
+        "202201" selects every day of January 2022.
+        """
+        mask = np.ones(self.count(node_type), dtype=bool)
+        for name, value in (("state", state), ("sbu", sbu), ("dept", dept), ("store", store)):
+            if value is None:
+                continue
+            column = self.field(node_type, name)
+            if len(column) != len(mask):
+                return np.empty(0, dtype=np.int64)
+            mask &= _match(column, value)
+        if date is not None:
+            dates = self.keys(node_type, "date")
+            if len(dates) != len(mask):
+                return np.empty(0, dtype=np.int64)
+            prefixes = [date] if isinstance(date, str) else list(date)
+            date_mask = np.zeros(len(mask), dtype=bool)
+            for prefix in prefixes:
+                date_mask |= np.char.startswith(dates, str(prefix))
+            mask &= date_mask
+        return np.nonzero(mask)[0]
+
+    def nodes_by_type(self, node_type: str, **filters: Any) -> List[Dict[str, Any]]:
+        """Return records of a node type, optionally filtered (see select)."""
+        if not filters:
+            return self.records(node_type)
+        return self.records(node_type, self.select(node_type, **filters))
+
+    def store_series(
+        self,
+        store_id: str,
+        metric: str = "total_gmv_amt",
+        node_type: str = "day_store",
+        sbu: Any = None,
+        dept: Any = None,
+    ) -> List[Dict[str, Any]]:
+        """Return the daily values of a metric for one store, sorted by date."""
+        positions = self.select(node_type, store=str(store_id), sbu=sbu, dept=dept)
+        dates = self.keys(node_type, "date")
+        values = self.column(node_type, metric)
+        if not len(values):
+            return []
+        series = [
+            {"date": str(dates[position]), "value": _to_python(values[position])}
+            for position in positions
+        ]
+        series.sort(key=lambda point: point["date"])
+        return series
+
+    def _records_for_rows(self, rows: List[int]) -> List[Dict[str, Any]]:
+        """Materialize global rows, which may span node types."""
+        records = []
+        for row in rows:
+            node_type = str(self._tables["nodes.type"][row])
+            position = int(self._tables["nodes.position"][row])
+            records.extend(self.records(node_type, [position]))
+        return records
+
+    def records(self, node_type: str, positions: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """
+        Materialize nodes of a type as plain dictionaries.
+
+        Args:
+            node_type: Node type to materialize
+            positions: Optional positions within the node type table
+
+        Returns:
+            List of dicts with node_id, node_type, file_source and attributes
+        """
+        ids = self.node_ids(node_type)
+        if positions is None:
+            positions = np.arange(len(ids))
+        columns = {name: self.column(node_type, name) for name in self.columns(node_type)}
+
+        records = []
+        for position in positions:
+            record = {
+                "node_id": str(ids[position]),
+                "node_type": node_type,
+                "file_source": self.file_path,
+            }
+            for name, array in columns.items():
+                record[name] = _to_python(array[position])
+            records.append(record)
+        return records
+
+
+def _match(column: np.ndarray, value: Any) -> np.ndarray:
+    """Case-insensitive membership mask for a string column."""
+    values = [value] if isinstance(value, (str, int)) else list(value)
+    upper = np.char.upper(np.asarray(column).astype(str))
+    return np.isin(upper, [str(v).upper() for v in values])
+
+
+def _to_python(value: Any) -> Any:
+    """Convert a NumPy scalar into a JSON-serializable Python value."""
+    if isinstance(value, np.floating):
+        return None if np.isnan(value) else float(value)
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, np.str_):
+        return str(value) or None
+    return value
+
+
+def _json_default(value: Any) -> Any:
+    """JSON fallback for NumPy values in emitted rows; anything else becomes str."""
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    converted = _to_python(value)
+    return str(value) if converted is value else converted
+
+
+def _attach(file_path: str) -> KGView:
+    """Attach to an existing column store without copying it."""
+    store_dir = store_dir_for(file_path)
+    manifest = read_manifest(store_dir)
+    tables = {}
+    for name, info in manifest["tables"].items():
+        table_path = os.path.join(store_dir, info["file"])
+        # Zero-length arrays cannot be memory-mapped
+        mmap_mode = "r" if info.get("length") else None
+        tables[name] = np.load(table_path, mmap_mode=mmap_mode, allow_pickle=False)
+    return KGView(file_path, tables, memory_mapped=True, source=manifest.get("source"))
+
+
+def _load_in_memory(file_path: str) -> KGView:
+    """Build a private in-memory view when no store is available."""
+    source = source_signature(file_path)
+    with open(file_path, "r") as f:
+        kg_data = json.load(f)
+    return KGView(file_path, build_tables(kg_data), memory_mapped=False, source=source)
+
+
+def open_kg(file_path: str, revalidate: bool = False) -> KGView:
+    """
+    Open a monthly KG file as a read-only columnar view.
+
+    Attaches to the memory-mapped store when it is current and falls back to
+    parsing the JSON file otherwise. Views are cached for the lifetime of the
+    process; long-lived processes pass ``revalidate`` to reopen views whose
+    KG file changed since they were opened.
+    """
+    key = os.path.abspath(file_path)
+    view = _OPEN_VIEWS.get(key)
+    if view is not None and revalidate and view.source != source_signature(file_path):
+        view = None
+    if view is None:
+        start = time.perf_counter()
+        if is_store_current(file_path):
+            view = _attach(file_path)
+        else:
+            view = _load_in_memory(file_path)
+        LOAD_STATS["views_opened"] += 1
+        LOAD_STATS["seconds"] += time.perf_counter() - start
+        _OPEN_VIEWS[key] = view
+    return view
+
+
+def open_kgs(file_paths: List[str], revalidate: bool = False) -> List[KGView]:
+    """Open several monthly KG files."""
+    return [open_kg(file_path, revalidate) for file_path in file_paths]
+
+
+# ---------------------------------------------------------------------------
+# Multi-file helpers used by generated query code
+# ---------------------------------------------------------------------------
+
+
+def nodes_by_type(file_paths: List[str], node_type: str, **filters: Any) -> List[Dict[str, Any]]:
+    """
+    Return records of a node type across several monthly KG files.
+
+    Filters: state, sbu, dept, store, date (see KGView.select).
+    """
+    records = []
+    for view in open_kgs(file_paths):
+        records.extend(view.nodes_by_type(node_type, **filters))
+    return records
+
+
+def iter_nodes(file_paths: List[str], node_type: str, **filters: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Yield records of a node type across several monthly KG files.
+
+    Like nodes_by_type, but holds one month's records at a time; pass it to
+    emit_rows to stream large results.
+    """
+    for view in open_kgs(file_paths):
+        yield from view.nodes_by_type(node_type, **filters)
+
+
+def emit_rows(results: Dict[str, Any], rows: Iterable[Dict[str, Any]]) -> int:
+    """
+    Add rows to results['data'] without holding them in memory.
+
+    When the executor provides a spool file (single-query sandbox runs), the
+    rows are written to it as they are produced and the executor adds them to
+    results['data'] after the run, keeping large results server-side for
+    paging and export. Otherwise (host-side use, and batch sessions, which
+    run without a spool so each program keeps its own rows) they are
+    appended to results['data'] directly.
+
+    Args:
+        results: The results dict the query prints
+        rows: Row dicts, e.g. from iter_nodes
+
+    Returns:
+        Number of rows added
+    """
+    spool_path = os.environ.get(RESULT_SPOOL_ENV)
+    if not spool_path:
+        data = results.setdefault("data", [])
+        before = len(data)
+        data.extend(rows)
+        return len(data) - before
+
+    count = 0
+    with open(spool_path, "a") as spool:
+        for row in rows:
+            spool.write(json.dumps(row, default=_json_default) + "\n")
+            count += 1
+    results.setdefault("metadata", {})
+    results["metadata"]["streamed_rows"] = results["metadata"].get("streamed_rows", 0) + count
+    return count
+
+
+def filter_nodes(
+    file_paths: List[str],
+    node_type: str,
+    state: Any = None,
+    sbu: Any = None,
+    dept: Any = None,
+    store: Any = None,
+    date: Any = None,
+) -> List[Dict[str, Any]]:
+    """Return records matching state/SBU/department/store/date filters."""
+    return nodes_by_type(
+        file_paths, node_type, state=state, sbu=sbu, dept=dept, store=store, date=date
+    )
+
+
+def get_node(file_paths: List[str], node_id: str) -> Optional[Dict[str, Any]]:
+    """Look up a single node by ID."""
+    for view in open_kgs(file_paths):
+        record = view.node(node_id)
+        if record is not None:
+            return record
+    return None
+
+
+def children(file_paths: List[str], node_id: str, node_type: Optional[str] = None) -> List[str]:
+    """Return IDs of the children of a node."""
+    for view in open_kgs(file_paths):
+        if view.find(node_id) >= 0:
+            return view.children(node_id, node_type)
+    return []
+
+
+def parent(file_paths: List[str], node_id: str) -> Optional[str]:
+    """Return the ID of the parent of a node."""
+    for view in open_kgs(file_paths):
+        if view.find(node_id) >= 0:
+            return view.parent(node_id)
+    return None
+
+
+def store_series(
+    file_paths: List[str],
+    store_id: str,
+    metric: str = "total_gmv_amt",
+    node_type: str = "day_store",
+    sbu: Any = None,
+    dept: Any = None,
+) -> List[Dict[str, Any]]:
+    """Return the daily values of a metric for one store across months."""
+    series = []
+    for view in open_kgs(file_paths):
+        series.extend(view.store_series(store_id, metric, node_type, sbu=sbu, dept=dept))
+    series.sort(key=lambda point: point["date"])
+    return series
+
+
+def aggregate(
+    file_paths: List[str],
+    node_type: str,
+    metric: str,
+    by: Optional[List[str]] = None,
+    **filters: Any,
+) -> List[Dict[str, Any]]:
+    """
+    Sum a metric over a node type, optionally grouped.
+
+    Args:
+        file_paths: Monthly KG files
+        node_type: Node type to aggregate
+        metric: Numeric property to sum (e.g. total_gmv_amt)
+        by: Group keys: date, month, sbu, dept, store, state or a property
+        **filters: state, sbu, dept, store, date (see KGView.select)
+
+    Returns:
+        One dict per group with the group keys, the metric sum and a count
+
+    Raises:
+        ValueError: If the node type has no such group key
+    """
+    by = list(by or [])
+    totals: Dict[tuple, List[float]] = {}
+    for view in open_kgs(file_paths):
+        positions = view.select(node_type, **filters)
+        values = view.column(node_type, metric)
+        if not len(positions) or not len(values):
+            continue
+        selected = np.asarray(values[positions], dtype=np.float64)
+        keys = []
+        for name in by:
+            column = np.asarray(view.field(node_type, name))
+            if len(column) != view.count(node_type):
+                raise ValueError(f"{node_type} nodes have no '{name}' to group by")
+            keys.append(column[positions])
+
+        if keys:
+            group_keys = np.array(
+                ["\x1f".join(str(part) for part in parts) for parts in zip(*keys)]
+            )
+            unique, inverse = np.unique(group_keys, return_inverse=True)
+        else:
+            unique, inverse = np.array([""]), np.zeros(len(selected), dtype=np.int64)
+
+        sums = np.bincount(inverse, weights=np.nan_to_num(selected), minlength=len(unique))
+        counts = np.bincount(inverse, minlength=len(unique))
+        for key, total, count in zip(unique, sums, counts):
+            group = tuple(str(key).split("\x1f")) if keys else ()
+            entry = totals.setdefault(group, [0.0, 0])
+            entry[0] += float(total)
+            entry[1] += int(count)
+
+    results = []
+    for group, (total, count) in sorted(totals.items()):
+        row = dict(zip(by, group))
+        row[metric] = total
+        row["count"] = count
+        results.append(row)
+    return results
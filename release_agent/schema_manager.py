@@ -1,5 +1,7 @@
 # release_agent/schema_manager.py
 
+import hashlib
+import json
 from typing import Dict, Any
 
 
@@ -8,12 +10,20 @@ class KGSchemaManager:
     
     def __init__(self):
         self._schema = self._build_schema()
+        self._version = hashlib.sha256(
+            json.dumps(self._schema, sort_keys=True).encode()
+        ).hexdigest()[:12]
     
     @property
     def schema(self) -> Dict[str, Any]:
         """Get the complete KG schema."""
         return self._schema
     
+    @property
+    def version(self) -> str:
+        """Short hash of the schema; changes whenever the schema definition does."""
+        return self._version
+    
     def _build_schema(self) -> Dict[str, Any]:
         """Build and return the complete KG schema definition."""
         return {
@@ -3,22 +3,66 @@
 import asyncio
 import json
 import os
+import shutil
+import signal
 import tempfile
 import subprocess
 import sys
 import time
 import logging
-from typing import Dict, Any, Optional
+import uuid
+from typing import Dict, Any, Optional, Tuple
 from pathlib import Path
 
+from .deadline import DeadlineExceededError, check_deadline, clamp_timeout, current_deadline
+from .execution_scheduler import ExecutionRejectedError, ExecutionScheduler, execution_scheduler
+from .metrics import SANDBOX_BYTES, SANDBOX_RUNS
+from .result_cache import ExecutionResultCache
+from .result_store import ResultStore, result_store as shared_result_store
+from .sandbox_lib import SANDBOX_LIB_DIR
+from . import serialization
+
 logger = logging.getLogger(__name__)
 
+# Prefix of the stderr line on which the sandboxed code reports the data it read
+RESOURCE_MARKER = '__KG_RESOURCES__ '
+
+# Prefix of the last stderr line, on which the sandbox's supervising process
+# reports the code's CPU time, peak memory and exit status
+USAGE_MARKER = '__KG_USAGE__ '
+
+# Fields of the code's own report; CPU and memory come only from the supervisor
+SANDBOX_REPORT_FIELDS = (
+    'bytes_read', 'storage_bytes_read', 'files_loaded', 'kg_files_loaded',
+    'data_bytes_loaded', 'ready_at', 'finished_at', 'kg_load_seconds',
+)
+
+# Exit status of a sandbox whose code the supervisor killed at the timeout
+SANDBOX_TIMEOUT_EXIT = 124
+
+# The code stops itself at the execution timeout; the supervisor kills it this
+# much later, and the executor kills the supervisor later still
+SUPERVISOR_GRACE_SECONDS = 2
+EXECUTOR_GRACE_SECONDS = 5
+
+# File in the per-run spool directory that kga.emit_rows streams rows to
+SPOOL_FILENAME = 'rows.jsonl'
+
+# Streamed results with more rows stay in the result store; the execution
+# result carries the first page and a cursor for the rest
+MAX_INLINE_ROWS = 5000
+
 class SecureCodeExecutor:
-    async def _execute_in_docker(self, code: str, working_directory: str = None) -> Dict[str, Any]:
+    async def _execute_in_docker(
+        self, code: str, working_directory: str = None, spool_dir: str = None
+    ) -> Dict[str, Any]:
         """Execute code in a Docker container for maximum security."""
         
         # Create a secure execution script
-        secure_script = self._create_secure_script(code, working_directory)
+        secure_script = self._create_secure_script(
+            code, working_directory, lib_dir='/sandbox_lib',
+            spool_path=f'/spool/{SPOOL_FILENAME}' if spool_dir else None
+        )
         
         # Create temporary directory for Docker execution
         with tempfile.TemporaryDirectory() as temp_dir:
@@ -39,15 +83,19 @@ class SecureCodeExecutor:
                         with open(src, 'r') as src_f, open(dst, 'w') as dst_f:
                             dst_f.write(src_f.read())
             
-            # Docker run command
+            # Docker run command; the name lets a cancelled run stop its container
+            container_name = f'kg-sandbox-{uuid.uuid4().hex[:12]}'
             docker_cmd = [
                 'docker', 'run', '--rm',
+                '--name', container_name,
                 '--memory', f'{self.max_memory_mb}m',
                 '--cpus', '0.5',
                 '--network', 'none',  # No network access
                 '--read-only',  # Read-only filesystem
                 '--tmpfs', '/tmp',  # Writable tmp
                 '-v', f'{temp_dir}:/workspace:ro',  # Mount workspace as read-only
+                '-v', f'{SANDBOX_LIB_DIR}:/sandbox_lib:ro',  # Preloaded KG access library
+                *(['-v', f'{spool_dir}:/spool'] if spool_dir else []),  # Rows streamed by kga.emit_rows
                 'python:3.11-slim',
                 'python', '/workspace/execute.py'
             ]
@@ -56,13 +104,11 @@ class SecureCodeExecutor:
                 process = await asyncio.create_subprocess_exec(
                     *docker_cmd,
                     stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE
+                    stderr=asyncio.subprocess.PIPE,
+                    start_new_session=True
                 )
                 
-                stdout, stderr = await asyncio.wait_for(
-                    process.communicate(),
-                    timeout=self.execution_timeout
-                )
+                stdout, stderr = await self._communicate(process, container_name)
                 
                 if process.returncode == 0:
                     try:
@@ -71,7 +117,7 @@ class SecureCodeExecutor:
                         for line in reversed(output_lines):
                             if line.strip():
                                 try:
-                                    result_data = json.loads(line)
+                                    result_data = serialization.loads(line)
                                     return {
                                         'success': True,
                                         'result': result_data,
@@ -95,6 +141,8 @@ class SecureCodeExecutor:
                             'stdout': stdout.decode(),
                             'stderr': stderr.decode()
                         }
+                elif process.returncode == SANDBOX_TIMEOUT_EXIT:
+                    return self._timeout_result(stdout, stderr)
                 else:
                     return {
                         'success': False,
@@ -110,12 +158,21 @@ class SecureCodeExecutor:
                     'error': f'Docker execution error: {str(e)}'
                 }
                 
-    def _create_secure_script(self, code: str, working_directory: str = None) -> str:
+    def _create_secure_script(
+        self,
+        code: str,
+        working_directory: str = None,
+        lib_dir: str = SANDBOX_LIB_DIR,
+        spool_path: str = None
+    ) -> str:
         """Create a secure Python script wrapper for the generated code."""
         
         # Adjust working directory path for the execution environment
         kg_path = 'KGs' if working_directory else 'Data/KGs'
         
+        # Rows the code streams with kga.emit_rows go to the executor's spool
+        spool_setup = f"os.environ['KG_RESULT_SPOOL'] = {spool_path!r}" if spool_path else ''
+        
         # Clean up the user code - remove any leading/trailing whitespace and ensure proper indentation
         cleaned_code = '\n'.join(line for line in code.split('\n'))
         
@@ -124,6 +181,7 @@ class SecureCodeExecutor:
         # indented_code = "print('Executing user code...')\n"
         
         secure_wrapper = f'''
+import time
 import sys
 import json
 import os
@@ -132,6 +190,80 @@ import resource
 from datetime import datetime
 import traceback
 
+# The code runs in a forked child in its own process group. This process
+# supervises it: it measures the child from outside with wait4 - CPU time
+# and peak memory as the kernel accounts them, including processes the code
+# spawned and waited for - kills it at the timeout or when the executor
+# sends SIGTERM, and reports on the last stderr line even when the code was
+# killed. Nothing the code prints comes after that line.
+_sandbox_pid = None
+_sandbox_timed_out = False
+
+def _stop_sandbox(signum, frame):
+    global _sandbox_timed_out
+    if _sandbox_pid is None:
+        os._exit(128 + signum)
+    _sandbox_timed_out = _sandbox_timed_out or signum == signal.SIGALRM
+    try:
+        os.killpg(_sandbox_pid, signal.SIGKILL)
+    except OSError:
+        pass
+
+def _supervise():
+    _, status, usage = os.wait4(_sandbox_pid, 0)
+    signal.alarm(0)
+    try:
+        # Processes the code left running
+        os.killpg(_sandbox_pid, signal.SIGKILL)
+    except OSError:
+        pass
+    if _sandbox_timed_out:
+        exit_code = {SANDBOX_TIMEOUT_EXIT}
+    elif os.WIFSIGNALED(status):
+        exit_code = 128 + os.WTERMSIG(status)
+    else:
+        exit_code = os.WEXITSTATUS(status)
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak_rss_kb = usage.ru_maxrss / 1024 if sys.platform == 'darwin' else usage.ru_maxrss
+    report = {{
+        'cpu_user_seconds': round(usage.ru_utime, 4),
+        'cpu_system_seconds': round(usage.ru_stime, 4),
+        'peak_rss_mb': round(peak_rss_kb / 1024, 2),
+        'exit_code': exit_code,
+        'killed_by_signal': os.WTERMSIG(status) if os.WIFSIGNALED(status) else None,
+        'timed_out': _sandbox_timed_out,
+    }}
+    # Start a new line in case the code was killed mid-line
+    sys.stderr.write('\\n{USAGE_MARKER}' + json.dumps(report) + '\\n')
+    sys.stderr.flush()
+    os._exit(exit_code)
+
+signal.signal(signal.SIGALRM, _stop_sandbox)
+signal.signal(signal.SIGTERM, _stop_sandbox)
+_supervisor_pid = os.getpid()
+sys.stdout.flush()
+sys.stderr.flush()
+_sandbox_pid = os.fork()
+if _sandbox_pid:
+    try:
+        os.setpgid(_sandbox_pid, _sandbox_pid)
+    except OSError:
+        pass  # The child already did
+    signal.alarm({self.execution_timeout + SUPERVISOR_GRACE_SECONDS})
+    _supervise()
+
+# In the sandboxed child from here on
+os.setpgid(0, 0)
+signal.signal(signal.SIGTERM, signal.SIG_DFL)
+try:
+    # Die with the supervisor (PR_SET_PDEATHSIG) rather than outlive it
+    import ctypes
+    ctypes.CDLL(None).prctl(1, signal.SIGKILL)
+except Exception:
+    pass
+if os.getppid() != _supervisor_pid:
+    os._exit(1)
+
 # Set resource limits (keep these for basic security)
 try:
     # Limit memory usage to {self.max_memory_mb}MB
@@ -149,6 +281,57 @@ def timeout_handler(signum, frame):
 signal.signal(signal.SIGALRM, timeout_handler)
 signal.alarm({self.execution_timeout})
 
+# Track data files opened by the generated code (np.load/open of KG files)
+import builtins
+_files_loaded = set()
+_builtin_open = builtins.open
+
+def _tracking_open(file, mode='r', *args, **kwargs):
+    if isinstance(file, (str, bytes, os.PathLike)) and not any(flag in mode for flag in 'wax+'):
+        _files_loaded.add(os.path.abspath(os.fsdecode(file)))
+    return _builtin_open(file, mode, *args, **kwargs)
+
+builtins.open = _tracking_open
+
+def _report_resources():
+    # CPU and memory are measured by the supervisor; report what only this
+    # process knows: the data it read and when it was ready and finished
+    io_counters = {{}}
+    try:
+        with _builtin_open('/proc/self/io') as io_file:
+            for io_line in io_file:
+                io_key, _, io_value = io_line.partition(':')
+                io_counters[io_key.strip()] = int(io_value)
+    except (OSError, ValueError):
+        pass
+    data_bytes = 0
+    for loaded_path in _files_loaded:
+        try:
+            data_bytes += os.path.getsize(loaded_path)
+        except OSError:
+            pass
+    report = {{
+        'bytes_read': io_counters.get('rchar'),
+        'storage_bytes_read': io_counters.get('read_bytes'),
+        'files_loaded': len(_files_loaded),
+        'kg_files_loaded': len(getattr(kga, '_OPEN_VIEWS', {{}})),
+        'data_bytes_loaded': data_bytes,
+        'ready_at': _sandbox_ready_at,
+        'finished_at': time.time(),
+        'kg_load_seconds': getattr(kga, 'LOAD_STATS', {{}}).get('seconds', 0.0),
+    }}
+    print('{RESOURCE_MARKER}' + json.dumps(report), file=sys.stderr)
+
+{spool_setup}
+
+# Preload the read-only KG access library (memory-mapped column stores)
+sys.path.insert(0, {lib_dir!r})
+try:
+    import kg_access as kga
+except Exception:
+    kga = None
+_sandbox_ready_at = time.time()
+
 try:
     # Change to appropriate working directory
     if os.path.exists('{kg_path}'):
@@ -157,7 +340,7 @@ try:
         os.chdir('.')  # Stay in current directory
     
     # Execute user code with proper indentation
-    {indented_code}
+{indented_code}
 
 except Exception as e:
     error_result = {{
@@ -170,10 +353,148 @@ except Exception as e:
 
 finally:
     signal.alarm(0)  # Cancel the alarm
+    try:
+        _report_resources()
+    except Exception:
+        pass
         '''
         return secure_wrapper
+    
+    def _collect_spool(self, result: Dict[str, Any], spool_path: str) -> None:
+        """
+        Add the rows the code streamed with kga.emit_rows to its results.
+        
+        Streamed rows come before the rows the code returned in
+        results['data']. Up to MAX_INLINE_ROWS rows are put into the results
+        as usual; larger results stay in the result store and the results
+        get their first page, with result['pagination'] pointing at the rest.
+        """
+        if not os.path.exists(spool_path) or os.path.getsize(spool_path) == 0:
+            return
+        output = result.get('result')
+        if not result.get('success') or not isinstance(output, dict):
+            return
+        
+        inline_rows = output.get('data') if isinstance(output.get('data'), list) else []
+        result_id = self.result_store.adopt(spool_path, extra_rows=inline_rows)
+        page = self.result_store.page(result_id, limit=MAX_INLINE_ROWS)
+        output['data'] = page['rows']
+        if page['next_cursor'] is None:
+            self.result_store.delete(result_id)
+            return
+        
+        logger.info(f"Keeping {page['row_count']} streamed rows in result store as {result_id}")
+        result['pagination'] = {
+            'result_id': result_id,
+            'row_count': page['row_count'],
+            'page_size': MAX_INLINE_ROWS,
+            'next_cursor': page['next_cursor'],
+        }
+    
+    def _timeout_result(self, stdout: bytes, stderr: bytes) -> Dict[str, Any]:
+        """Result of a run the sandbox's supervisor killed at the execution timeout."""
+        return {
+            'success': False,
+            'error': f'Code execution timed out after {self.execution_timeout} seconds',
+            'timed_out': True,
+            'stdout': stdout.decode(),
+            'stderr': stderr.decode()
+        }
+    
+    def _extract_resource_usage(self, result: Dict[str, Any]) -> None:
+        """
+        Move the sandbox's resource reports from stderr into the result.
+        
+        CPU time, peak memory and exit status come from the supervisor's
+        report, trusted only as the last line: the supervisor writes it after
+        the code and its processes are gone, so any earlier such line was
+        printed by the code. The code's own report only contributes the
+        fields in SANDBOX_REPORT_FIELDS.
+        """
+        stderr = result.get('stderr')
+        if not stderr or (RESOURCE_MARKER not in stderr and USAGE_MARKER not in stderr):
+            return
+        
+        lines = stderr.rstrip('\n').split('\n')
+        usage = None
+        if lines[-1].startswith(USAGE_MARKER):
+            try:
+                usage = json.loads(lines.pop()[len(USAGE_MARKER):])
+            except json.JSONDecodeError:
+                logger.warning("Could not parse sandbox usage report")
+            if lines and not lines[-1]:
+                lines.pop()  # The supervisor's line break
+        
+        resources = {}
+        kept_lines = []
+        for line in lines:
+            if line.startswith(RESOURCE_MARKER):
+                try:
+                    report = json.loads(line[len(RESOURCE_MARKER):])
+                except json.JSONDecodeError:
+                    logger.warning("Could not parse sandbox resource report")
+                    continue
+                if isinstance(report, dict):
+                    resources.update(
+                        (field, report[field]) for field in SANDBOX_REPORT_FIELDS if field in report
+                    )
+            elif not line.startswith(USAGE_MARKER):
+                kept_lines.append(line)
+        if isinstance(usage, dict):
+            resources.update(usage)
+        if resources:
+            result['resources'] = resources
+        result['stderr'] = '\n'.join(kept_lines)
         
 
+    def _observe_run(self, result: Dict[str, Any]) -> None:
+        """Count a finished sandbox run and the data it read in the metrics."""
+        if result.get('timed_out'):
+            outcome = 'timeout'
+        else:
+            outcome = 'success' if result.get('success') else 'failure'
+        SANDBOX_RUNS.inc(strategy=self.execution_strategy, outcome=outcome)
+        resources = result.get('resources') or {}
+        for kind in ('bytes_read', 'data_bytes_loaded'):
+            if resources.get(kind):
+                SANDBOX_BYTES.inc(resources[kind], kind=kind)
+        
+    @staticmethod
+    def _sandbox_timings(
+        result: Dict[str, Any],
+        admission: Optional[Dict[str, Any]],
+        launched_at: float,
+        returned_at: float,
+    ) -> Dict[str, Optional[float]]:
+        """
+        Split a sandbox run into queue wait, spawn, KG load, compute and collect.
+        
+        spawn runs from launching the process until the KG access library is
+        imported, kg_load is the time spent opening KG views through that
+        library, and collect is reading and parsing the output. Without the
+        sandbox's report (e.g. it was killed) only the total is known.
+        """
+        timings = {
+            'queue_wait': round((admission or {}).get('wait_time') or 0.0, 4),
+            'sandbox_total': round(returned_at - launched_at, 4),
+        }
+        # The report's timestamps come from the same host clock; they are
+        # timings rather than resource usage, so move them out of resources
+        resources = result.get('resources') or {}
+        ready_at = resources.pop('ready_at', None)
+        finished_at = resources.pop('finished_at', None)
+        kg_load = resources.pop('kg_load_seconds', None) or 0.0
+        if ready_at is None or finished_at is None:
+            return timings
+
+        timings.update({
+            'spawn': round(ready_at - launched_at, 4),
+            'kg_load': round(kg_load, 4),
+            'compute': round(max(finished_at - ready_at - kg_load, 0.0), 4),
+            'collect': round(returned_at - finished_at, 4),
+        })
+        return timings
+        
     #     def _create_secure_script(self, code: str, working_directory: str = None) -> str:
     #         """Create a secure Python script wrapper for the generated code."""
     #         
@@ -370,11 +691,19 @@ print(json.dumps(results))
     def __init__(self, 
                  execution_timeout: int = 30,
                  max_memory_mb: int = 512,
-                 allowed_imports: list = None):
+                 allowed_imports: list = None,
+                 scheduler: ExecutionScheduler = None,
+                 result_cache: ExecutionResultCache = None,
+                 result_store: ResultStore = None):
         self.execution_timeout = execution_timeout
         self.max_memory_mb = max_memory_mb
+        self.scheduler = scheduler or execution_scheduler
+        self.result_cache = result_cache or ExecutionResultCache()
+        self.result_store = result_store or shared_result_store
         self.allowed_imports = allowed_imports or [
             'json', 'networkx', 'pandas', 'numpy', 'datetime', 'collections', 'itertools', 'math',
+            # Preloaded KG access library
+            'kg_access',
             # Additional modules needed internally by the allowed libraries
             'inspect', 'types', 'functools', 'operator', 'copy', 'weakref', 'warnings',
             'heapq', 'bisect', 'random', 'decimal', 're', 'string', 'io', 'sys',
@@ -397,48 +726,212 @@ print(json.dumps(results))
         # Check if we can use subprocess safely
         return 'subprocess'
     
-    async def execute(self, code: str, working_directory: str = None) -> Dict[str, Any]:
+    async def execute(
+        self, code: str, working_directory: str = None, spool: bool = True
+    ) -> Dict[str, Any]:
         """
         Execute code safely using the best available strategy.
         
         Args:
             code: Python code to execute
             working_directory: Directory containing KG files
+            spool: Collect rows the code streams with kga.emit_rows from a
+                spool file. Batch sessions pass False: their programs share
+                one run, so each program's rows must stay in its own results.
             
         Returns:
             Dictionary with execution results
+            
+        Raises:
+            ExecutionRejectedError: If the scheduler cannot admit the execution
+            DeadlineExceededError: If the request's deadline passed before it started
         """
         start_time = time.time()
         
+        # Identical code over unchanged KG files returns the cached result
+        cache_key = self.result_cache.make_key(code, self._resolve_exec_cwd(working_directory))
+        cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            logger.info("Returning cached execution result")
+            cached['cache_hit'] = True
+            cached['execution_time'] = time.time() - start_time
+            cached['scheduler'] = None
+            cached['timings'] = None
+            SANDBOX_RUNS.inc(strategy=self.execution_strategy, outcome='cache_hit')
+            return cached
+        
+        # Rows the code streams with kga.emit_rows are spooled here
+        spool_dir = tempfile.mkdtemp(prefix='kg-spool-') if spool else None
         try:
-            if self.execution_strategy == 'docker':
-                result = await self._execute_in_docker(code, working_directory)
-            else:
-                result = await self._execute_in_subprocess(code, working_directory)
+            # Wait for a slot so bursts don't start unbounded sandboxes
+            check_deadline('sandbox execution')
+            async with self.scheduler.slot() as admission:
+                launched_at = time.time()
+                if self.execution_strategy == 'docker':
+                    result = await self._execute_in_docker(code, working_directory, spool_dir)
+                else:
+                    result = await self._execute_in_subprocess(code, working_directory, spool_dir)
+                returned_at = time.time()
             
+            if spool_dir:
+                await asyncio.to_thread(
+                    self._collect_spool, result, os.path.join(spool_dir, SPOOL_FILENAME)
+                )
             execution_time = time.time() - start_time
             result['execution_time'] = execution_time
+            result['scheduler'] = admission
+            result['cache_hit'] = False
+            self._extract_resource_usage(result)
+            result['timings'] = self._sandbox_timings(
+                result, admission, launched_at, returned_at
+            )
+            self._observe_run(result)
+            if 'pagination' not in result and not self._has_uncollected_rows(result):
+                # A stored result expires on its own schedule; don't cache a reference to it
+                self.result_cache.set(cache_key, result)
             
             return result
             
+        except ExecutionRejectedError:
+            SANDBOX_RUNS.inc(strategy=self.execution_strategy, outcome='rejected')
+            raise
+        except DeadlineExceededError:
+            raise
         except asyncio.TimeoutError:
+            SANDBOX_RUNS.inc(strategy=self.execution_strategy, outcome='timeout')
+            deadline = current_deadline()
             return {
                 'success': False,
-                'error': f'Code execution timed out after {self.execution_timeout} seconds',
+                'error': (
+                    f'Code execution stopped at the request deadline of {deadline.seconds:g} seconds'
+                    if deadline is not None and deadline.expired
+                    else f'Code execution timed out after {self.execution_timeout} seconds'
+                ),
                 'execution_time': time.time() - start_time
             }
         except Exception as e:
+            SANDBOX_RUNS.inc(strategy=self.execution_strategy, outcome='error')
             return {
                 'success': False,
                 'error': f'Execution failed: {str(e)}',
                 'execution_time': time.time() - start_time
             }
+        finally:
+            if spool_dir:
+                shutil.rmtree(spool_dir, ignore_errors=True)
+        
+    def is_result_cached(self, code: str, working_directory: str = None) -> bool:
+        """Check whether executing this code would be answered from the result cache."""
+        return self.result_cache.contains(
+            self.result_cache.make_key(code, self._resolve_exec_cwd(working_directory))
+        )
+    
+    def cache_result(self, code: str, working_directory: str, result: Dict[str, Any]) -> None:
+        """Cache a result obtained for this code outside execute(), e.g. in a batch session."""
+        if self._has_uncollected_rows(result):
+            logger.warning("Not caching a result missing rows it streamed")
+            return
+        self.result_cache.set(
+            self.result_cache.make_key(code, self._resolve_exec_cwd(working_directory)), result
+        )
+    
+    @staticmethod
+    def _has_uncollected_rows(result: Dict[str, Any]) -> bool:
+        """
+        Check whether a result reports streamed rows that never reached its data.
         
-    async def _execute_in_subprocess(self, code: str, working_directory: str = None) -> Dict[str, Any]:
+        Served from the cache, such a result would come back without its rows.
+        """
+        output = result.get('result')
+        if not isinstance(output, dict) or not isinstance(output.get('metadata'), dict):
+            return False
+        streamed_rows = output['metadata'].get('streamed_rows') or 0
+        data = output.get('data')
+        return streamed_rows > 0 and len(data if isinstance(data, list) else []) < streamed_rows
+        
+    async def _communicate(
+        self, process: asyncio.subprocess.Process, container_name: Optional[str] = None
+    ) -> Tuple[bytes, bytes]:
+        """
+        Collect a sandbox process's output within the execution timeout.
+        
+        The timeout is shortened to the request's deadline, if it has one.
+        The sandbox is killed if the wait ends early - on timeout, or when
+        the calling task is cancelled (a cancelled job, a disconnected
+        client or a passed deadline) - so abandoned sandboxes don't keep
+        using capacity meant for live requests.
+        """
+        # The sandbox's supervisor normally stops the code first and reports
+        # its usage; this is the backstop if the supervisor itself hangs
+        timeout = self.execution_timeout + SUPERVISOR_GRACE_SECONDS + EXECUTOR_GRACE_SECONDS
+        try:
+            return await asyncio.wait_for(process.communicate(), timeout=clamp_timeout(timeout))
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            await asyncio.shield(self._kill(process, container_name))
+            raise
+        
+    async def _kill(
+        self, process: asyncio.subprocess.Process, container_name: Optional[str] = None
+    ) -> None:
+        """
+        Kill a sandbox (and its container) and reap it.
+        
+        The supervisor is asked to stop first, so it kills the code's own
+        process group; if it doesn't exit in time, its group is killed and
+        the code dies with it.
+        """
+        if process.returncode is not None:
+            return
+        logger.info(f"Stopping sandbox {process.pid}")
+        if container_name is None:
+            try:
+                process.terminate()
+                await asyncio.wait_for(process.wait(), timeout=SUPERVISOR_GRACE_SECONDS)
+                return
+            except (ProcessLookupError, asyncio.TimeoutError):
+                pass
+        try:
+            # The sandbox leads its own session, so its pid is the group id
+            os.killpg(process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            process.kill()
+        if container_name:
+            # Killing the docker client doesn't stop the container
+            try:
+                killer = await asyncio.create_subprocess_exec(
+                    'docker', 'kill', container_name,
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.DEVNULL
+                )
+                await asyncio.wait_for(killer.wait(), timeout=10)
+            except (OSError, asyncio.TimeoutError) as e:
+                logger.warning(f"Could not kill sandbox container {container_name}: {e}")
+        await process.wait()
+        
+    def _resolve_exec_cwd(self, working_directory: str = None) -> str:
+        """Determine the directory the sandbox runs in."""
+        exec_cwd = os.getcwd()  # Start with current directory
+        
+        if working_directory:
+            # If working_directory is "Data/KGs", we want to run from the directory that contains "Data"
+            if working_directory == "Data/KGs" or working_directory.endswith("/Data/KGs"):
+                # Stay in current directory since it should contain the Data folder
+                exec_cwd = os.getcwd()
+            elif os.path.exists(working_directory):
+                exec_cwd = working_directory
+        
+        return exec_cwd
+    
+    async def _execute_in_subprocess(
+        self, code: str, working_directory: str = None, spool_dir: str = None
+    ) -> Dict[str, Any]:
         """Execute code in a subprocess with restrictions."""
         
         # Create a secure execution script
-        secure_script = self._create_secure_script(code, working_directory)
+        secure_script = self._create_secure_script(
+            code, working_directory,
+            spool_path=os.path.join(spool_dir, SPOOL_FILENAME) if spool_dir else None
+        )
         
         # Write script to temporary file
         with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as f:
@@ -447,32 +940,23 @@ print(json.dumps(results))
         
         try:
             # Determine the correct working directory
-            exec_cwd = os.getcwd()  # Start with current directory
-            
-            if working_directory:
-                # If working_directory is "Data/KGs", we want to run from the directory that contains "Data"
-                if working_directory == "Data/KGs" or working_directory.endswith("/Data/KGs"):
-                    # Stay in current directory since it should contain the Data folder
-                    exec_cwd = os.getcwd()
-                elif os.path.exists(working_directory):
-                    exec_cwd = working_directory
+            exec_cwd = self._resolve_exec_cwd(working_directory)
             
             logger.info(f"Executing subprocess in directory: {exec_cwd}")
             logger.info(f"Working directory parameter: {working_directory}")
             logger.info(f"Data/KGs exists from exec_cwd: {os.path.exists(os.path.join(exec_cwd, 'Data/KGs'))}")
             
             # Execute with timeout and capture output
+            # Own process group, so killing it also kills anything the code spawned
             process = await asyncio.create_subprocess_exec(
                 sys.executable, script_path,
                 stdout=asyncio.subprocess.PIPE,
                 stderr=asyncio.subprocess.PIPE,
-                cwd=exec_cwd
+                cwd=exec_cwd,
+                start_new_session=True
             )
             
-            stdout, stderr = await asyncio.wait_for(
-                process.communicate(),
-                timeout=self.execution_timeout
-            )
+            stdout, stderr = await self._communicate(process)
             
             # Parse results (same as before)
             if process.returncode == 0:
@@ -481,7 +965,7 @@ print(json.dumps(results))
                     for line in reversed(output_lines):
                         if line.strip():
                             try:
-                                result_data = json.loads(line)
+                                result_data = serialization.loads(line)
                                 return {
                                     'success': True,
                                     'result': result_data,
@@ -505,6 +989,8 @@ print(json.dumps(results))
                         'stdout': stdout.decode(),
                         'stderr': stderr.decode()
                     }
+            elif process.returncode == SANDBOX_TIMEOUT_EXIT:
+                return self._timeout_result(stdout, stderr)
             else:
                 return {
                     'success': False,
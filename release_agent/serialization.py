@@ -0,0 +1,41 @@
+# release_agent/serialization.py
+
+import json
+import logging
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:  # Optional; the stdlib encoder is several times slower on large results
+    orjson = None
+
+# Keys need not be strings (e.g. pandas group keys); numpy scalars and arrays
+# come out of generated code
+_ORJSON_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY) if orjson else 0
+
+
+def dumps(obj: Any) -> bytes:
+    """
+    Serialize to compact JSON bytes.
+
+    Uses orjson when installed, otherwise the stdlib encoder without
+    whitespace. Values of unknown types are serialized as str().
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, default=str, option=_ORJSON_OPTIONS)
+    return json.dumps(obj, default=str, separators=(",", ":")).encode()
+
+
+def loads(data: Any) -> Any:
+    """
+    Parse JSON from str or bytes, with orjson when installed.
+
+    Raises:
+        json.JSONDecodeError: If the input is not JSON (orjson's error
+            subclasses it)
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
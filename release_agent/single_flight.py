@@ -0,0 +1,91 @@
+# release_agent/single_flight.py
+
+import asyncio
+import copy
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from .deadline import shared_context
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    """One in-flight computation and the callers waiting on it."""
+
+    def __init__(self, task: asyncio.Future):
+        self.task = task
+        self.waiters = 0
+        self.callers = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one computation.
+
+    The first caller for a key starts the computation as its own task; later
+    callers arriving while it runs wait on that task instead of repeating
+    the work. Every caller gets the result (or the exception), waiters a
+    deep copy so they can't affect each other. Cancelling one caller - a
+    client disconnect - doesn't cancel the shared computation for the
+    others; once every caller is cancelled, the computation is cancelled
+    too. The computation runs without the first caller's request deadline:
+    each caller stops waiting at its own deadline, so a caller with a
+    short deadline doesn't fail or cut short the others. Keys are forgotten
+    as soon as the computation finishes; this is not a cache.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._stats = {"leaders": 0, "coalesced": 0}
+
+    async def do(
+        self, key: Hashable, fn: Callable[[], Awaitable[Any]]
+    ) -> Tuple[Any, Dict[str, Any]]:
+        """
+        Run ``fn`` unless a call with the same key is already in flight.
+
+        Args:
+            key: Identity of the computation
+            fn: Coroutine function performing it
+
+        Returns:
+            (result, info) where info has "shared" (whether this caller
+            waited on another caller's computation) and "waiters" (callers
+            coalesced into the computation so far)
+        """
+        flight = self._flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _Flight(asyncio.create_task(fn(), context=shared_context()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+            self._stats["leaders"] += 1
+        else:
+            flight.waiters += 1
+            self._stats["coalesced"] += 1
+            logger.info(f"Coalescing identical in-flight request ({flight.waiters} waiting)")
+
+        flight.callers += 1
+        try:
+            result = await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            flight.callers -= 1
+            if flight.callers == 0 and not flight.task.done():
+                logger.info("Every caller of an in-flight request is gone; cancelling it")
+                flight.task.cancel()
+            raise
+        info = {"shared": not leader, "waiters": flight.waiters}
+        return (result if leader else copy.deepcopy(result)), info
+
+    def _forget(self, key: Hashable, flight: _Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        # Retrieve the exception so it isn't reported as unhandled when
+        # every caller was cancelled
+        if not flight.task.cancelled():
+            flight.task.exception()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get coalescing counters."""
+        return {**self._stats, "in_flight": len(self._flights)}
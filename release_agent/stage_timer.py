@@ -0,0 +1,106 @@
+# release_agent/stage_timer.py
+
+import contextvars
+import json
+import logging
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Timer of the query being processed in the current task; copied into tasks
+# and threads started from it, so nested components can record into it
+_CURRENT_TIMER: contextvars.ContextVar[Optional["StageTimer"]] = contextvars.ContextVar(
+    "stage_timer", default=None
+)
+
+
+class StageTimer:
+    """
+    Wall-clock latency breakdown of one query.
+
+    Stages are accumulated by name (a stage entered twice adds up), LLM calls
+    are listed individually with their purpose, and the sandbox reports its
+    own split into spawn, KG load and compute. The timer is made current for
+    the query's task with activate(), so the LLM client and other components
+    record into it without it being passed around.
+    """
+
+    def __init__(self):
+        self._start = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.llm_calls: List[Dict[str, Any]] = []
+        self.execution: Optional[Dict[str, float]] = None
+
+    @contextmanager
+    def activate(self) -> Iterator["StageTimer"]:
+        """Make this the current timer within the block."""
+        token = _CURRENT_TIMER.set(self)
+        try:
+            yield self
+        finally:
+            _CURRENT_TIMER.reset(token)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time a block as (part of) a named stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, seconds: float) -> None:
+        """Add time to a named stage."""
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def record_llm_call(self, purpose: Optional[str], seconds: float, cached: bool = False) -> None:
+        """Record one LLM call."""
+        self.llm_calls.append(
+            {"purpose": purpose or "unspecified", "seconds": round(seconds, 4), "cached": cached}
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Timings in seconds.
+
+        Returns:
+            Dict with total_seconds, stages, llm_calls and execution (the
+            engine's own split, e.g. sandbox spawn/kg_load/compute)
+        """
+        return {
+            "total_seconds": round(time.perf_counter() - self._start, 4),
+            "stages": {name: round(seconds, 4) for name, seconds in self.stages.items()},
+            "llm_calls": list(self.llm_calls),
+            "execution": self.execution,
+        }
+
+    def log(self, query: str, timings: Optional[Dict[str, Any]] = None) -> None:
+        """Emit the timings as one structured log record."""
+        timings = timings or self.to_dict()
+        record = {"event": "query_timings", "query": query[:200], **timings}
+        logger.info(json.dumps(record, default=str), extra={"query_timings": record})
+
+
+def current_timer() -> Optional[StageTimer]:
+    """The timer of the query being processed, if any."""
+    return _CURRENT_TIMER.get()
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a block into the current timer; a no-op outside a query."""
+    timer = _CURRENT_TIMER.get()
+    if timer is None:
+        yield
+        return
+    with timer.stage(name):
+        yield
+
+
+def record_llm_call(purpose: Optional[str], seconds: float, cached: bool = False) -> None:
+    """Record an LLM call into the current timer, if any."""
+    timer = _CURRENT_TIMER.get()
+    if timer is not None:
+        timer.record_llm_call(purpose, seconds, cached)
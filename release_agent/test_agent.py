@@ -59,7 +59,9 @@ class TestAgent(Agent):
         """
         try:
             # Simple test prompt
-            test_response = self.llm.generate("Say 'Hello, I am working correctly!'")
+            test_response = self.llm.generate(
+                "Say 'Hello, I am working correctly!'", purpose="health_check", use_cache=False
+            )
             
             return {
                 "status": "healthy",
@@ -0,0 +1,47 @@
+# tests/conftest.py
+"""Shared fixtures: a small monthly KG on disk."""
+
+import json
+
+import pytest
+
+# (store, state, FOOD GMV, HOME GMV) per day; every day has the same values
+STORES = [("1001", "FL", 10.0, 1.0), ("1002", "TX", 20.0, 2.0), ("1003", "FL", 30.0, 3.0)]
+DAYS = ["20220101", "20220102"]
+
+
+def build_kg(month="202201"):
+    """Node-link KG with month, day, sbu and sbu_store nodes."""
+    nodes = [{"id": month, "node_type": "month"}]
+    links = []
+    for day in DAYS:
+        nodes.append({"id": day, "node_type": "day"})
+        links.append({"source": month, "target": day, "label": "has day"})
+        for sbu, column in (("FOOD", 2), ("HOME", 3)):
+            sbu_id = f"{day}-{sbu}-Total-Total"
+            nodes.append({
+                "id": sbu_id,
+                "node_type": "sbu",
+                "daily_sbu_GMV_AMT": sum(store[column] for store in STORES),
+            })
+            links.append({"source": day, "target": sbu_id, "label": "has sbu"})
+            for store in STORES:
+                store_id = f"{day}-{sbu}-{store[0]}"
+                nodes.append({
+                    "id": store_id,
+                    "node_type": "sbu_store",
+                    "st_cd": store[1],
+                    "total_gmv_amt": store[column],
+                })
+                links.append({"source": sbu_id, "target": store_id, "label": "has store"})
+    return {"directed": True, "multigraph": False, "graph": {}, "nodes": nodes, "links": links}
+
+
+@pytest.fixture
+def kg_file(tmp_path):
+    """Path of Data/KGs/202201.json under a temporary working directory."""
+    kg_dir = tmp_path / "Data" / "KGs"
+    kg_dir.mkdir(parents=True)
+    path = kg_dir / "202201.json"
+    path.write_text(json.dumps(build_kg()))
+    return str(path)
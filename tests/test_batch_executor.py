@@ -0,0 +1,47 @@
+# tests/test_batch_executor.py
+"""Grouping batch queries into shared sandbox sessions."""
+
+import asyncio
+
+import pytest
+
+from release_agent.batch_executor import MAX_GROUP_SIZE, QueryBatchExecutor
+from release_agent.execution_scheduler import ExecutionScheduler
+from release_agent.secure_executor import SecureCodeExecutor
+
+JAN, FEB, MAR = "Data/KGs/202201.json", "Data/KGs/202202.json", "Data/KGs/202203.json"
+
+
+@pytest.mark.parametrize(
+    "file_lists, groups",
+    [
+        ([[JAN], [FEB], [JAN]], [[0, 2], [1]]),
+        # Overlaps join groups transitively
+        ([[JAN], [FEB], [JAN, FEB], [MAR]], [[0, 1, 2], [3]]),
+        ([[JAN], []], [[0], [1]]),
+    ],
+)
+def test_group_by_files(file_lists, groups):
+    assert QueryBatchExecutor.group_by_files(file_lists) == groups
+
+
+def test_large_groups_are_split():
+    groups = QueryBatchExecutor.group_by_files([[JAN]] * (2 * MAX_GROUP_SIZE + 1) + [[FEB]])
+    assert [len(group) for group in groups] == [MAX_GROUP_SIZE, MAX_GROUP_SIZE, 1, 1]
+    assert groups[0][0] == 0 and groups[2] == [2 * MAX_GROUP_SIZE]
+    assert QueryBatchExecutor.group_by_files([[JAN]] * 3, max_group_size=2) == [[0, 1], [2]]
+
+
+def test_programs_in_a_group_get_their_own_results():
+    executor = SecureCodeExecutor(execution_timeout=5, scheduler=ExecutionScheduler())
+    executor.execution_strategy = "subprocess"
+    codes = [
+        "import json\nprint(json.dumps({'data': [1]}))",
+        "raise ValueError('bad program')",
+        "import json\nprint('progress')\nprint(json.dumps({'data': [3]}))",
+    ]
+    results = asyncio.run(QueryBatchExecutor(executor).execute_group(codes, None))
+    assert [result["success"] for result in results] == [True, True, True]
+    assert results[0]["result"]["data"] == [1]
+    assert results[1]["result"]["error"] == "bad program"
+    assert results[2]["result"]["data"] == [3]
@@ -0,0 +1,58 @@
+# tests/test_code_cache.py
+"""Query code cache keys: which wordings share generated code."""
+
+import pytest
+
+from release_agent.code_cache import QueryCodeCache
+from release_agent.date_extractor import DateExtractor
+
+
+@pytest.fixture
+def cache():
+    return QueryCodeCache(schema_version="test")
+
+
+@pytest.mark.parametrize(
+    "first, second",
+    [
+        ("Top stores in Florida, Jan 2022", "top stores in florida january 2022?"),
+        ("FOOD sales in 2022", "food sales in year 2022"),
+        ("Total HOME sales in Q1 2022", "total home sales in first quarter 2022"),
+    ],
+)
+def test_same_question_shares_key(cache, first, second):
+    assert cache.make_key(first, "Data/KGs") == cache.make_key(second, "Data/KGs")
+
+
+@pytest.mark.parametrize(
+    "first, second",
+    [
+        # Store numbers that look like years are not dates
+        ("Sales for store 2001 in Jan 2022", "Sales for store 2005 in Jan 2022"),
+        ("Show total GMV for store 2020 in March 2022", "Show total GMV for store 2021 in March 2022"),
+        # Same wording, different months
+        ("FOOD sales in Florida in Jan 2022", "FOOD sales in Florida in Feb 2022"),
+        ("top 5 stores in Florida in Jan 2022", "top 10 stores in Florida in Jan 2022"),
+    ],
+)
+def test_different_question_gets_own_key(cache, first, second):
+    assert cache.make_key(first, "Data/KGs") != cache.make_key(second, "Data/KGs")
+
+
+def test_key_depends_on_kg_path_and_schema(cache):
+    query = "FOOD sales in Florida in Jan 2022"
+    assert cache.make_key(query, "Data/KGs") != cache.make_key(query, "Other/KGs")
+    assert cache.make_key(query, "Data/KGs") != QueryCodeCache("other").make_key(query, "Data/KGs")
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("Sales for store 2001 in Jan 2022", "sales for store 2001 in <dates>"),
+        ("FOOD sales in 2022", "food sales in <dates>"),
+        ("Sales for year 2021", "sales for <dates>"),
+        ("Q1 2022 sales for store 2020", "<dates> sales for store 2020"),
+    ],
+)
+def test_strip_dates_keeps_other_numbers(query, expected):
+    assert DateExtractor().strip_dates(query) == expected
@@ -0,0 +1,86 @@
+# tests/test_deadline.py
+"""Request deadlines: expiry, client disconnects and timeout clamping."""
+
+import asyncio
+
+import pytest
+
+from release_agent.deadline import (
+    ClientDisconnectedError,
+    Deadline,
+    DeadlineExceededError,
+    check_deadline,
+    clamp_timeout,
+    current_deadline,
+    run_with_deadline,
+    shared_context,
+)
+
+
+def test_result_is_returned_within_the_deadline():
+    async def work():
+        return current_deadline().seconds, clamp_timeout(30), clamp_timeout(None)
+
+    seconds, clamped, unbounded = asyncio.run(run_with_deadline(work, 2))
+    assert seconds == 2
+    assert 0 < clamped <= 2
+    assert 0 < unbounded <= 2
+
+
+def test_expired_deadline_cancels_the_work():
+    cancelled = []
+
+    async def work():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    with pytest.raises(DeadlineExceededError):
+        asyncio.run(run_with_deadline(work, 0.05, poll_interval=0.01))
+    assert cancelled == [True]
+
+
+def test_disconnect_cancels_the_work():
+    cancelled = []
+    polls = []
+
+    async def work():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def is_disconnected():
+        polls.append(True)
+        return len(polls) >= 2
+
+    with pytest.raises(ClientDisconnectedError):
+        asyncio.run(run_with_deadline(work, 5, is_disconnected, poll_interval=0.01))
+    assert cancelled == [True]
+
+
+def test_expired_deadline_names_the_stage():
+    deadline = Deadline(0)
+    with pytest.raises(DeadlineExceededError) as error:
+        deadline.check("code generation")
+    assert error.value.stage == "code generation"
+    assert deadline.remaining() == 0
+    assert deadline.clamp(30) == 0
+
+
+def test_no_deadline_outside_a_request():
+    assert current_deadline() is None
+    assert clamp_timeout(30) == 30
+    check_deadline("anything")
+
+
+def test_shared_context_drops_only_the_deadline():
+    async def work():
+        return shared_context().run(current_deadline), current_deadline()
+
+    shared, own = asyncio.run(run_with_deadline(work, 2))
+    assert shared is None
+    assert own is not None
@@ -0,0 +1,112 @@
+# tests/test_execution_scheduler.py
+"""Admission control for sandbox runs: slots, 429 rejections and deadlines."""
+
+import asyncio
+
+import pytest
+
+from release_agent.deadline import DeadlineExceededError, run_with_deadline
+from release_agent.execution_scheduler import ExecutionRejectedError, ExecutionScheduler
+
+
+async def hold(scheduler, release, admitted=None):
+    async with scheduler.slot() as admission:
+        if admitted is not None:
+            admitted.append(admission)
+        await release.wait()
+
+
+def free_permits(scheduler):
+    return scheduler._semaphore._value
+
+
+def test_waiters_are_admitted_as_slots_free():
+    async def main():
+        scheduler, release, admitted = ExecutionScheduler(max_concurrent=2), asyncio.Event(), []
+        tasks = [asyncio.create_task(hold(scheduler, release, admitted)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        running, waiting = scheduler.running, scheduler.waiting
+        release.set()
+        await asyncio.gather(*tasks)
+        return scheduler, admitted, running, waiting
+
+    scheduler, admitted, running, waiting = asyncio.run(main())
+    assert (running, waiting) == (2, 1)
+    assert [admission["queue_depth"] for admission in admitted] == [0, 0, 0]
+    assert scheduler.get_stats()["admitted"] == 3
+    assert free_permits(scheduler) == 2
+
+
+def test_full_queue_is_rejected():
+    async def main():
+        scheduler, release = ExecutionScheduler(max_concurrent=1, max_queue=1), asyncio.Event()
+        tasks = [asyncio.create_task(hold(scheduler, release)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        with pytest.raises(ExecutionRejectedError) as error:
+            await hold(scheduler, release)
+        release.set()
+        await asyncio.gather(*tasks)
+        return scheduler, error.value
+
+    scheduler, error = asyncio.run(main())
+    assert error.status_code == 429
+    assert error.queue_depth == 1
+    assert scheduler.get_stats()["rejected_queue_full"] == 1
+
+
+def test_queue_timeout_is_rejected():
+    async def main():
+        scheduler, release = ExecutionScheduler(max_concurrent=1, queue_timeout=0.05), asyncio.Event()
+        holder = asyncio.create_task(hold(scheduler, release))
+        await asyncio.sleep(0.01)
+        with pytest.raises(ExecutionRejectedError) as error:
+            await hold(scheduler, release)
+        release.set()
+        await holder
+        return scheduler, error.value
+
+    scheduler, error = asyncio.run(main())
+    assert error.retry_after == 1
+    assert scheduler.get_stats()["rejected_timeout"] == 1
+    assert scheduler.waiting == 0
+    assert free_permits(scheduler) == 1
+
+
+def test_wait_ends_at_the_request_deadline():
+    async def main():
+        scheduler, release = ExecutionScheduler(max_concurrent=1, queue_timeout=10), asyncio.Event()
+        holder = asyncio.create_task(hold(scheduler, release))
+        await asyncio.sleep(0.01)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        with pytest.raises(DeadlineExceededError) as error:
+            await run_with_deadline(lambda: hold(scheduler, release), 0.1, poll_interval=5)
+        elapsed = loop.time() - start
+        release.set()
+        await holder
+        return scheduler, error.value, elapsed
+
+    scheduler, error, elapsed = asyncio.run(main())
+    assert error.stage == "sandbox queue"
+    assert elapsed < 1
+    assert scheduler.get_stats()["deadline_exceeded"] == 1
+    assert free_permits(scheduler) == 1
+
+
+def test_cancelled_waiter_does_not_keep_a_permit():
+    async def main():
+        scheduler, release = ExecutionScheduler(max_concurrent=1), asyncio.Event()
+        holder = asyncio.create_task(hold(scheduler, release))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(hold(scheduler, asyncio.Event()))
+        await asyncio.sleep(0.01)
+        # Free the slot for the waiter and cancel it before it can resume
+        release.set()
+        await holder
+        waiter.cancel()
+        # A waiter that swallowed the cancellation would hold the slot forever
+        await asyncio.wait({waiter}, timeout=1)
+        await asyncio.sleep(0.01)
+        return waiter.cancelled(), scheduler.running, scheduler.waiting, free_permits(scheduler)
+
+    assert asyncio.run(main()) == (True, 0, 0, 1)
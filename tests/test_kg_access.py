@@ -0,0 +1,43 @@
+# tests/test_kg_access.py
+"""Column store helpers used by generated code and the native engine."""
+
+import pytest
+
+from release_agent.sandbox_lib import kg_access
+
+
+@pytest.fixture(params=["json", "store"])
+def files(request, kg_file):
+    """The KG parsed from JSON, or attached from its column store."""
+    if request.param == "store":
+        kg_access.write_store(kg_file)
+        assert kg_access.is_store_current(kg_file)
+    return [kg_file]
+
+
+def test_select_filters(files):
+    view = kg_access.open_kg(files[0])
+    assert len(view.select("sbu_store")) == 12
+    assert len(view.select("sbu_store", state="fl", sbu="FOOD")) == 4
+    assert len(view.select("sbu_store", store=["1001", "1002"], date="20220102")) == 4
+    # A filter the node type lacks matches nothing
+    assert len(view.select("sbu", state="FL")) == 0
+
+
+def test_aggregate_by_state(files):
+    rows = kg_access.aggregate(files, "sbu_store", "total_gmv_amt", by=["state"], sbu="FOOD")
+    assert rows == [
+        {"state": "FL", "total_gmv_amt": 80.0, "count": 4},
+        {"state": "TX", "total_gmv_amt": 40.0, "count": 2},
+    ]
+
+
+def test_aggregate_without_groups(files):
+    assert kg_access.aggregate(files, "sbu", "daily_sbu_GMV_AMT") == [
+        {"daily_sbu_GMV_AMT": 132.0, "count": 4}
+    ]
+
+
+def test_aggregate_by_missing_key_raises(files):
+    with pytest.raises(ValueError, match="no 'state'"):
+        kg_access.aggregate(files, "sbu", "daily_sbu_GMV_AMT", by=["state"])
@@ -0,0 +1,48 @@
+# tests/test_kg_query_agent.py
+"""Agent-level keys: which concurrent requests are coalesced into one run."""
+
+import os
+
+import pytest
+
+from release_agent.kg_query_agent import KGQueryAgent
+
+
+@pytest.fixture(scope="module")
+def agent():
+    return KGQueryAgent()
+
+
+@pytest.fixture
+def kg_path(kg_file):
+    return os.path.dirname(kg_file)
+
+
+@pytest.mark.parametrize(
+    "first, second, same",
+    [
+        ("Top stores in Florida, Jan 2022", "top stores in florida january 2022?", True),
+        ("FOOD sales in Florida in Jan 2022", "FOOD sales in Florida in Feb 2022", False),
+        ("Sales for store 2001 in Jan 2022", "Sales for store 2005 in Jan 2022", False),
+        # Dates the rules can't resolve key on the whole KG directory
+        ("Why did sales drop in Florida", "why did sales drop in florida?", True),
+    ],
+)
+def test_single_flight_key(agent, kg_path, first, second, same):
+    assert (
+        agent._single_flight_key(first, kg_path) == agent._single_flight_key(second, kg_path)
+    ) == same
+
+
+def test_single_flight_key_depends_on_context_and_files(agent, kg_path, kg_file):
+    query = "FOOD sales in Florida in Jan 2022"
+    key = agent._single_flight_key(query, kg_path)
+    assert agent._single_flight_key(query, kg_path, context={"user": "a"}) != key
+    assert agent._single_flight_key(query, kg_path, date_range=["202202"]) != key
+
+    # A rebuilt monthly file must not be answered by a run over the old one
+    undated = agent._single_flight_key("Why did sales drop in Florida", kg_path)
+    with open(kg_file, "a") as f:
+        f.write(" ")
+    assert agent._single_flight_key(query, kg_path) != key
+    assert agent._single_flight_key("Why did sales drop in Florida", kg_path) != undated
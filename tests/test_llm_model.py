@@ -0,0 +1,86 @@
+# tests/test_llm_model.py
+"""Concurrency of the async LLM path: slow round trips overlap instead of queueing."""
+
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import litellm
+import pytest
+
+from release_agent.llm_model import LLMModel
+from release_agent.query_analyzer import QueryAnalyzer
+
+DELAY = 0.3
+CALLS = 8
+
+ANALYSIS = {
+    "type": "temporal_analysis",
+    "time_scope": "single_month",
+    "target_node_types": ["sbu_store"],
+    "query_pattern": "sbu_analysis",
+    "extracted_date_range": ["202201"],
+}
+
+
+@pytest.fixture
+def gateway(monkeypatch):
+    """Stand-in for the LLM gateway: each call takes DELAY seconds."""
+    calls = []
+
+    async def acompletion(**kwargs):
+        calls.append(kwargs)
+        await asyncio.sleep(DELAY)
+        message = SimpleNamespace(content=json.dumps(ANALYSIS))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+    monkeypatch.setattr(litellm, "acompletion", acompletion)
+    return calls
+
+
+def run_timed(calls):
+    async def main():
+        # Ticks of a task sharing the loop; a blocking call would starve it
+        ticks = []
+
+        async def ticker():
+            while True:
+                ticks.append(time.perf_counter())
+                await asyncio.sleep(0.01)
+
+        ticking = asyncio.create_task(ticker())
+        start = time.perf_counter()
+        results = await asyncio.gather(*(call() for call in calls))
+        elapsed = time.perf_counter() - start
+        ticking.cancel()
+        return results, elapsed, len(ticks)
+
+    return asyncio.run(main())
+
+
+def test_concurrent_llm_calls_overlap(gateway):
+    model = LLMModel()
+    calls = [
+        lambda i=i: model.generate_content_async(f"prompt {i}", purpose="analysis")
+        for i in range(CALLS)
+    ]
+    results, elapsed, ticks = run_timed(calls)
+    assert len(gateway) == CALLS
+    assert all(json.loads(result) == ANALYSIS for result in results)
+    # Serial calls would take CALLS * DELAY
+    assert elapsed < 3 * DELAY
+    assert ticks >= DELAY / 0.01 / 2
+    assert model.get_usage_stats()["calls"] == CALLS
+
+
+def test_concurrent_llm_analyses_overlap(gateway):
+    analyzer = QueryAnalyzer(llm_model=LLMModel())
+    calls = [
+        lambda i=i: analyzer.analyze_query(f"Why did sales drop at store {1000 + i} in January 2022")
+        for i in range(CALLS)
+    ]
+    results, elapsed, _ = run_timed(calls)
+    assert len(gateway) == CALLS
+    assert all(result["analysis_path"] == "llm" for result in results)
+    assert elapsed < 3 * DELAY
@@ -0,0 +1,98 @@
+# tests/test_native_engine.py
+"""The native engine answers IR queries like generated code in the sandbox does."""
+
+import asyncio
+import os
+
+import pytest
+
+from release_agent.execution_scheduler import ExecutionScheduler
+from release_agent.native_engine import NativeQueryEngine
+from release_agent.query_ir import QueryIR
+from release_agent.sandbox_lib import kg_access
+from release_agent.secure_executor import SecureCodeExecutor
+
+# What generated code computes for IR below, in plain Python over records
+SANDBOX_CODE = '''import json
+groups = {}
+for row in kga.nodes_by_type(["Data/KGs/202201.json"], "sbu_store", sbu="FOOD"):
+    group = groups.setdefault(row["st_cd"], [])
+    group.append(row["total_gmv_amt"])
+data = [
+    {"state": state, "sum_total_gmv_amt": sum(values), "mean_total_gmv_amt": sum(values) / len(values),
+     "max_total_gmv_amt": max(values), "count": len(values)}
+    for state, values in groups.items()
+]
+data.sort(key=lambda row: row["sum_total_gmv_amt"], reverse=True)
+print(json.dumps({"data": data}))
+'''
+
+IR = QueryIR(
+    node_type="sbu_store",
+    metrics=[
+        {"field": "total_gmv_amt", "agg": "sum"},
+        {"field": "total_gmv_amt", "agg": "mean"},
+        {"field": "total_gmv_amt", "agg": "max"},
+    ],
+    filters={"sbu": "FOOD"},
+    group_by=["state"],
+    date_range=["202201"],
+    order_by="sum_total_gmv_amt",
+)
+
+
+@pytest.fixture(params=["json", "store"])
+def files(request, kg_file):
+    if request.param == "store":
+        kg_access.write_store(kg_file)
+    return [kg_file]
+
+
+def test_native_matches_sandbox(files):
+    native = NativeQueryEngine().execute(IR, files)
+    assert native["success"], native.get("error")
+
+    executor = SecureCodeExecutor(execution_timeout=10, scheduler=ExecutionScheduler())
+    executor.execution_strategy = "subprocess"
+    base = os.path.dirname(os.path.dirname(os.path.dirname(files[0])))
+    sandbox = asyncio.run(executor.execute(SANDBOX_CODE, working_directory=base))
+    assert sandbox["success"], sandbox.get("error")
+
+    native_rows = native["result"]["data"]
+    sandbox_rows = sandbox["result"]["data"]
+    assert [row["state"] for row in native_rows] == ["FL", "TX"]
+    assert len(native_rows) == len(sandbox_rows)
+    for native_row, sandbox_row in zip(native_rows, sandbox_rows):
+        assert native_row.keys() == sandbox_row.keys()
+        for name, value in sandbox_row.items():
+            assert native_row[name] == (pytest.approx(value) if isinstance(value, float) else value)
+
+
+def test_limit_and_count(files):
+    ir = QueryIR(
+        node_type="sbu_store",
+        metrics=[{"agg": "count"}],
+        group_by=["store"],
+        date_range=["202201"],
+        order_by="count",
+        limit=2,
+    )
+    result = NativeQueryEngine().execute(ir, files)["result"]
+    assert result["data"] == [
+        {"store": "1001", "count": 4},
+        {"store": "1002", "count": 4},
+    ]
+    assert result["summary"] == {"groups": 2, "rows_scanned": 12}
+
+
+def test_failure_is_reported_not_raised(kg_file):
+    # sbu nodes have no state; validate() would have caught this
+    ir = QueryIR(
+        node_type="sbu",
+        metrics=[{"field": "daily_sbu_GMV_AMT", "agg": "sum"}],
+        group_by=["state"],
+        date_range=["202201"],
+    )
+    result = NativeQueryEngine().execute(ir, [kg_file])
+    assert not result["success"]
+    assert result["engine"] == "native"
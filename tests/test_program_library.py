@@ -0,0 +1,78 @@
+# tests/test_program_library.py
+"""Which generated programs the library accepts for reuse, and under which intent."""
+
+import pytest
+
+from release_agent.program_library import QueryProgramLibrary, extract_store_ids
+
+QUERY = "Top FOOD stores in Florida in Jan 2022"
+
+PROGRAM = '''import json
+
+def run_query(files, date_range=None, state=None, sbu=None, dept=None):
+    rows = kga.filter_nodes(files, "sbu_store", state=state, sbu=sbu, dept=dept)
+    return {"data": rows, "metadata": {"date_range": date_range}}
+
+PARAMS = {"files": ["Data/KGs/202201.json"], "date_range": ["202201"], "state": "FL", "sbu": "FOOD", "dept": None}
+results = run_query(**PARAMS)
+print(json.dumps(results))
+'''
+
+
+@pytest.fixture
+def library():
+    return QueryProgramLibrary("test", path=None)
+
+
+def test_parameterized_program_is_stored(library):
+    assert library.store(QUERY, {}, PROGRAM)
+    function_code = library.lookup("Top HOME stores in Texas in Feb 2022")["function_code"]
+    # The PARAMS binding and the call are dropped
+    assert "PARAMS" not in function_code
+    assert "def run_query" in function_code
+
+
+@pytest.mark.parametrize(
+    "original, replacement",
+    [
+        # Filter values of the originating query written as literals
+        ("state=state", "state='FL'"),
+        ("sbu=sbu", "sbu='food'"),
+        # Filter parameters accepted but never read
+        ("sbu=sbu, ", ""),
+        ("dept=dept", "dept=None"),
+        # KG file paths in the function body
+        ("kga.filter_nodes(files,", 'kga.filter_nodes(["Data/KGs/202201.json"],'),
+        # A parameter missing from the signature
+        ("dept=None):", "):"),
+    ],
+)
+def test_unparameterized_program_is_rejected(library, original, replacement):
+    assert original in PROGRAM
+    assert not library.store(QUERY, {}, PROGRAM.replace(original, replacement))
+    assert library.get_stats()["rejected"] == 1
+
+
+@pytest.mark.parametrize("literal", ['"2001"', "2001"])
+def test_hardcoded_store_number_is_rejected(library, literal):
+    code = PROGRAM.replace("dept=dept)", f"dept=dept, store={literal})")
+    assert not library.store("Sales for store 2001 in Jan 2022", {}, code)
+
+
+def test_extract_store_ids():
+    assert extract_store_ids("Compare store 2001 and stores #2005 in Jan 2022") == ["2001", "2005"]
+    assert extract_store_ids("Top stores in Florida in Jan 2022") == []
+
+
+@pytest.mark.parametrize(
+    "first, second, same_intent",
+    [
+        ("FOOD sales in Florida for Jan 2022", "HOME sales in Texas for Feb 2022", True),
+        ("Bakery department sales in Jan 2022", "Dairy department sales in Mar 2022", True),
+        ("Sales for store 2001 in Jan 2022", "Sales for store 2005 in Jan 2022", False),
+        ("top 5 stores in Florida in Jan 2022", "top 10 stores in Florida in Jan 2022", False),
+        ("Stores with GMV above 1000000 in Jan 2022", "Stores with GMV below 1000000 in Jan 2022", False),
+    ],
+)
+def test_intent_template(library, first, second, same_intent):
+    assert (library.intent_template(first) == library.intent_template(second)) == same_intent
@@ -0,0 +1,54 @@
+# tests/test_query_analyzer.py
+"""
+Which queries the rule-based analysis answers without the LLM.
+
+The keyword weights in QueryAnalyzer.score_confidence and the 0.8 threshold
+decide which path a query takes. The table pins the path of representative
+queries, including ones scored close to the threshold, so a change to the
+weights that moves a query to the other path fails here.
+"""
+
+import pytest
+
+from release_agent.query_analyzer import QueryAnalyzer
+
+FAST_PATH = "rule_based"
+LLM = "llm"
+
+ROUTING_CASES = [
+    # Plain lookups and aggregations with a date and an entity
+    ("top 5 stores in Florida by sales in Jan 2022", FAST_PATH),
+    ("Total FOOD sales in Florida in January 2022", FAST_PATH),
+    ("Total units sold in Texas in January 2022", FAST_PATH),
+    ("Bakery department sales in January 2022", FAST_PATH),
+    ("Show total GMV for store 1001 in March 2022", FAST_PATH),
+    ("Average daily HOME sales per store in Texas in February 2022", FAST_PATH),
+    ("FOOD sales forecast by department in Jan 2022", FAST_PATH),
+    ("Compare FOOD vs HOME sales in Jan 2022", FAST_PATH),
+    # Exactly at the threshold: intent, date and metric, but no entity
+    ("Which state had the highest sales in February 2022", FAST_PATH),
+    # Explanations, predictions and anomalies need the LLM
+    ("Why did sales drop in Florida after hurricane Ian", LLM),
+    ("Explain the drop in HOME sales in Texas in January 2022", LLM),
+    ("Predict next month's FOOD sales in Florida", LLM),
+    ("Which stores had unusual sales in January 2022", LLM),
+    ("What should we stock in Florida stores before a storm in January 2022", LLM),
+    # Just below the threshold: several intents match, or no date resolves
+    ("How did the hurricane affect store sales in Florida in January 2022", LLM),
+    ("Total FOOD sales in Florida", LLM),
+    ("sales", LLM),
+]
+
+
+@pytest.fixture(scope="module")
+def analyzer():
+    return QueryAnalyzer()
+
+
+@pytest.mark.parametrize("query, expected_path", ROUTING_CASES)
+def test_analysis_path(analyzer, query, expected_path):
+    analysis = analyzer.fast_path_analysis(query)
+    path = analysis["analysis_path"] if analysis else LLM
+    confidence = analyzer._analyze_basic(query)["analysis_confidence"]
+    assert path == expected_path, f"confidence {confidence:.2f} for {query!r}"
+
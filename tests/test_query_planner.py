@@ -0,0 +1,43 @@
+# tests/test_query_planner.py
+"""Engine choice between the result cache, the native engine and the sandbox."""
+
+import pytest
+
+from release_agent.query_planner import QueryPlanner
+
+IR = {"node_type": "sbu_store"}
+FILES = ["Data/KGs/missing.json"]
+
+
+@pytest.mark.parametrize(
+    "query_ir, has_code, result_cached, engine, candidates",
+    [
+        (IR, False, False, "native", {"native"}),
+        # A stored program for an IR query is a candidate, but slower
+        (IR, True, False, "native", {"native", "sandbox"}),
+        # Its cached result beats re-running the IR
+        (IR, True, True, "result_cache", {"result_cache", "native", "sandbox"}),
+        (None, True, False, "sandbox", {"sandbox"}),
+        (None, True, True, "result_cache", {"result_cache", "sandbox"}),
+    ],
+)
+def test_plan_picks_the_cheapest_candidate(query_ir, has_code, result_cached, engine, candidates):
+    plan = QueryPlanner().plan(FILES, query_ir, has_code=has_code, result_cached=result_cached)
+    assert plan["engine"] == engine
+    assert set(plan["candidates"]) == candidates
+
+
+def test_no_engine_raises():
+    with pytest.raises(ValueError):
+        QueryPlanner().plan(FILES)
+
+
+def test_record_calibrates_the_engine():
+    planner = QueryPlanner(smoothing=0.5)
+    plan = planner.plan(FILES, IR)
+    planner.record(plan, plan["estimated_cost"] * 3)
+    assert plan["estimate_ratio"] == 3
+    assert planner.get_stats()["calibration"]["native"] == 2
+    # Failures don't move the estimate
+    planner.record(planner.plan(FILES, IR), 100.0, success=False)
+    assert planner.get_stats()["calibration"]["native"] == 2
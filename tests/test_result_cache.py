@@ -0,0 +1,72 @@
+# tests/test_result_cache.py
+"""Sandbox result cache keys: same code over the same KG file versions."""
+
+import os
+
+import pytest
+
+from release_agent.result_cache import ExecutionResultCache
+
+CODE = '''import json
+files = ["Data/KGs/202201.json"]
+rows = kga.nodes_by_type(files, "sbu_store", state="FL")
+print(json.dumps({"data": rows}))
+'''
+
+RESULT = {"success": True, "result": {"data": [{"store": "1001"}]}}
+
+
+@pytest.fixture
+def base(kg_file):
+    """Directory the code's relative KG paths resolve against."""
+    return os.path.dirname(os.path.dirname(os.path.dirname(kg_file)))
+
+
+@pytest.fixture
+def cache():
+    return ExecutionResultCache()
+
+
+def test_formatting_and_comments_share_a_key(cache, base):
+    reformatted = "# Florida stores\n" + CODE.replace('state="FL"', "state = 'FL'")
+    assert cache.make_key(CODE, base) is not None
+    assert cache.make_key(reformatted, base) == cache.make_key(CODE, base)
+
+
+def test_different_code_gets_own_key(cache, base):
+    assert cache.make_key(CODE.replace('"FL"', '"TX"'), base) != cache.make_key(CODE, base)
+
+
+def test_rebuilt_kg_file_changes_the_key(cache, base, kg_file):
+    key = cache.make_key(CODE, base)
+    with open(kg_file, "a") as f:
+        f.write(" ")
+    assert cache.make_key(CODE, base) != key
+
+
+@pytest.mark.parametrize(
+    "code",
+    [
+        # Unparseable
+        "print(",
+        # No KG file it could depend on
+        "import json\nprint(json.dumps({'data': []}))",
+        # A referenced file that doesn't exist
+        CODE.replace("202201", "202112"),
+    ],
+)
+def test_uncacheable_code_has_no_key(cache, base, code):
+    assert cache.make_key(code, base) is None
+
+
+def test_only_successful_results_are_cached(cache, base):
+    key = cache.make_key(CODE, base)
+    cache.set(key, {"success": True, "result": {"error": "boom"}})
+    cache.set(key, {"success": False, "error": "boom"})
+    assert cache.get(key) is None
+    cache.set(key, RESULT)
+    cached = cache.get(key)
+    assert cached == RESULT
+    # Callers get copies
+    cached["result"]["data"].clear()
+    assert cache.get(key) == RESULT
@@ -0,0 +1,104 @@
+# tests/test_result_store.py
+"""Stored results: cursor pagination, spool adoption and export."""
+
+import csv
+import io
+
+import pytest
+
+from release_agent.result_store import (
+    InvalidCursorError,
+    ResultNotFoundError,
+    ResultStore,
+)
+
+ROWS = [{"store": str(1000 + i), "gmv": i * 1.5, "units": i} for i in range(25)]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ResultStore(directory=str(tmp_path / "results"))
+
+
+def read_all(store, result_id, limit):
+    pages, cursor = [], None
+    while True:
+        page = store.page(result_id, cursor, limit=limit)
+        pages.append(page)
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+def test_cursors_walk_every_row_once(store):
+    result_id = store.save(iter(ROWS))
+    pages = read_all(store, result_id, limit=10)
+    assert [len(page["rows"]) for page in pages] == [10, 10, 5]
+    assert [page["offset"] for page in pages] == [0, 10, 20]
+    assert [row for page in pages for row in page["rows"]] == ROWS
+    assert all(page["row_count"] == 25 for page in pages)
+
+
+def test_cursor_of_another_result_is_rejected(store):
+    first, second = store.save(ROWS), store.save(ROWS)
+    cursor = store.page(first, limit=10)["next_cursor"]
+    with pytest.raises(InvalidCursorError):
+        store.page(second, cursor)
+    with pytest.raises(InvalidCursorError):
+        store.page(first, "not a cursor")
+
+
+@pytest.mark.parametrize("result_id", ["0" * 32, "../etc/passwd", ""])
+def test_unknown_result_is_not_found(store, result_id):
+    store.save(ROWS)
+    with pytest.raises(ResultNotFoundError):
+        store.page(result_id)
+
+
+def test_expired_result_is_removed(tmp_path):
+    store = ResultStore(directory=str(tmp_path), ttl_seconds=0)
+    result_id = store.save(ROWS)
+    with pytest.raises(ResultNotFoundError):
+        store.info(result_id)
+    assert not store.delete(result_id)
+
+
+def test_adopt_takes_over_a_spool(store, tmp_path):
+    spool = tmp_path / "spool.jsonl"
+    spool.write_text("".join(f'{{"store": "{row["store"]}"}}\n' for row in ROWS[:3]))
+    result_id = store.adopt(str(spool), extra_rows=[{"store": "total", "gmv": 1.0}])
+    info = store.info(result_id)
+    assert not spool.exists()
+    assert info["row_count"] == 4
+    assert info["fields"] == ["store", "gmv"]
+    assert store.page(result_id)["rows"][-1] == {"store": "total", "gmv": 1.0}
+
+
+def test_paginate_stores_only_long_results(store):
+    short = {"data": ROWS[:5], "summary": {"count": 5}}
+    assert store.paginate(short, page_size=10) is short
+
+    paged = store.paginate({"data": ROWS, "summary": {"count": 25}}, page_size=10)
+    assert paged["data"] == ROWS[:10]
+    assert paged["summary"] == {"count": 25}
+    pagination = paged["pagination"]
+    assert pagination["row_count"] == 25 and pagination["page_size"] == 10
+    assert store.page(pagination["result_id"], pagination["next_cursor"])["offset"] == 10
+
+
+def test_export_csv(store):
+    result_id = store.save(ROWS + [{"store": "9999", "tags": ["a", "b"]}])
+    text = b"".join(store.export_csv(result_id)).decode()
+    rows = list(csv.reader(io.StringIO(text)))
+    assert rows[0] == ["store", "gmv", "units", "tags"]
+    assert rows[1] == ["1000", "0.0", "0", ""]
+    assert rows[-1] == ["9999", "", "", '["a","b"]']
+    assert len(rows) == len(ROWS) + 2
+
+
+def test_export_parquet_keeps_column_types(store):
+    pq = pytest.importorskip("pyarrow.parquet")
+    result_id = store.save(ROWS)
+    table = pq.read_table(io.BytesIO(b"".join(store.export_parquet(result_id))))
+    assert table.num_rows == 25
+    assert [str(field.type) for field in table.schema] == ["string", "double", "int64"]
@@ -0,0 +1,88 @@
+# tests/test_secure_executor.py
+"""Sandbox runs: supervisor-measured resource usage and timeouts."""
+
+import asyncio
+import json
+
+import pytest
+
+from release_agent.execution_scheduler import ExecutionScheduler
+from release_agent.secure_executor import RESOURCE_MARKER, USAGE_MARKER, SecureCodeExecutor
+
+
+@pytest.fixture
+def executor():
+    executor = SecureCodeExecutor(execution_timeout=2, scheduler=ExecutionScheduler())
+    executor.execution_strategy = "subprocess"
+    return executor
+
+
+def run(executor, code):
+    return asyncio.run(executor.execute(code))
+
+
+def test_usage_is_measured_by_the_supervisor(executor):
+    result = run(executor, "import json\nprint(json.dumps({'data': [1]}))\n")
+    assert result["success"]
+    assert result["result"]["data"] == [1]
+    resources = result["resources"]
+    assert resources["exit_code"] == 0 and not resources["timed_out"]
+    assert resources["cpu_user_seconds"] > 0
+    assert resources["peak_rss_mb"] > 0
+    assert "bytes_read" in resources
+    assert USAGE_MARKER not in result["stderr"] and RESOURCE_MARKER not in result["stderr"]
+
+
+def test_spawned_processes_count_towards_cpu(executor):
+    code = (
+        "import json\n"
+        "import subprocess, sys\n"
+        "subprocess.run([sys.executable, '-c', 'sum(range(30000000))'])\n"
+        "print(json.dumps({'data': []}))\n"
+    )
+    assert run(executor, code)["resources"]["cpu_user_seconds"] > 0.3
+
+
+def test_code_cannot_forge_its_usage(executor):
+    code = (
+        "import json, sys\n"
+        f"print({USAGE_MARKER!r} + json.dumps({{'cpu_user_seconds': 0, 'peak_rss_mb': 0}}), file=sys.stderr)\n"
+        f"print({RESOURCE_MARKER!r} + json.dumps({{'cpu_user_seconds': 0}}), file=sys.stderr)\n"
+        "sum(range(3000000))\n"
+        "print(json.dumps({'data': []}))\n"
+    )
+    resources = run(executor, code)["resources"]
+    assert resources["cpu_user_seconds"] > 0
+    assert resources["peak_rss_mb"] > 0
+
+
+def test_usage_is_reported_when_the_code_is_killed(executor):
+    code = "import signal, time\nsignal.signal(signal.SIGALRM, signal.SIG_IGN)\ntime.sleep(60)\n"
+    result = run(executor, code)
+    assert not result["success"] and result["timed_out"]
+    assert "timed out" in result["error"]
+    assert result["resources"]["timed_out"]
+    assert result["resources"]["killed_by_signal"] == 9
+
+
+def test_extract_usage_only_from_the_last_line(executor):
+    forged = {"cpu_user_seconds": 0.0, "peak_rss_mb": 0.0}
+    real = {"cpu_user_seconds": 1.5, "peak_rss_mb": 40.0, "exit_code": 0}
+    code_report = {"bytes_read": 10, "cpu_user_seconds": 0.0, "ready_at": 1.0}
+    result = {
+        "stderr": "\n".join([
+            "warning: something",
+            USAGE_MARKER + json.dumps(forged),
+            RESOURCE_MARKER + json.dumps(code_report),
+            "",
+            USAGE_MARKER + json.dumps(real),
+            "",
+        ])
+    }
+    executor._extract_resource_usage(result)
+    assert result["resources"] == {"bytes_read": 10, "ready_at": 1.0, **real}
+    assert result["stderr"] == "warning: something"
+
+    result = {"stderr": USAGE_MARKER + json.dumps(forged) + "\nprinted later\n"}
+    executor._extract_resource_usage(result)
+    assert "resources" not in result
@@ -0,0 +1,144 @@
+# tests/test_single_flight.py
+"""Coalescing of concurrent identical calls, cancellation and deadlines."""
+
+import asyncio
+
+import pytest
+
+from release_agent.deadline import DeadlineExceededError, current_deadline, run_with_deadline
+from release_agent.single_flight import SingleFlight
+
+
+class Work:
+    """Coroutine function counting its runs; finishes when released."""
+
+    def __init__(self, result=None, error=None):
+        self.runs = 0
+        self.cancelled = False
+        self.deadlines = []
+        self.release = asyncio.Event()
+        self.result = result if result is not None else {"rows": [1, 2, 3]}
+        self.error = error
+
+    async def __call__(self):
+        self.runs += 1
+        self.deadlines.append(current_deadline())
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error:
+            raise self.error
+        return self.result
+
+
+def test_concurrent_calls_share_one_run():
+    async def main():
+        flight, work = SingleFlight(), Work()
+        callers = [asyncio.create_task(flight.do("key", work)) for _ in range(3)]
+        await asyncio.sleep(0)
+        work.release.set()
+        return work, await asyncio.gather(*callers)
+
+    work, outcomes = asyncio.run(main())
+    assert work.runs == 1
+    assert [info["shared"] for _, info in outcomes] == [False, True, True]
+    assert all(info["waiters"] == 2 for _, info in outcomes)
+    # Waiters get copies they can change without affecting the others
+    outcomes[1][0]["rows"].append(4)
+    assert outcomes[0][0]["rows"] == outcomes[2][0]["rows"] == [1, 2, 3]
+
+
+def test_distinct_keys_and_later_calls_run_again():
+    async def main():
+        flight, work = SingleFlight(), Work()
+        work.release.set()
+        await asyncio.gather(flight.do("a", work), flight.do("b", work))
+        await flight.do("a", work)
+        return flight, work
+
+    flight, work = asyncio.run(main())
+    assert work.runs == 3
+    assert flight.get_stats() == {"leaders": 3, "coalesced": 0, "in_flight": 0}
+
+
+def test_error_reaches_every_caller():
+    async def main():
+        flight, work = SingleFlight(), Work(error=ValueError("boom"))
+        callers = [asyncio.create_task(flight.do("key", work)) for _ in range(2)]
+        await asyncio.sleep(0)
+        work.release.set()
+        return await asyncio.gather(*callers, return_exceptions=True)
+
+    outcomes = asyncio.run(main())
+    assert all(isinstance(outcome, ValueError) for outcome in outcomes)
+
+
+def test_cancelling_one_caller_keeps_the_run_for_the_others():
+    async def main():
+        flight, work = SingleFlight(), Work()
+        leader = asyncio.create_task(flight.do("key", work))
+        waiter = asyncio.create_task(flight.do("key", work))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0)
+        work.release.set()
+        result, _ = await waiter
+        return work, leader, result
+
+    work, leader, result = asyncio.run(main())
+    assert leader.cancelled()
+    assert not work.cancelled
+    assert result == {"rows": [1, 2, 3]}
+
+
+def test_run_is_cancelled_when_every_caller_is():
+    async def main():
+        flight, work = SingleFlight(), Work()
+        callers = [asyncio.create_task(flight.do("key", work)) for _ in range(2)]
+        await asyncio.sleep(0)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0)
+        return flight, work
+
+    flight, work = asyncio.run(main())
+    assert work.cancelled
+    assert flight.get_stats()["in_flight"] == 0
+
+
+def test_short_leader_deadline_does_not_fail_waiters():
+    async def main():
+        flight, work = SingleFlight(), Work()
+        leader = asyncio.create_task(
+            run_with_deadline(lambda: flight.do("key", work), 0.05, poll_interval=0.01)
+        )
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(
+            run_with_deadline(lambda: flight.do("key", work), 5, poll_interval=0.01)
+        )
+        leader_outcome = await asyncio.gather(leader, return_exceptions=True)
+        work.release.set()
+        return work, leader_outcome[0], await waiter
+
+    work, leader_outcome, (result, info) = asyncio.run(main())
+    assert isinstance(leader_outcome, DeadlineExceededError)
+    assert result == {"rows": [1, 2, 3]} and info["shared"]
+    assert work.runs == 1
+    # The shared run doesn't inherit the leader's deadline
+    assert work.deadlines == [None]
+
+
+@pytest.mark.parametrize("callers", [1, 4])
+def test_stats_count_leaders_and_coalesced_callers(callers):
+    async def main():
+        flight, work = SingleFlight(), Work()
+        tasks = [asyncio.create_task(flight.do("key", work)) for _ in range(callers)]
+        await asyncio.sleep(0)
+        work.release.set()
+        await asyncio.gather(*tasks)
+        return flight.get_stats()
+
+    assert asyncio.run(main()) == {"leaders": 1, "coalesced": callers - 1, "in_flight": 0}